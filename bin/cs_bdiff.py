@@ -27,6 +27,8 @@ This module describes the script used to run a study/case for Code_Saturne.
 
 This module defines the following functions:
 - process_cmd_line
+- parse_diff_args
+- python_diff
 - main
 """
 
@@ -45,16 +47,14 @@ except Exception:
     import configparser  # Python3
 
 from code_saturne import cs_exec_environment
-from code_saturne import cs_case_domain
-from code_saturne import cs_case
 
 #-------------------------------------------------------------------------------
 # Process the command line arguments
 #-------------------------------------------------------------------------------
 
-def process_cmd_line(argv, pkg):
+def create_parser(pkg):
     """
-    Process the passed command line arguments.
+    Create the command line arguments parser.
     """
 
     if sys.argv[0][-3:] == '.py':
@@ -93,13 +93,27 @@ Partitioner, or restart files.
                       help="real value above which a difference is " \
                           + "considered significant (default: 1e-30).")
 
+    parser.add_option("--python", dest="python",
+                      action="store_true",
+                      help="use the Python implementation instead of the " \
+                          + "cs_io_dump tool (default if this tool is not " \
+                          + "available).")
+
     parser.set_defaults(f_format=None)
     parser.set_defaults(location=None)
     parser.set_defaults(level=None)
     parser.set_defaults(section=None)
     parser.set_defaults(threshold=None)
+    parser.set_defaults(python=False)
 
-    (options, args) = parser.parse_args(argv)
+    return parser
+
+#-------------------------------------------------------------------------------
+
+def check_file_args(argv, args):
+    """
+    Return the file names if they are the 2 last arguments, None otherwise.
+    """
 
     if len(args) == 2:
         if args[0] != argv[len(argv) - 2]:
@@ -109,11 +123,88 @@ Partitioner, or restart files.
     else:
             args = None
 
+    return args
+
+#-------------------------------------------------------------------------------
+
+def process_cmd_line(argv, pkg):
+    """
+    Process the passed command line arguments.
+    """
+
+    parser = create_parser(pkg)
+
+    (options, args) = parser.parse_args(argv)
+
+    args = check_file_args(argv, args)
+
     if not args:
         parser.print_help()
 
     return  options, args
 
+#-------------------------------------------------------------------------------
+
+def parse_diff_args(argv, pkg):
+    """
+    Parse comparison arguments, without printing help or exiting on error,
+    so that this may be called from other tools (and threads).
+    Return options, file names, and an error message (None if no error).
+    """
+
+    parser = create_parser(pkg)
+
+    def error(msg):
+        raise ValueError(msg)
+
+    def print_help(file=None):
+        raise ValueError("unexpected help option in: " + ' '.join(argv))
+
+    parser.error = error
+    parser.print_help = print_help
+
+    try:
+        (options, args) = parser.parse_args(argv)
+    except ValueError as e:
+        return None, None, str(e)
+
+    args = check_file_args(argv, args)
+    if not args:
+        return options, None, "2 file names must be given as last arguments"
+
+    return options, args, None
+
+#===============================================================================
+# Python implementation
+#===============================================================================
+
+def python_diff(options, args, stdout=sys.stdout):
+    """
+    Compare files using the cs_io_file module.
+    """
+
+    from code_saturne import cs_io_file
+
+    location = None
+    if options.location != None:
+        location = int(options.location)
+
+    threshold = 1.e-30
+    if options.threshold != None:
+        threshold = options.threshold
+
+    n_echo = 0
+    if options.level != None:
+        n_echo = options.level
+
+    return cs_io_file.compare_files(args[0], args[1],
+                                    location_id=location,
+                                    section=options.section,
+                                    f_fmt=options.f_format,
+                                    threshold=threshold,
+                                    n_echo=n_echo,
+                                    out=stdout)
+
 #===============================================================================
 # Run the utility
 #===============================================================================
@@ -128,6 +219,9 @@ def main(argv, pkg):
     if not args:
         return 1
 
+    if options.python or not os.path.isfile(pkg.get_io_dump()):
+        return python_diff(options, args)
+
     cmd = [pkg.get_io_dump(), '--diff']
     cmd += argv
 
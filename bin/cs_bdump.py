@@ -45,8 +45,6 @@ except Exception:
     import configparser  # Python3
 
 from code_saturne import cs_exec_environment
-from code_saturne import cs_case_domain
-from code_saturne import cs_case
 
 #-------------------------------------------------------------------------------
 # Process the command line arguments
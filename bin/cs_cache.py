@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+This module defines a user-level cache of files indexed by a content hash,
+with a size limit and least-recently-used eviction.
+
+This module defines the following functions:
+- get_cache_root
+- hash_files
+- link_or_copy
+
+and the following class:
+- file_cache
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+try:
+    import ConfigParser  # Python2
+    configparser = ConfigParser
+except Exception:
+    import configparser  # Python3
+
+import json
+import os
+import shutil
+import sys
+import time
+
+#===============================================================================
+# Utility functions
+#===============================================================================
+
+def get_cache_root(pkg):
+    """
+    Determine the root directory of user-level caches.
+    priority: environment variable, preference setting, default.
+    """
+
+    cache_dir = os.getenv('CS_CACHEDIR')
+
+    if cache_dir == None:
+        config = configparser.ConfigParser()
+        config.read(pkg.get_configfiles())
+        if config.has_option('run', 'cachedir'):
+            cache_dir = config.get('run', 'cachedir')
+
+    if cache_dir == None:
+        if sys.platform.startswith('win'):
+            cache_dir = os.path.join(os.getenv('LOCALAPPDATA'),
+                                     pkg.code_name, 'cache')
+        else:
+            cache_dir = os.getenv('XDG_CACHE_HOME')
+            if not cache_dir:
+                cache_dir = os.path.join('~', '.cache')
+            cache_dir = os.path.join(cache_dir, pkg.name)
+
+    cache_dir = os.path.expandvars(os.path.expanduser(cache_dir))
+
+    return os.path.join(cache_dir, pkg.version_short)
+
+#-------------------------------------------------------------------------------
+
+def hash_files(h, paths, names=None):
+    """
+    Update a hashlib object with the names and contents of given files.
+    If names are not given, base names are used.
+    """
+
+    if names == None:
+        names = [os.path.basename(p) for p in paths]
+
+    for n, p in zip(names, paths):
+        h.update(('file:' + n + '\n').encode('utf-8'))
+        f = open(p, 'rb')
+        while True:
+            b = f.read(1 << 20)
+            if not b:
+                break
+            h.update(b)
+        f.close()
+
+    return h
+
+#-------------------------------------------------------------------------------
+
+def link_or_copy(src, dest):
+    """
+    Create a hard link to a file, or copy it if links are not possible.
+    Return True on success, False otherwise (for example if the source
+    was removed from a cache concurrently), in which case dest is removed.
+    """
+
+    if os.path.lexists(dest):
+        os.remove(dest)
+
+    try:
+        os.link(src, dest)
+    except Exception:
+        try:
+            shutil.copy2(src, dest)
+        except Exception:
+            if os.path.lexists(dest):
+                os.remove(dest)
+            return False
+
+    return True
+
+#===============================================================================
+# Class used to manage a cache
+#===============================================================================
+
+class file_cache(object):
+    """
+    Cache of sets of files, each set (entry) being stored in a directory
+    named by its key. The last access time of an entry is the modification
+    time of its directory.
+    """
+
+    #---------------------------------------------------------------------------
+
+    def __init__(self, pkg, name, default_size=2048):
+        """
+        Initialize cache object. The size limit (in MiB) is read from the
+        '<name>_cache_size' option of the 'run' section of the configuration
+        files; a size of 0 disables the cache.
+        """
+
+        self.name = name
+        self.root = os.path.join(get_cache_root(pkg), name)
+
+        size = default_size
+        config = configparser.ConfigParser()
+        config.read(pkg.get_configfiles())
+        option = name + '_cache_size'
+        if config.has_option('run', option):
+            size = float(config.get('run', option))
+
+        self.max_size = int(size * 1024 * 1024)
+
+    #---------------------------------------------------------------------------
+
+    def enabled(self):
+        """
+        Return True if the cache is enabled.
+        """
+
+        return self.max_size > 0
+
+    #---------------------------------------------------------------------------
+
+    def __entries__(self):
+        """
+        Return list of (path, last access time, size) tuples for entries.
+        """
+
+        entries = []
+
+        if not os.path.isdir(self.root):
+            return entries
+
+        for e in os.listdir(self.root):
+            p = os.path.join(self.root, e)
+            if e[0] == '.' or not os.path.isdir(p):
+                continue
+            size = 0
+            try:
+                for f in os.listdir(p):
+                    size += os.path.getsize(os.path.join(p, f))
+                entries.append((p, os.path.getmtime(p), size))
+            except Exception:  # entry removed concurrently
+                pass
+
+        return entries
+
+    #---------------------------------------------------------------------------
+
+    def __update_stats__(self, key, increment=1):
+        """
+        Update hit or miss counters.
+        """
+
+        stats = self.read_stats()
+        stats[key] = stats.get(key, 0) + increment
+
+        try:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root)
+            s_path = os.path.join(self.root, 'cache_stats.json')
+            t_path = s_path + '.' + str(os.getpid())
+            f = open(t_path, 'w')
+            json.dump(stats, f)
+            f.close()
+            os.rename(t_path, s_path)
+        except Exception:  # statistics are informative only
+            pass
+
+    #---------------------------------------------------------------------------
+
+    def read_stats(self):
+        """
+        Return dictionary of hit and miss counters.
+        """
+
+        stats = {'hits': 0, 'misses': 0}
+
+        try:
+            f = open(os.path.join(self.root, 'cache_stats.json'))
+            stats.update(json.load(f))
+            f.close()
+        except Exception:
+            pass
+
+        return stats
+
+    #---------------------------------------------------------------------------
+
+    def lookup(self, key):
+        """
+        Return the path of the directory containing the files of an entry,
+        or None if not present.
+        """
+
+        p = os.path.join(self.root, key)
+
+        if os.path.isdir(p):
+            try:
+                os.utime(p, None)
+                self.__update_stats__('hits')
+                return p
+            except Exception:  # entry evicted concurrently
+                pass
+
+        self.__update_stats__('misses')
+
+        return None
+
+    #---------------------------------------------------------------------------
+
+    def store(self, key, paths):
+        """
+        Store files in a cache entry, then apply the size limit.
+        Return the path of the entry, or None if it could not be stored.
+        """
+
+        p = os.path.join(self.root, key)
+        t = os.path.join(self.root, '.' + key + '.' + str(os.getpid()))
+
+        try:
+            if not os.path.isdir(self.root):
+                os.makedirs(self.root)
+            if os.path.isdir(t):
+                shutil.rmtree(t)
+            os.mkdir(t)
+            for f in paths:
+                shutil.copy2(f, os.path.join(t, os.path.basename(f)))
+            if os.path.isdir(p):
+                shutil.rmtree(t)
+            else:
+                os.rename(t, p)
+        except Exception:
+            if os.path.isdir(t):
+                shutil.rmtree(t, ignore_errors=True)
+            return None
+
+        self.evict()
+
+        if not os.path.isdir(p):
+            return None
+
+        return p
+
+    #---------------------------------------------------------------------------
+
+    def evict(self):
+        """
+        Remove least recently used entries until the size limit is met.
+        """
+
+        entries = self.__entries__()
+        entries.sort(key=lambda e: e[1])
+
+        size = 0
+        for e in entries:
+            size += e[2]
+
+        for e in entries:
+            if size <= self.max_size:
+                break
+            shutil.rmtree(e[0], ignore_errors=True)
+            size -= e[2]
+
+    #---------------------------------------------------------------------------
+
+    def stats_str(self):
+        """
+        Return a string describing the cache state and statistics.
+        """
+
+        entries = self.__entries__()
+        size = 0
+        for e in entries:
+            size += e[2]
+
+        stats = self.read_stats()
+        n_calls = stats['hits'] + stats['misses']
+        ratio = 0.
+        if n_calls > 0:
+            ratio = 100. * stats['hits'] / n_calls
+
+        mib = 1024.*1024.
+
+        s = 'Cache "' + self.name + '": ' + self.root + '\n' \
+            + '  entries    : %d\n' % len(entries) \
+            + '  size       : %.1f MiB / %.1f MiB\n' % (size/mib,
+                                                        self.max_size/mib) \
+            + '  hits       : %d\n' % stats['hits'] \
+            + '  misses     : %d\n' % stats['misses'] \
+            + '  hit ratio  : %.1f %%\n' % ratio
+
+        if entries:
+            entries.sort(key=lambda e: e[1])
+            s += '  oldest     : ' + time.ctime(entries[0][1]) + '\n' \
+                 + '  newest     : ' + time.ctime(entries[-1][1]) + '\n'
+
+        return s
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
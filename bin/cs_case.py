@@ -36,6 +36,8 @@ import sys
 import stat
 
 from code_saturne import cs_exec_environment
+from code_saturne import cs_file_stage
+from code_saturne import cs_run_timings
 
 from code_saturne.cs_case_domain import *
 
@@ -232,6 +234,10 @@ class case:
         self.script_dir = os.path.join(self.case_dir, 'SCRIPTS')
         self.result_dir = None
 
+        # Timer of run stages (enabled when running)
+
+        self.timer = cs_run_timings.run_timer(enabled=False)
+
         if (os.path.isdir(os.path.join(case_dir, 'DATA')) and n_domains == 1):
             # Simple domain case from standard directory structure
             (self.study_dir, self.name) = os.path.split(case_dir)
@@ -683,6 +689,59 @@ class case:
 
     #---------------------------------------------------------------------------
 
+    def summary_staging(self, stager):
+
+        """
+        Append results staging info to summary.
+        """
+
+        s_path = os.path.join(self.result_dir, 'summary')
+        if not os.path.isfile(s_path):
+            s_path = os.path.join(self.exec_dir, 'summary')
+        if not stager.records or not os.path.isfile(s_path):
+            return
+
+        dhline = '========================================================\n'
+
+        s = open(s_path, 'a')
+        stager.summary_info(s, self.result_dir)
+        s.write(dhline)
+        s.close()
+
+    #---------------------------------------------------------------------------
+
+    def summary_timings(self):
+
+        """
+        Write run stage timings (and profiles if enabled) to the
+        results directory, and append their summary to summary.
+        """
+
+        if not self.timer.records:
+            return
+
+        try:
+            self.timer.write_json(self.result_dir)
+            self.timer.write_profiles(self.result_dir)
+        except Exception as e:
+            sys.stderr.write('Warning: unable to write run timings:\n'
+                             + str(e) + '\n')
+
+        s_path = os.path.join(self.result_dir, 'summary')
+        if not os.path.isfile(s_path):
+            s_path = os.path.join(self.exec_dir, 'summary')
+        if not os.path.isfile(s_path):
+            return
+
+        dhline = '========================================================\n'
+
+        s = open(s_path, 'a')
+        s.write('Run timings      : ' + self.timer.summary_str() + '\n')
+        s.write(dhline)
+        s.close()
+
+    #---------------------------------------------------------------------------
+
     def copy_log(self, name):
         """
         Retrieve single log file from the execution directory
@@ -1363,7 +1422,9 @@ class case:
         for d in self.domains:
             if not hasattr(d, 'needs_compile'):
                 continue
-            if d.needs_compile() == True:
+            with self.timer.stage('needs_compile', d.name):
+                d_needs_compile = d.needs_compile()
+            if d_needs_compile == True:
                 if need_compile == False: # Print banner on first pass
                     need_compile = True
                     msg = \
@@ -1372,7 +1433,8 @@ class case:
                         " ****************************************\n\n"
                     sys.stdout.write(msg)
                     sys.stdout.flush()
-                d.compile_and_link()
+                with self.timer.stage('compile_and_link', d.name):
+                    d.compile_and_link()
                 if len(d.error) > 0:
                     self.error = d.error
                     if len(d.error_long) > 0:
@@ -1392,7 +1454,8 @@ class case:
         sys.stdout.flush()
 
         for d in (self.domains + self.syr_domains + self.py_domains):
-            d.prepare_data()
+            with self.timer.stage('copy_data', d.name):
+                d.prepare_data()
             if len(d.error) > 0:
                 self.error = d.error
 
@@ -1526,7 +1589,8 @@ class case:
         self.summary_init(exec_env)
 
         for d in (self.domains + self.syr_domains + self.py_domains):
-            d.preprocess()
+            with self.timer.stage('preprocess', d.name, python=False):
+                d.preprocess()
             if len(d.error) > 0:
                 self.error = d.error
 
@@ -1682,11 +1746,25 @@ class case:
                     except Exception:
                         pass
 
+        # Results of all domains are staged through a common stager,
+        # so that large files are copied concurrently.
+
+        stager = cs_file_stage.file_stager()
+
         e_caption = None
-        for d in (self.domains + self.syr_domains + self.py_domains):
-            d.copy_results()
-            if d.error:
-                e_caption = d.error
+        try:
+            for d in (self.domains + self.syr_domains + self.py_domains):
+                d.stager = stager
+                with self.timer.stage('copy_results', d.name):
+                    d.copy_results()
+                if d.error:
+                    e_caption = d.error
+        finally:
+            stager.close()
+            for d in (self.domains + self.syr_domains + self.py_domains):
+                d.stager = None
+
+        self.summary_staging(stager)
 
         # Remove directories if empty
 
@@ -1818,24 +1896,36 @@ class case:
 
         self.update_scripts_tmp(('failed,',
                                  'exceeded_time_limit'), None)
+
+        # Time run stages
+
+        self.timer = cs_run_timings.run_timer()
+        for d in (self.domains + self.syr_domains + self.py_domains):
+            d.timer = self.timer
+
         # Now run
 
         try:
             retcode = 0
             if stages['prepare_data']:
-                retcode = self.prepare_data(force_id)
+                with self.timer.stage('prepare_data'):
+                    retcode = self.prepare_data(force_id)
             else:
-                self.init_prepared_data()
+                with self.timer.stage('init_prepared_data'):
+                    self.init_prepared_data()
 
             if stages['initialize'] and  retcode == 0:
-                retcode = self.preprocess(n_procs,
-                                          n_threads,
-                                          mpiexec_options)
+                with self.timer.stage('preprocess'):
+                    retcode = self.preprocess(n_procs,
+                                              n_threads,
+                                              mpiexec_options)
             if stages['run_solver'] == True and retcode == 0:
-                self.run_solver()
+                with self.timer.stage('run_solver', python=False):
+                    self.run_solver()
 
             if stages['save_results'] == True:
-                self.save_results()
+                with self.timer.stage('save_results'):
+                    self.save_results()
                 self.clear_exec_dir_stamp()
 
         finally:
@@ -1844,6 +1934,7 @@ class case:
                                          'ready',
                                          'running',
                                          'finished'), None)
+            self.summary_timings()
 
         # Standard or error exit
 
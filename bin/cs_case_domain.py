@@ -30,26 +30,37 @@ except Exception:
     import configparser  # Python3
 import datetime
 import fnmatch
+import hashlib
+import json
 import os
 import os.path
 import sys
 import shutil
 import stat
 
+from code_saturne import cs_cache
 from code_saturne import cs_compile
+from code_saturne import cs_file_stage
+from code_saturne import cs_run_timings
 from code_saturne import cs_xml_reader
 
-from code_saturne.cs_exec_environment import run_command
+from code_saturne.cs_exec_environment import run_command, run_commands
+from code_saturne.cs_exec_environment import get_available_cores
+from code_saturne.cs_exec_environment import get_available_memory
 from code_saturne.cs_exec_environment import enquote_arg, separate_args
 from code_saturne.cs_exec_environment import get_ld_library_path_additions
 from code_saturne.cs_exec_environment import source_syrthes_env
 
-from code_saturne.cs_mei_to_c import mei_to_c_interpreter
-
 #===============================================================================
 # Utility functions
 #===============================================================================
 
+# Estimated ratio of the memory used by the preprocessor to the mesh file size
+
+_preprocessor_mem_factor = 10
+
+#-------------------------------------------------------------------------------
+
 def any_to_str(arg):
     """Transform single values or lists to a whitespace-separated string"""
 
@@ -79,6 +90,25 @@ def make_clean_dir(path):
 
 #-------------------------------------------------------------------------------
 
+def get_notebook_values(path):
+    """
+    Return a dictionary of notebook variable values of a parameters file.
+    """
+
+    from xml.dom import minidom
+
+    values = {}
+
+    doc = minidom.parse(path)
+    for node in doc.getElementsByTagName('notebook'):
+        for v in node.getElementsByTagName('var'):
+            values[str(v.getAttribute('name'))] = float(v.getAttribute('value'))
+    doc.unlink()
+
+    return values
+
+#-------------------------------------------------------------------------------
+
 class RunCaseError(Exception):
     """Base class for exception handling."""
 
@@ -136,6 +166,14 @@ class base_domain:
         self.exec_dir = None
         self.solver_path = None
 
+        # Stager used to copy results (shared by domains when set)
+
+        self.stager = None
+
+        # Timer of run stages (set by the case when running)
+
+        self.timer = cs_run_timings.run_timer(enabled=False)
+
         # Execution and debugging options
 
         self.n_procs = n_procs_weight
@@ -224,6 +262,8 @@ class base_domain:
         """
         Copy a file or directory to the results directory,
         optionally removing it from the source.
+        Files are staged through the domain's stager if set (in which
+        case large files may be copied asynchronously), or synchronously.
         """
 
         # Determine absolute source and destination names
@@ -240,12 +280,14 @@ class base_domain:
         if src == dest:
             return
 
+        stager = self.stager
+        if stager == None:
+            stager = cs_file_stage.file_stager(n_threads=1)
+
         # Copy single file
 
         if os.path.isfile(src):
-            shutil.copy2(src, dest)
-            if purge:
-                os.remove(src)
+            stager.stage(src, dest, purge)
 
         # Copy single directory (possibly recursive)
         # Unkike os.path.copytree, the destination directory
@@ -253,23 +295,40 @@ class base_domain:
 
         elif os.path.isdir(src):
 
-            if not os.path.isdir(dest):
-                os.mkdir(dest)
-            l = os.listdir(src)
-            for f in l:
-                f_src = os.path.join(src, f)
-                f_dest = os.path.join(dest, f)
-                if os.path.isfile(f_src):
-                    shutil.copy2(f_src, f_dest)
-                elif os.path.isdir(f_src):
-                    self.copy_result(f_src, f_dest)
+            self.__copy_dir__(src, dest, purge and not os.path.islink(src),
+                              stager)
 
             if purge:
+                stager.wait()
                 if os.path.islink(src):
-                    os.remove(f)
+                    os.remove(src)
                 else:
                     shutil.rmtree(src)
 
+        if self.stager == None:
+            stager.close()
+
+    #---------------------------------------------------------------------------
+
+    def __copy_dir__(self, src, dest, purge, stager):
+        """
+        Copy the contents of a directory recursively using a stager.
+        Files are moved if purge is True (except in linked directories),
+        directories are left in place.
+        """
+
+        if not os.path.isdir(dest):
+            os.mkdir(dest)
+        l = os.listdir(src)
+        for f in l:
+            f_src = os.path.join(src, f)
+            f_dest = os.path.join(dest, f)
+            if os.path.isfile(f_src):
+                stager.stage(f_src, f_dest, purge)
+            elif os.path.isdir(f_src):
+                self.__copy_dir__(f_src, f_dest,
+                                  purge and not os.path.islink(f_src), stager)
+
     #---------------------------------------------------------------------------
 
     def purge_result(self, name):
@@ -382,7 +441,9 @@ class domain(base_domain):
                  logging_args = None,         # command-line options for logging
                  param = None,                # XML parameters file
                  prefix = None,               # installation prefix
-                 adaptation = None):          # HOMARD adaptation script
+                 adaptation = None,           # HOMARD adaptation script
+                 notebook = None,             # notebook variable overrides
+                 warm_start = False):         # restart from nearest run
 
         base_domain.__init__(self, package,
                              name,
@@ -424,6 +485,10 @@ class domain(base_domain):
         else:
             self.param = None
 
+        self.notebook = notebook
+        self.warm_start = warm_start
+        self.warm_start_source = None
+
         self.logging_args = logging_args
         self.solver_args = None
 
@@ -476,6 +541,96 @@ class domain(base_domain):
 
     #---------------------------------------------------------------------------
 
+    def __set_warm_start__(self):
+        """
+        Select the checkpoint of the finished run of this case whose
+        notebook variable values are closest to those of the current run
+        (values of each variable being scaled by their range), and set it
+        as restart in the parameters file of the execution directory.
+        Nothing is done if a restart is already defined.
+        """
+
+        if self.param == None or self.restart_input != None:
+            return
+
+        fp = os.path.join(self.exec_dir, self.param)
+        try:
+            values = get_notebook_values(fp)
+        except Exception:
+            print(' Warm start ignored: notebook values could not be read.\n')
+            return
+        if not values:
+            return
+
+        # Index finished runs (with a checkpoint and no error)
+        # by their notebook values
+
+        results_dir = os.path.abspath(os.path.join(self.result_dir, '..'))
+        result_dir = os.path.abspath(self.result_dir)
+
+        runs = []
+        for r in os.listdir(results_dir):
+            d = os.path.join(results_dir, r)
+            if d == result_dir:
+                continue
+            if not os.path.isfile(os.path.join(d, 'checkpoint', 'main')):
+                continue
+            if fnmatch.filter(os.listdir(d), 'error*'):
+                continue
+            try:
+                r_values = get_notebook_values(os.path.join(d, self.param))
+            except Exception:
+                continue
+            if sorted(r_values.keys()) == sorted(values.keys()):
+                runs.append((r, r_values))
+
+        if not runs:
+            return
+
+        scale = {}
+        for k in values:
+            v = [r_values[k] for r, r_values in runs] + [values[k]]
+            scale[k] = max(v) - min(v)
+            if scale[k] <= 0:
+                scale[k] = 1.
+
+        def distance(run):
+            d = 0.
+            for k in values:
+                d += ((run[1][k] - values[k]) / scale[k])**2
+            return (d, run[0])
+
+        r = min(runs, key=distance)[0]
+
+        self.restart_input = os.path.join(results_dir, r, 'checkpoint')
+        self.warm_start_source = r
+
+        # Update parameters file; the stop criterion is made relative
+        # to the restart, so that each run has the same time steps budget
+
+        from code_saturne.model.XMLengine import Case
+        from code_saturne.model.StartRestartModel import StartRestartModel
+        from code_saturne.model.TimeStepModel import TimeStepModel
+
+        case = Case(package=self.package, file_name=fp)
+        case['xmlfile'] = fp
+        case.xmlCleanAllBlank(case.xmlRootNode())
+
+        rs = StartRestartModel(case)
+        rs.setRestartPath(self.restart_input)
+        rs.setRestartWithAuxiliaryStatus('on')
+
+        ts = TimeStepModel(case)
+        crit_type, value = ts.getStopCriterion()
+        if crit_type in ('iterations', 'maximum_time'):
+            ts.setStopCriterion(crit_type + '_add', value)
+
+        case.xmlSaveDocument()
+
+        print(' Warm start from closest run: ' + r + '\n')
+
+    #---------------------------------------------------------------------------
+
     def for_domain_str(self):
 
         if self.name == None:
@@ -593,9 +748,30 @@ class domain(base_domain):
 
     #---------------------------------------------------------------------------
 
+    def get_setup_cache_key(self, setup_path):
+        """
+        Determine the setup scan cache key, based on a hash of
+        the setup file and version.
+        """
+
+        h = hashlib.sha1()
+
+        s = 'version:' + self.package.version_full + '\n'
+        h.update(s.encode('utf-8'))
+
+        cs_cache.hash_files(h, [setup_path], ['setup.xml'])
+
+        return h.hexdigest()
+
+    #---------------------------------------------------------------------------
+
     def needs_compile(self):
         """
-        Compile and link user subroutines if necessary
+        Compile and link user subroutines if necessary.
+        Whether the setup file requires MEG code generation is stored
+        in the 'setup' user cache, indexed by a hash of the initialized
+        setup file, so that its initialization is skipped when it is
+        unchanged, as well as MEG parsing when no code is needed.
         """
         # Check if there are files to compile in source path
 
@@ -608,35 +784,74 @@ class domain(base_domain):
 
         if self.param != None:
             from code_saturne.model.XMLengine import Case
-            from code_saturne.model.SolutionDomainModel import getRunType
 
             fp = os.path.join(self.data_dir, self.param)
-            case = Case(package=self.package, file_name=fp)
-            case['xmlfile'] = fp
-            case.xmlCleanAllBlank(case.xmlRootNode())
-
-            prepro = (getRunType(case) != 'standard')
-            module_name = case.module_name()
-            if module_name == 'code_saturne':
-                from code_saturne.model.XMLinitialize import XMLinit
-                XMLinit(case).initialize(prepro)
-            elif module_name == 'neptune_cfd':
-                from code_saturne.model.XMLinitializeNeptune import XMLinitNeptune
-                XMLinitNeptune(case).initialize(prepro)
-            case.xmlSaveDocument()
+
+            cache = cs_cache.file_cache(self.package, 'setup', default_size=1)
+            meg_code = None
+            if cache.enabled():
+                cache_entry = cache.lookup(self.get_setup_cache_key(fp))
+                if cache_entry:
+                    try:
+                        f = open(os.path.join(cache_entry, 'setup_scan.json'))
+                        meg_code = json.load(f)['meg_code']
+                        f.close()
+                    except Exception:
+                        meg_code = None
+
+            if meg_code == False:
+                self.mci = None
+                return needs_comp
+
+            with self.timer.stage('xml_initialize', self.name):
+                case = Case(package=self.package, file_name=fp)
+                case['xmlfile'] = fp
+                case.xmlCleanAllBlank(case.xmlRootNode())
+                module_name = case.module_name()
+                if meg_code == None:
+                    self.__initialize_setup__(case, module_name)
+
+            from code_saturne.cs_mei_to_c import mei_to_c_interpreter
 
             case['case_path'] = self.exec_dir
-            self.mci = mei_to_c_interpreter(case, module_name=module_name)
+            with self.timer.stage('meg_parse', self.name):
+                self.mci = mei_to_c_interpreter(case, module_name=module_name)
 
             if self.mci.has_meg_code():
                 needs_comp = True
             else:
                 self.mci = None
 
+            if meg_code == None and cache.enabled():
+                f_path = os.path.join(self.exec_dir, 'setup_scan.json')
+                f = open(f_path, 'w')
+                json.dump({'meg_code': self.mci != None}, f)
+                f.close()
+                cache.store(self.get_setup_cache_key(fp), [f_path])
+                os.remove(f_path)
+
         return needs_comp
 
     #---------------------------------------------------------------------------
 
+    def __initialize_setup__(self, case, module_name):
+        """
+        Initialize setup (adding default and updated settings) and save it.
+        """
+
+        from code_saturne.model.SolutionDomainModel import getRunType
+
+        prepro = (getRunType(case) != 'standard')
+        if module_name == 'code_saturne':
+            from code_saturne.model.XMLinitialize import XMLinit
+            XMLinit(case).initialize(prepro)
+        elif module_name == 'neptune_cfd':
+            from code_saturne.model.XMLinitializeNeptune import XMLinitNeptune
+            XMLinitNeptune(case).initialize(prepro)
+        case.xmlSaveDocument()
+
+    #---------------------------------------------------------------------------
+
     def compile_and_link(self):
         """
         Compile and link user subroutines if necessary
@@ -666,7 +881,8 @@ class domain(base_domain):
                     shutil.copy2(src_file, dest_file)
 
             if self.mci != None:
-                mci_state = self.mci.save_all_functions()
+                with self.timer.stage('meg_generation', self.name):
+                    mci_state = self.mci.save_all_functions()
                 if mci_state['state'] == -1:
                     self.error = 'compile or link'
                     self.error_long = ' missing mathematical expressions:\n\n'
@@ -681,17 +897,59 @@ class domain(base_domain):
 
             solver_name = os.path.basename(self.solver_path)
 
-            retval = cs_compile.compile_and_link(self.package_compute,
-                                                 solver_name,
-                                                 exec_src,
-                                                 self.exec_dir,
-                                                 self.compile_cflags,
-                                                 self.compile_cxxflags,
-                                                 self.compile_fcflags,
-                                                 self.compile_libs,
-                                                 keep_going=True,
-                                                 stdout=log,
-                                                 stderr=log)
+            # Reuse a previously compiled solver if sources, generated
+            # code, flags and version are identical
+
+            cache = cs_cache.file_cache(self.package, 'compile')
+            cache_key = None
+            cache_entry = None
+            if cache.enabled():
+                c = cs_compile.cs_compile(self.package_compute)
+                cache_key = c.get_cache_key(solver_name,
+                                            exec_src,
+                                            self.compile_cflags,
+                                            self.compile_cxxflags,
+                                            self.compile_fcflags,
+                                            self.compile_libs)
+                cache_entry = cache.lookup(cache_key)
+
+            # The entry may have been evicted since lookup, in which
+            # case the solver is compiled
+
+            if cache_entry:
+                if not cs_cache.link_or_copy(os.path.join(cache_entry,
+                                                          solver_name),
+                                             os.path.join(self.exec_dir,
+                                                          solver_name)):
+                    log.write('Compile cache entry ' + cache_key
+                              + ' removed before use\n')
+                    cache_entry = None
+
+            if cache_entry:
+                log.write('Compile cache hit: ' + cache_key + '\n'
+                          + '  using ' + solver_name + ' from '
+                          + cache_entry + '\n')
+                retval = 0
+
+            else:
+                with self.timer.stage('compile', self.name, python=False):
+                    retval = cs_compile.compile_and_link(self.package_compute,
+                                                         solver_name,
+                                                         exec_src,
+                                                         self.exec_dir,
+                                                         self.compile_cflags,
+                                                         self.compile_cxxflags,
+                                                         self.compile_fcflags,
+                                                         self.compile_libs,
+                                                         keep_going=True,
+                                                         stdout=log,
+                                                         stderr=log)
+
+                if retval == 0 and cache_key:
+                    f = os.path.join(self.exec_dir, solver_name)
+                    if cache.store(cache_key, [f]):
+                        log.write('\nCompiled solver stored in cache: '
+                                  + cache_key + '\n')
 
             log.close()
 
@@ -707,6 +965,47 @@ class domain(base_domain):
 
     #---------------------------------------------------------------------------
 
+    def apply_notebook_overrides(self):
+        """
+        Override notebook variable values in the copy of the parameters
+        file of the execution directory, so that the case data, the
+        preprocessed mesh and the compiled solver are unchanged.
+        Returns an error string (empty if no error).
+        """
+
+        if self.param == None:
+            return 'Notebook variables may not be overridden ' \
+                + 'without a parameters file.\n\n'
+
+        from code_saturne.model.XMLengine import Case
+        from code_saturne.model.NotebookModel import NotebookModel
+
+        fp = os.path.join(self.exec_dir, self.param)
+
+        case = Case(package=self.package, file_name=fp)
+        case['xmlfile'] = fp
+        case.xmlCleanAllBlank(case.xmlRootNode())
+
+        nb = NotebookModel(case)
+        var_names = nb.getVarNameList()
+
+        err_str = ''
+        for k in sorted(self.notebook.keys()):
+            if not k in var_names:
+                err_str += 'Notebook variable "' + k + '" is not defined' \
+                    + ' in ' + self.param + '.\n\n'
+            else:
+                nb.setVariableValue(val=str(self.notebook[k]), var=k)
+                print(' Notebook variable ' + k + ' = '
+                      + str(self.notebook[k]) + '\n')
+
+        if not err_str:
+            case.xmlSaveDocument()
+
+        return err_str
+
+    #---------------------------------------------------------------------------
+
     def prepare_data(self):
         """
         Copy data to the execution directory
@@ -739,6 +1038,16 @@ class domain(base_domain):
                 eval(m + '(self)', globals(), self.user_locals)
                 del self.user_locals[m]
 
+        # Notebook variable overrides
+
+        if self.notebook:
+            err_str += self.apply_notebook_overrides()
+
+        # Warm start from the closest previous run if requested
+
+        if self.warm_start and not err_str:
+            self.__set_warm_start__()
+
         # Restart files
 
         # Handle automatic case first
@@ -848,9 +1157,42 @@ class domain(base_domain):
 
     #---------------------------------------------------------------------------
 
+    def get_mesh_cache_key(self, mesh_path, options):
+        """
+        Determine the preprocessed mesh cache key, based on a hash of
+        the mesh file, preprocessor options and version. Return None
+        for meshes which may not be cached (with postprocessing output,
+        or referring to other files).
+        """
+
+        if '--post-volume' in options:
+            return None
+        if os.path.splitext(mesh_path)[1].lower() == '.case':
+            return None
+
+        h = hashlib.sha1()
+
+        s = 'version:' + self.package.version_full + '\n' \
+            + 'options:' + ' '.join(options) + '\n'
+        h.update(s.encode('utf-8'))
+
+        ext = os.path.splitext(mesh_path)[1]
+        cs_cache.hash_files(h, [mesh_path], ['mesh' + ext])
+
+        return h.hexdigest()
+
+    #---------------------------------------------------------------------------
+
     def preprocess(self):
         """
-        Runs the preprocessor in the execution directory
+        Runs the preprocessor in the execution directory.
+        With multiple meshes, preprocessor instances are run concurrently,
+        within the number of available cores and memory (estimated as
+        a multiple of the mesh file sizes). The number of concurrent
+        instances may be set with the 'preprocessor_jobs' option of the
+        'run' section of the user configuration file.
+        Preprocessed meshes are reused from the 'mesh_input' user cache
+        when possible (see cs_cache).
         """
 
         if self.mesh_input:
@@ -911,7 +1253,13 @@ class domain(base_domain):
             ld_library_path += ld_library_path_save
             os.environ['LD_LIBRARY_PATH'] = ld_library_path
 
-        # Run once per mesh
+        # Build commands (once per mesh)
+
+        cmds = []
+        logs = []
+        outputs = []
+        mem = []
+        cache_keys = []
 
         for m in self.meshes:
 
@@ -945,9 +1293,10 @@ class domain(base_domain):
 
             cmd = [self.package.get_preprocessor()]
 
+            options = []
             if (type(m) == tuple):
-                for opt in m[1:]:
-                    cmd.append(opt)
+                options = list(m[1:])
+            cmd += options
 
             if (mesh_id != None):
                 mesh_id += 1
@@ -955,27 +1304,88 @@ class domain(base_domain):
                 cmd = cmd + ['--out', os.path.join('mesh_input',
                                                    'mesh_%02d.csm' % (mesh_id))]
                 cmd = cmd + ['--case', 'preprocessor_%02d' % (mesh_id)]
+                logs.append('preprocessor_%02d.log' % (mesh_id))
+                outputs.append(os.path.join('mesh_input',
+                                            'mesh_%02d.csm' % (mesh_id)))
             else:
                 cmd = cmd + ['--log']
                 cmd = cmd + ['--out', 'mesh_input.csm']
+                logs.append('preprocessor.log')
+                outputs.append('mesh_input.csm')
 
             cmd.append(mesh_path)
 
-            # Run command
+            cmds.append(cmd)
+            mem.append(os.path.getsize(mesh_path) * _preprocessor_mem_factor)
+            cache_keys.append(self.get_mesh_cache_key(mesh_path, options))
 
-            retcode = run_command(cmd, pkg=self.package)
+        # Reuse previously preprocessed meshes if mesh files, options
+        # and version are identical
 
-            if retcode != 0:
-                err_str = \
-                    'Error running the preprocessor.\n' \
-                    'Check the preprocessor.log file for details.\n\n'
-                sys.stderr.write(err_str)
+        cache = cs_cache.file_cache(self.package, 'mesh_input')
+        if not cache.enabled():
+            cache_keys = [None for k in cache_keys]
 
-                self.exec_solver = False
+        run_ids = []
+        for i, key in enumerate(cache_keys):
+            cache_entry = None
+            if key:
+                cache_entry = cache.lookup(key)
 
-                self.error = 'preprocess'
+            # The entry may have been evicted since lookup, in which
+            # case partial outputs are removed and the mesh is preprocessed
 
-                break
+            if cache_entry:
+                try:
+                    for f in os.listdir(cache_entry):
+                        if f[-4:] == '.csm':
+                            if not cs_cache.link_or_copy(
+                                    os.path.join(cache_entry, f), outputs[i]):
+                                raise IOError(f)
+                        elif f[-4:] == '.log':
+                            shutil.copy2(os.path.join(cache_entry, f), logs[i])
+                    if not os.path.isfile(outputs[i]):
+                        raise IOError(outputs[i])
+                except Exception:
+                    for f in (outputs[i], logs[i]):
+                        if os.path.isfile(f):
+                            os.remove(f)
+                    cache_entry = None
+
+            if cache_entry:
+                sys.stdout.write(' Preprocessed mesh reused from cache: '
+                                 + cmds[i][-1] + '\n'
+                                 + '   (' + cache_entry + ')\n')
+            else:
+                run_ids.append(i)
+
+        # Run commands
+
+        n_jobs = min(len(run_ids), get_available_cores())
+        if u_cfg.has_option('run', 'preprocessor_jobs'):
+            n_jobs = max(int(u_cfg.get('run', 'preprocessor_jobs')), 1)
+
+        failed_id, retcode = run_commands([cmds[i] for i in run_ids],
+                                          pkg=self.package,
+                                          n_jobs=n_jobs,
+                                          mem=[mem[i] for i in run_ids],
+                                          max_mem=get_available_memory())
+
+        if retcode != 0:
+            err_str = \
+                'Error running the preprocessor.\n' \
+                'Check the ' + logs[run_ids[failed_id]] \
+                + ' file for details.\n\n'
+            sys.stderr.write(err_str)
+
+            self.exec_solver = False
+
+            self.error = 'preprocess'
+
+        else:
+            for i in run_ids:
+                if cache_keys[i] and os.path.isfile(outputs[i]):
+                    cache.store(cache_keys[i], [outputs[i], logs[i]])
 
         # Restore environment
 
@@ -1109,6 +1519,8 @@ class domain(base_domain):
             valid_dir = True
             self.copy_result(cpt, purge)
             dir_files.remove(cpt)
+            if self.stager != None:
+                self.stager.wait()
 
         # Now copy all other files
 
@@ -1134,6 +1546,9 @@ class domain(base_domain):
         if self.exec_solver:
             s.write('    solver       : ' + self.solver_path + '\n')
 
+        if self.warm_start_source:
+            s.write('    warm start   : ' + self.warm_start_source + '\n')
+
 #-------------------------------------------------------------------------------
 
 # SYRTHES 4 coupling
@@ -24,7 +24,10 @@
 #-------------------------------------------------------------------------------
 
 import fnmatch
+import hashlib
 import os
+import re
+import subprocess
 import sys
 import tempfile
 
@@ -32,8 +35,11 @@ from optparse import OptionParser
 
 try:
     from code_saturne.cs_exec_environment import run_command, separate_args
+    from code_saturne.cs_exec_environment import assemble_args
+    from code_saturne.cs_exec_environment import get_available_cores
 except Exception:
     from cs_exec_environment import run_command, separate_args
+    from cs_exec_environment import assemble_args, get_available_cores
 
 #-------------------------------------------------------------------------------
 
@@ -95,6 +101,15 @@ def process_cmd_line(argv, pkg):
                       metavar="<libs>",
                       help="additional libraries")
 
+    parser.add_option("-j", "--jobs", dest="n_jobs", type="int",
+                      metavar="<n_jobs>",
+                      help="number of files compiled simultaneously " \
+                      + "(default: number of available cores)")
+
+    parser.add_option("--cache-stats", dest="cache_stats",
+                      action="store_true",
+                      help="print compiled solver cache statistics and exit")
+
     parser.set_defaults(test_mode=False)
     parser.set_defaults(force_link=False)
     parser.set_defaults(keep_going=False)
@@ -106,6 +121,8 @@ def process_cmd_line(argv, pkg):
     parser.set_defaults(fccflags=None)
     parser.set_defaults(libs=None)
     parser.set_defaults(log_name=None)
+    parser.set_defaults(n_jobs=None)
+    parser.set_defaults(cache_stats=False)
 
     (options, args) = parser.parse_args(argv)
 
@@ -129,7 +146,8 @@ def process_cmd_line(argv, pkg):
 
     return options.test_mode, options.force_link, options.keep_going, \
            src_dir, dest_dir, options.version, options.cflags, \
-           options.cxxflags, options.fcflags, options.libs
+           options.cxxflags, options.fcflags, options.libs, \
+           options.n_jobs, options.cache_stats
 
 #-------------------------------------------------------------------------------
 
@@ -147,6 +165,49 @@ def files_to_compile(src_dir):
 
     return src_files
 
+#-------------------------------------------------------------------------------
+
+_f_module_re = re.compile(r'^\s*module\s+(?!procedure\b)(\w+)',
+                          re.IGNORECASE | re.MULTILINE)
+_f_use_re = re.compile(r'^\s*use\s*(?:,\s*\w+\s*::)?\s*(\w+)',
+                       re.IGNORECASE | re.MULTILINE)
+
+def fortran_build_levels(f_files):
+    """
+    Return a list of lists of Fortran files, such that files of a given
+    list only use modules defined in files of preceding lists.
+    """
+
+    defined = {}
+    used = {}
+
+    for f in f_files:
+        try:
+            src = open(f).read()
+        except Exception:
+            src = ''
+        used[f] = set([m.lower() for m in _f_use_re.findall(src)])
+        for m in _f_module_re.findall(src):
+            defined[m.lower()] = f
+
+    deps = {}
+    for f in f_files:
+        deps[f] = set([defined[m] for m in used[f]
+                       if m in defined and defined[m] != f])
+
+    levels = []
+    remaining = list(f_files)
+    done = set()
+    while remaining:
+        level = [f for f in remaining if deps[f] <= done]
+        if not level:  # circular dependencies; keep initial order
+            level = remaining
+        levels.append(level)
+        done.update(level)
+        remaining = [f for f in remaining if f not in done]
+
+    return levels
+
 #===============================================================================
 # Class used to manage compilation
 #===============================================================================
@@ -321,15 +382,112 @@ class cs_compile(object):
 
     #-------------------------------------------------------------------------------
 
+    def run_jobs(self, jobs, n_jobs=1, keep_going=False,
+                 stdout=sys.stdout, stderr=sys.stderr):
+        """
+        Run compilation jobs. Jobs are given as a list of stages, each
+        stage being a list of (command, object name) tuples which may be
+        run simultaneously. When run in parallel, the standard output and
+        error of each job are buffered, and written in job order.
+        """
+        retval = 0
+        o_files = []
+
+        pkg = self.pkg
+
+        if n_jobs == None:
+            n_jobs = get_available_cores()
+
+        if n_jobs < 2:
+            for stage in jobs:
+                for cmd, o_name in stage:
+                    if (retval != 0 and not keep_going):
+                        break
+                    if run_command(cmd, pkg=pkg, echo=True,
+                                   stdout=stdout, stderr=stderr) != 0:
+                        retval = 1
+                    o_files.append(o_name)
+            return retval, o_files
+
+        from multiprocessing.pool import ThreadPool
+
+        # Modify the PATH for relocatable installation here rather than
+        # in run_command, as the environment is shared by all threads.
+
+        saved_path = None
+        if pkg.config.features['relocatable'] == "yes":
+            if sys.platform.startswith("win"):
+                sep = ";"
+            else:
+                sep = ":"
+            saved_path = os.environ['PATH']
+            os.environ['PATH'] = pkg.get_dir('bindir') + sep + saved_path
+
+        status = {'failed': False}
+
+        # Commands are run directly (not through run_command, which
+        # exits on failure to start a command, and would leave the pool
+        # waiting for the job's result).
+
+        def run_job(job):
+            if status['failed'] and not keep_going:
+                return None
+            out = tempfile.TemporaryFile(mode='w+')
+            err = tempfile.TemporaryFile(mode='w+')
+            ret = 1
+            try:
+                p = subprocess.Popen(job[0], shell=(type(job[0]) == str),
+                                     universal_newlines=True,
+                                     stdout=out, stderr=err)
+                p.communicate()
+                ret = p.returncode
+            except Exception as e:
+                err.write("Failed calling subprocess with:\n")
+                err.write("  args = " + str(job[0]) + "\n")
+                err.write("  error = " + str(e) + "\n")
+            if ret != 0:
+                status['failed'] = True
+            output = []
+            for f in (out, err):
+                f.seek(0)
+                output.append(f.read())
+                f.close()
+            return ret, output[0], output[1]
+
+        pool = ThreadPool(n_jobs)
+
+        for stage in jobs:
+            if (retval != 0 and not keep_going):
+                break
+            for job, r in zip(stage, pool.imap(run_job, stage)):
+                if r == None:
+                    continue
+                stdout.write(assemble_args(job[0]) + '\n' + r[1])
+                stdout.flush()
+                stderr.write(r[2])
+                if r[0] != 0:
+                    retval = 1
+                o_files.append(job[1])
+            stdout.flush()
+            stderr.flush()
+
+        pool.close()
+        pool.join()
+
+        if saved_path != None:
+            os.environ['PATH'] = saved_path
+
+        return retval, o_files
+
+    #-------------------------------------------------------------------------------
+
     def compile_src(self, src_list=None,
                     opt_cflags=None, opt_cxxflags=None, opt_fcflags=None,
                     keep_going=False,
-                    stdout=sys.stdout, stderr=sys.stderr):
+                    stdout=sys.stdout, stderr=sys.stderr, n_jobs=None):
         """
         Compilation function.
         """
-        retval = 0
-
         # Short names
 
         pkg = self.pkg
@@ -360,11 +518,13 @@ class cs_compile(object):
             f_include_dirs.append(os.path.dirname(f))
         f_include_dirs = sorted(set(cxx_include_dirs))
 
-        # Compile files
+        # Build compilation commands; C and C++ files are independent,
+        # Fortran files are compiled after those defining the modules
+        # they use.
+
+        jobs = [[]]
 
         for f in c_files:
-            if (retval != 0 and not keep_going):
-                break
             cmd = [self.get_compiler('cc')]
             if opt_cflags != None:
                 cmd += separate_args(opt_cflags)
@@ -377,14 +537,9 @@ class cs_compile(object):
             cmd += self.get_flags('cppflags')
             cmd += separate_args(pkg.config.flags['cflags'])
             cmd += ["-c", f]
-            if run_command(cmd, pkg=pkg, echo=True,
-                           stdout=stdout, stderr=stderr) != 0:
-                retval = 1
-            o_files.append(self.obj_name(f))
+            jobs[0].append((cmd, self.obj_name(f)))
 
         for f in cxx_files:
-            if (retval != 0 and not keep_going):
-                break
             cmd = [self.get_compiler('cxx')]
             if opt_cxxflags != None:
                 cmd += separate_args(opt_cxxflags)
@@ -396,52 +551,88 @@ class cs_compile(object):
             cmd += self.get_flags('cppflags')
             cmd += separate_args(pkg.config.flags['cxxflags'])
             cmd += ["-c", f]
-            if run_command(cmd, pkg=pkg, echo=True,
-                           stdout=stdout, stderr=stderr) != 0:
-                retval = 1
-            o_files.append(self.obj_name(f))
+            jobs[0].append((cmd, self.obj_name(f)))
+
+        for i, f_level in enumerate(fortran_build_levels(f_files)):
+            if i > 0:
+                jobs.append([])
+            for f in f_level:
+                cmd = [self.get_compiler('fc')]
+                f_base = os.path.basename(f)
+                o_name = self.obj_name(f)
+                if f_base == 'cs_user_boundary_conditions.f90':
+                    o_name = "cs_f_user_boundary_conditions.o"
+                    cmd += ["-o", o_name]
+                if f_base == 'cs_user_parameters.f90':
+                    o_name = "cs_f_user_parameters.o"
+                    cmd += ["-o", o_name]
+                if f_base == 'cs_user_extra_operations.f90':
+                    o_name = "cs_f_user_extra_operations.o"
+                    cmd += ["-o", o_name]
+                if f_base == 'cs_user_initialization.f90':
+                    o_name = "cs_f_user_initialization.o"
+                    cmd += ["-o", o_name]
+                if f_base == 'cs_user_physical_properties.f90':
+                    o_name = "cs_f_user_physical_properties.o"
+                    cmd += ["-o", o_name]
+                if f_base == 'cs_user_porosity.f90':
+                    o_name = "cs_f_user_porosity.o"
+                    cmd += ["-o", o_name]
+                if opt_fcflags != None:
+                    cmd += separate_args(opt_fcflags)
+                for d in f_include_dirs:
+                    cmd += ["-I", d]
+                if pkg.config.fcmodinclude != "-I":
+                    cmd += [pkg.config.fcmodinclude, srcdir]
+                cmd += ["-I", pkg.get_dir('pkgincludedir')]
+                if pkg.config.fcmodinclude != "-I":
+                    cmd += [pkg.config.fcmodinclude, pkg.get_dir('pkgincludedir')]
+                cmd += separate_args(pkg.config.flags['fcflags'])
+                cmd += ["-c", f]
+                jobs[-1].append((cmd, o_name))
 
-        for f in f_files:
-            if (retval != 0 and not keep_going):
-                break
-            cmd = [self.get_compiler('fc')]
-            f_base = os.path.basename(f)
-            o_name = self.obj_name(f)
-            if f_base == 'cs_user_boundary_conditions.f90':
-                o_name = "cs_f_user_boundary_conditions.o"
-                cmd += ["-o", o_name]
-            if f_base == 'cs_user_parameters.f90':
-                o_name = "cs_f_user_parameters.o"
-                cmd += ["-o", o_name]
-            if f_base == 'cs_user_extra_operations.f90':
-                o_name = "cs_f_user_extra_operations.o"
-                cmd += ["-o", o_name]
-            if f_base == 'cs_user_initialization.f90':
-                o_name = "cs_f_user_initialization.o"
-                cmd += ["-o", o_name]
-            if f_base == 'cs_user_physical_properties.f90':
-                o_name = "cs_f_user_physical_properties.o"
-                cmd += ["-o", o_name]
-            if f_base == 'cs_user_porosity.f90':
-                o_name = "cs_f_user_porosity.o"
-                cmd += ["-o", o_name]
-            if opt_fcflags != None:
-                cmd += separate_args(opt_fcflags)
-            for d in f_include_dirs:
-                cmd += ["-I", d]
-            if pkg.config.fcmodinclude != "-I":
-                cmd += [pkg.config.fcmodinclude, srcdir]
-            cmd += ["-I", pkg.get_dir('pkgincludedir')]
-            if pkg.config.fcmodinclude != "-I":
-                cmd += [pkg.config.fcmodinclude, pkg.get_dir('pkgincludedir')]
-            cmd += separate_args(pkg.config.flags['fcflags'])
-            cmd += ["-c", f]
-            if run_command(cmd, pkg=pkg, echo=True,
-                           stdout=stdout, stderr=stderr) != 0:
-                retval = 1
-            o_files.append(o_name)
+        # Compile files
 
-        return retval, o_files
+        retval, job_o_files = self.run_jobs(jobs, n_jobs, keep_going,
+                                            stdout, stderr)
+
+        return retval, o_files + job_o_files
+
+    #---------------------------------------------------------------------------
+
+    def get_cache_key(self, exec_name, srcdir,
+                      opt_cflags=None, opt_cxxflags=None, opt_fcflags=None,
+                      opt_libs=None):
+        """
+        Determine the compiled executable cache key, based on a hash
+        of the source files, compilers, compilation flags and version.
+        """
+
+        try:
+            from code_saturne.cs_cache import hash_files
+        except Exception:
+            from cs_cache import hash_files
+
+        pkg = self.pkg
+
+        h = hashlib.sha1()
+
+        s = 'version:' + pkg.version_full + '\n' \
+            + 'exec:' + os.path.basename(exec_name) + '\n'
+        for c in ['cc', 'cxx', 'fc', 'ld']:
+            s += c + ':' + str(pkg.config.compilers[c]) + '\n'
+        for f in ['cflags', 'cxxflags', 'fcflags']:
+            s += f + ':' + str(pkg.config.flags[f]) + '\n'
+        for f in ['cppflags', 'ldflags', 'libs']:
+            s += f + ':' + ' '.join(self.get_flags(f)) + '\n'
+        opt_flags = [opt_cflags, opt_cxxflags, opt_fcflags, opt_libs]
+        s += 'opt:' + ' | '.join([str(f) for f in opt_flags]) + '\n'
+        h.update(s.encode('utf-8'))
+
+        src_files = sorted(os.listdir(srcdir))
+        hash_files(h, [os.path.join(srcdir, f) for f in src_files], src_files)
+
+        return h.hexdigest()
 
     #---------------------------------------------------------------------------
 
@@ -555,7 +746,7 @@ class cs_compile(object):
     def compile_and_link(self, base_name, srcdir, destdir=None, src_list=None,
                          opt_cflags=None, opt_cxxflags=None, opt_fcflags=None,
                          opt_libs=None, force_link=False, keep_going=False,
-                         stdout=sys.stdout, stderr=sys.stderr):
+                         stdout=sys.stdout, stderr=sys.stderr, n_jobs=None):
         """
         Compilation and link function.
         """
@@ -588,7 +779,7 @@ class cs_compile(object):
 
         retval, obj_list = self.compile_src(src_list,
                                             opt_cflags, opt_cxxflags, opt_fcflags,
-                                            keep_going, stdout, stderr)
+                                            keep_going, stdout, stderr, n_jobs)
 
         if retval == 0 and (force_link or len(obj_list)) > 0:
             retval = self.link_obj(exec_name, obj_files=obj_list,
@@ -612,7 +803,7 @@ class cs_compile(object):
 def compile_and_link(pkg, base_name, srcdir, destdir=None,
                      opt_cflags=None, opt_cxxflags=None, opt_fcflags=None,
                      opt_libs=None, force_link=False, keep_going=False,
-                     stdout=sys.stdout, stderr=sys.stderr):
+                     stdout=sys.stdout, stderr=sys.stderr, n_jobs=None):
     """
     Compilation and link function.
     """
@@ -628,7 +819,8 @@ def compile_and_link(pkg, base_name, srcdir, destdir=None,
                                  force_link=force_link,
                                  keep_going=keep_going,
                                  stdout=stdout,
-                                 stderr=stderr)
+                                 stderr=stderr,
+                                 n_jobs=n_jobs)
 
     return retcode
 
@@ -647,11 +839,20 @@ def main(argv, pkg):
         from cs_exec_environment import set_modules, source_rcfile
 
     test_mode, force_link, keep_going, src_dir, dest_dir, \
-        version, cflags, cxxflags, fcflags, libs = process_cmd_line(argv, pkg)
+        version, cflags, cxxflags, fcflags, libs, \
+        n_jobs, cache_stats = process_cmd_line(argv, pkg)
 
     if (version):
         pkg = pkg.get_alternate_version(version)
 
+    if cache_stats:
+        try:
+            from code_saturne.cs_cache import file_cache
+        except Exception:
+            from cs_cache import file_cache
+        sys.stdout.write(file_cache(pkg, 'compile').stats_str())
+        sys.exit(0)
+
     set_modules(pkg)    # Set environment modules if present
     source_rcfile(pkg)  # Source rcfile if defined
 
@@ -667,7 +868,8 @@ def main(argv, pkg):
                                opt_fcflags=fcflags,
                                opt_libs=libs,
                                force_link=force_link,
-                               keep_going=keep_going)
+                               keep_going=keep_going,
+                               n_jobs=n_jobs)
 
     sys.exit(retcode)
 
@@ -31,18 +31,18 @@ except Exception:
 
 import datetime
 import fnmatch
+import hashlib
+import json
 import os
 import subprocess
 import sys
 import platform
 import tempfile
+import time
 
-python_version = sys.version[:3]
+from code_saturne import cs_cache
 
-try:
-    from code_saturne import cs_batch
-except Exception:
-    import cs_batch
+python_version = sys.version[:3]
 
 #===============================================================================
 # Utility functions
@@ -543,7 +543,8 @@ def get_script_return_code():
 #-------------------------------------------------------------------------------
 
 def run_command(args, pkg = None, echo = False,
-                stdout = sys.stdout, stderr = sys.stderr, env = None):
+                stdout = sys.stdout, stderr = sys.stderr, env = None,
+                cwd = None):
     """
     Run a command.
     """
@@ -579,6 +580,8 @@ def run_command(args, pkg = None, echo = False,
         kwargs['stdout'] = stdout
     if (stderr != sys.stderr):
         kwargs['stderr'] = stderr
+    if cwd != None:
+        kwargs['cwd'] = cwd
 
     returncode = 1
     try:
@@ -615,6 +618,134 @@ def run_command(args, pkg = None, echo = False,
 
 #-------------------------------------------------------------------------------
 
+def run_commands(cmds, pkg = None, n_jobs = 1, mem = None, max_mem = None):
+    """
+    Run independent commands concurrently, with at most n_jobs commands
+    running, and if given, the sum of their estimated memory (mem list)
+    not exceeding max_mem (a single command may always run).
+    Commands are started in order. After the first failure, remaining
+    commands are not started, and running ones are terminated.
+    Return the index and return code of the first failed command,
+    or None and 0.
+    """
+
+    # Modify the PATH for relocatable installation: add Code_Saturne "bindir"
+
+    if pkg != None:
+        if pkg.config.features['relocatable'] == "yes":
+            if sys.platform.startswith("win"):
+                sep = ";"
+            else:
+                sep = ":"
+            saved_path = os.environ['PATH']
+            os.environ['PATH'] = pkg.get_dir('bindir') + sep + saved_path
+
+    running = {}
+    next_id = 0
+    failed_id = None
+    returncode = 0
+
+    try:
+        while running or (failed_id == None and next_id < len(cmds)):
+
+            # Start commands within limits
+
+            while failed_id == None and next_id < len(cmds) \
+                  and len(running) < n_jobs:
+                if running and mem and max_mem:
+                    mem_sum = mem[next_id]
+                    for i in running:
+                        mem_sum += mem[i]
+                    if mem_sum > max_mem:
+                        break
+                running[next_id] = subprocess.Popen(cmds[next_id],
+                                                    universal_newlines=True)
+                next_id += 1
+
+            # Check for finished commands
+
+            time.sleep(0.05)
+
+            for i in sorted(running.keys()):
+                retcode = running[i].poll()
+                if retcode == None:
+                    continue
+                del running[i]
+                if retcode != 0 and failed_id == None:
+                    failed_id = i
+                    returncode = retcode
+                    for p in running.values():
+                        p.terminate()
+
+    except Exception as e:
+        for p in running.values():
+            p.terminate()
+        import traceback
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        traceback.print_exception(exc_type, exc_value, exc_traceback,
+                                  limit=2, file=sys.stderr)
+        print("")
+        print("Failed calling subprocess with:")
+        print("  args = " + str(cmds[next_id]))
+        sys.exit(1)
+
+    # Reset the PATH to its previous value
+
+    if pkg != None:
+        if pkg.config.features['relocatable'] == "yes":
+            os.environ['PATH'] = saved_path
+
+    return failed_id, returncode
+
+#-------------------------------------------------------------------------------
+
+def get_available_cores():
+    """
+    Return the number of processor cores available to the current process.
+    """
+
+    n_cores = None
+
+    try:
+        n_cores = len(os.sched_getaffinity(0))
+    except Exception:
+        try:
+            import multiprocessing
+            n_cores = multiprocessing.cpu_count()
+        except Exception:
+            pass
+
+    if not n_cores:
+        n_cores = 1
+
+    return n_cores
+
+#-------------------------------------------------------------------------------
+
+def get_available_memory():
+    """
+    Return the available memory (in bytes), or None if unknown.
+    """
+
+    try:
+        f = open('/proc/meminfo')
+        for l in f:
+            if l.startswith('MemAvailable:'):
+                f.close()
+                return int(l.split()[1]) * 1024
+        f.close()
+    except Exception:
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        pass
+
+    return None
+
+#-------------------------------------------------------------------------------
+
 def get_command_output(cmd):
     """
     Run a command and return it's standard output.
@@ -970,6 +1101,7 @@ class batch_info:
             # In case of job array, check on first line
             rs = get_command_output(cmd)
             if rs:
+                from code_saturne import cs_batch
                 rtime = cs_batch.parse_wall_time_slurm(rs.splitlines()[0])
             else:
                 msg = "Error: command\n  " + cmd + "\n\n"
@@ -1349,11 +1481,23 @@ MPI_MPMD_mpiexec    = (1<<0) # mpiexec colon-separated syntax
 MPI_MPMD_configfile = (1<<1) # mpiexec -configfile syntax
 MPI_MPMD_script     = (1<<2)
 
+# Launcher and information commands whose presence and modification time
+# determine the validity of cached MPI probes
+
+mpi_probe_names = ['mpiexec', 'mpirun', 'mpiexec.mpich', 'mpiexec.mpich2',
+                   'mpiexec.hydra', 'mpiexec.gforker', 'mpiexec.remshell',
+                   'mpirun.mpich2', 'mpirun.mpich', 'aprun',
+                   'mpiexec.openmpi', 'mpirun.openmpi',
+                   'mpichversion', 'mpich2version', 'ompi_info']
+
 class mpi_environment:
 
     def __init__(self, pkg, resource_info=None, wdir = None):
         """
         Returns MPI environment info.
+        Results of MPI install probes (program manager detection, resource
+        managers known by Open MPI) are stored in the 'mpi' user cache,
+        indexed by a hash of the MPI binaries and configuration files.
         """
 
         # Note that self.mpiexec_n will usually be ' -n ' if present;
@@ -1428,8 +1572,12 @@ class mpi_environment:
         if len(self.bindir) > 0:
             p = [self.bindir]
 
+        self.__load_probes__(pkg, p)
+
         init_method(p, resource_info, wdir)
 
+        self.__store_probes__()
+
         # Overwrite options based on system-wide or user configuration
 
         if config.has_section('mpi'):
@@ -1459,6 +1607,105 @@ class mpi_environment:
 
     #---------------------------------------------------------------------------
 
+    def __get_probes_cache_key__(self, pkg, p):
+
+        """
+        Determine the MPI probes cache key, based on a hash of the
+        version, MPI type, search path, configuration files, and
+        names and modification times of MPI binaries.
+        """
+
+        h = hashlib.sha1()
+
+        s = 'version:' + pkg.version_full + '\n' \
+            + 'type:' + self.type + '\n' \
+            + 'bindir:' + self.bindir + '\n' \
+            + 'path:' + ':'.join(p) + '\n'
+        h.update(s.encode('utf-8'))
+
+        config_files = [f for f in pkg.get_configfiles() if os.path.isfile(f)]
+        cs_cache.hash_files(h, config_files, config_files)
+
+        names = list(mpi_probe_names)
+        absname = self.__get_mpiexec_absname__(p)
+        if absname:
+            names.append(absname)
+
+        for d in p:
+            for name in names:
+                f = os.path.join(d, name)
+                if os.path.isfile(f):
+                    s = 'binary:' + f + ':' + str(os.path.getmtime(f)) + '\n'
+                    h.update(s.encode('utf-8'))
+
+        return h.hexdigest()
+
+    #---------------------------------------------------------------------------
+
+    def __load_probes__(self, pkg, p):
+
+        """
+        Load results of MPI install probes from the user cache.
+        """
+
+        self.probes = {}
+        self.probes_cache = cs_cache.file_cache(pkg, 'mpi', default_size=1)
+        self.probes_key = None
+        self.probes_entry = None
+        self.probes_cached = False
+        self.probes_modified = False
+
+        if not self.probes_cache.enabled():
+            return
+
+        try:
+            self.probes_key = self.__get_probes_cache_key__(pkg, p)
+        except Exception:
+            return
+
+        cache_entry = self.probes_cache.lookup(self.probes_key)
+        if cache_entry:
+            try:
+                f = open(os.path.join(cache_entry, 'mpi_probes.json'))
+                self.probes = json.load(f)
+                f.close()
+                self.probes_entry = cache_entry
+                self.probes_cached = True
+            except Exception:
+                self.probes = {}
+
+    #---------------------------------------------------------------------------
+
+    def __store_probes__(self):
+
+        """
+        Store results of MPI install probes in the user cache if new
+        probes were required. An existing entry is updated in place.
+        """
+
+        if not (self.probes_modified and self.probes_key):
+            return
+
+        try:
+            if self.probes_entry:
+                d = self.probes_entry
+            else:
+                d = tempfile.mkdtemp()
+            f_path = os.path.join(d, 'mpi_probes.json')
+            t_path = f_path + '.' + str(os.getpid())
+            f = open(t_path, 'w')
+            json.dump(self.probes, f)
+            f.close()
+            os.rename(t_path, f_path)
+            if not self.probes_entry:
+                self.probes_cache.store(self.probes_key, [f_path])
+                os.remove(f_path)
+                os.rmdir(d)
+        except Exception:  # cache is an optimization only
+            pass
+
+    #---------------------------------------------------------------------------
+
     def __get_mpiexec_absname__(self, p):
 
         """
@@ -1484,6 +1731,22 @@ class mpi_environment:
 
     def __get_mpich2_3_default_pm__(self, mpiexec_path):
 
+        """
+        Determine the program manager for MPICH2 or MPICH-3,
+        using previous probe results if available.
+        """
+
+        key = 'pm:' + mpiexec_path
+        if not key in self.probes:
+            self.probes[key] = self.__probe_mpich2_3_default_pm__(mpiexec_path)
+            self.probes_modified = True
+
+        return self.probes[key]
+
+    #---------------------------------------------------------------------------
+
+    def __probe_mpich2_3_default_pm__(self, mpiexec_path):
+
         """
         Try to determine the program manager for MPICH2 or MPICH-3.
         """
@@ -1771,9 +2034,13 @@ class mpi_environment:
                               'PBS':' tm ',
                               'SGE':' gridengine '}
             if resource_info.manager in rc_mca_by_type:
-                info = get_command_output(info_name)
-                if info.find(rc_mca_by_type[resource_info.manager]) > -1:
-                    known_manager = True
+                key = 'ompi_info:' + info_name + ':' + resource_info.manager
+                if not key in self.probes:
+                    info = get_command_output(info_name)
+                    mca = rc_mca_by_type[resource_info.manager]
+                    self.probes[key] = (info.find(mca) > -1)
+                    self.probes_modified = True
+                known_manager = self.probes[key]
             elif resource_info.manager == 'OAR':
                 self.mpiexec += ' -machinefile $OAR_FILE_NODES'
                 self.mpiexec += ' -mca pls_rsh_agent "oarsh"'
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+This module defines a staging engine, used to move or copy result files
+from the execution directory to the results directory using the cheapest
+available method: rename or hard link when the source is removed, then
+reflink, kernel-side copy, and finally a streamed copy.
+
+This module defines the following function:
+- stage_file
+
+and the following class:
+- file_stager
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import sys
+import time
+
+try:
+    import fcntl
+except Exception:  # not available on Windows
+    fcntl = None
+
+#===============================================================================
+# Utility functions
+#===============================================================================
+
+# ioctl request to share the extents of a file with another one (Linux)
+
+_FICLONE = 0x40049409
+
+#-------------------------------------------------------------------------------
+
+def _copy_data(src, dest):
+    """
+    Copy the contents of a file, using a reflink or a kernel-side copy
+    when possible. Return the method used.
+    """
+
+    f_src = open(src, 'rb')
+    f_dest = open(dest, 'wb')
+
+    method = None
+
+    try:
+        if fcntl != None and sys.platform.startswith('linux'):
+            try:
+                fcntl.ioctl(f_dest.fileno(), _FICLONE, f_src.fileno())
+                method = 'reflink'
+            except (IOError, OSError):
+                pass
+
+        if method == None and hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(f_src.fileno(), f_dest.fileno(),
+                                         1 << 30) > 0:
+                    pass
+                method = 'kernel'
+            except OSError:
+                f_src.seek(0)
+                f_dest.seek(0)
+                f_dest.truncate()
+
+        if method == None:
+            shutil.copyfileobj(f_src, f_dest, 1 << 20)
+            method = 'copy'
+
+    finally:
+        f_src.close()
+        f_dest.close()
+
+    return method
+
+#-------------------------------------------------------------------------------
+
+def stage_file(src, dest, move=False):
+    """
+    Copy a file (following symbolic links), or move it if move is True.
+    Hard links are used only when the source is removed, so that staged
+    files never share data with files left in the execution directory.
+    Return the method used.
+    """
+
+    if os.path.lexists(dest):
+        os.remove(dest)
+
+    if move and not os.path.islink(src):
+        try:
+            os.rename(src, dest)
+            return 'rename'
+        except OSError:
+            pass
+        try:
+            os.link(src, dest)
+            os.remove(src)
+            return 'link'
+        except OSError:
+            pass
+
+    method = _copy_data(src, dest)
+    shutil.copystat(src, dest)
+
+    if move:
+        os.remove(src)
+
+    return method
+
+#===============================================================================
+# Class used to stage files
+#===============================================================================
+
+class file_stager(object):
+    """
+    Stage files, large files being copied concurrently by a pool of
+    threads. Each staged file is recorded with the method used, its size
+    and the elapsed time.
+    """
+
+    #---------------------------------------------------------------------------
+
+    def __init__(self, n_threads=4, threshold=16*1024*1024):
+        """
+        Initialize stager. Files larger than threshold (in bytes) are
+        staged asynchronously when n_threads > 1.
+        """
+
+        self.n_threads = n_threads
+        self.threshold = threshold
+
+        self.records = []
+        self.pending = []
+        self.pool = None
+
+        self.t_start = time.time()
+        self.t_end = None
+
+    #---------------------------------------------------------------------------
+
+    def __stage__(self, record_id, src, dest, move):
+        """
+        Stage a single file and update its record.
+        """
+
+        t0 = time.time()
+        method = stage_file(src, dest, move)
+        self.records[record_id][1] = method
+        self.records[record_id][3] = time.time() - t0
+
+    #---------------------------------------------------------------------------
+
+    def stage(self, src, dest, move=False):
+        """
+        Copy or move a file.
+        """
+
+        size = os.path.getsize(src)
+
+        record_id = len(self.records)
+        self.records.append([dest, None, size, 0.])
+
+        if self.n_threads > 1 and size >= self.threshold:
+            if self.pool == None:
+                from multiprocessing.pool import ThreadPool
+                self.pool = ThreadPool(self.n_threads)
+            r = self.pool.apply_async(self.__stage__,
+                                      (record_id, src, dest, move))
+            self.pending.append(r)
+        else:
+            self.__stage__(record_id, src, dest, move)
+
+    #---------------------------------------------------------------------------
+
+    def wait(self):
+        """
+        Wait for pending files to be staged, raising errors if any.
+        """
+
+        pending = self.pending
+        self.pending = []
+
+        for r in pending:
+            r.get()
+
+    #---------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Wait for pending files and release the pool of threads.
+        """
+
+        try:
+            self.wait()
+        finally:
+            if self.pool != None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+            self.t_end = time.time()
+
+    #---------------------------------------------------------------------------
+
+    def summary_info(self, s, base_dir=None, min_size=1024*1024):
+        """
+        Output staging data into file s: one line per file larger than
+        min_size (in bytes), and totals.
+        """
+
+        if not self.records:
+            return
+
+        mib = 1024.*1024.
+
+        t_end = self.t_end
+        if t_end == None:
+            t_end = time.time()
+
+        s.write('  Results staging\n')
+
+        n_other = 0
+        size_other = 0
+        size_tot = 0
+        for dest, method, size, t in self.records:
+            size_tot += size
+            if size < min_size:
+                n_other += 1
+                size_other += size
+                continue
+            name = dest
+            if base_dir:
+                name = os.path.relpath(dest, base_dir)
+            s.write('    %-30s %-8s %10.1f MiB' % (name, method, size/mib))
+            if method in ('rename', 'link') or t <= 0:
+                s.write('\n')
+            else:
+                s.write(' %10.1f MiB/s\n' % (size/mib/t))
+
+        if n_other > 0:
+            s.write('    %d other files %21.1f MiB\n' % (n_other,
+                                                         size_other/mib))
+
+        s.write('    total: %d files, %.1f MiB in %.2f s\n'
+                % (len(self.records), size_tot/mib, t_end - self.t_start))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
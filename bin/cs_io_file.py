@@ -0,0 +1,522 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+This module reads Code_Saturne I/O files (Preprocessor output, partitioning,
+checkpoint/restart files) without the cs_io_dump tool.
+
+Files are memory-mapped and their section headers indexed; section values
+are returned as NumPy arrays referencing the mapped file (big-endian data
+types are used, so no copy or byte swap is needed).
+
+This module defines the following classes:
+- io_section
+- io_file
+
+and the following functions:
+- compare_sections
+- compare_files
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import mmap
+import os
+import struct
+import sys
+
+import numpy
+
+#-------------------------------------------------------------------------------
+# Global definitions
+#-------------------------------------------------------------------------------
+
+_base_header = b'Code_Saturne I/O, BE, R0'
+
+# Data types of files (always big-endian) by type name
+
+_dtypes = {'c ': numpy.dtype('S1'),
+           'i4': numpy.dtype('>i4'),
+           'i8': numpy.dtype('>i8'),
+           'u4': numpy.dtype('>u4'),
+           'u8': numpy.dtype('>u8'),
+           'r4': numpy.dtype('>f4'),
+           'r8': numpy.dtype('>f8')}
+
+# Number of values compared at once (limits temporary memory use)
+
+_block_size = 1 << 20
+
+#===============================================================================
+# Section header
+#===============================================================================
+
+class io_section(object):
+    """
+    Header of a section of a Code_Saturne I/O file.
+    """
+
+    __slots__ = ('name', 'type_name', 'n_vals', 'location_id', 'index_id',
+                 'n_location_vals', 'offset', 'embedded')
+
+    #---------------------------------------------------------------------------
+
+    def __init__(self, name, type_name, n_vals, location_id, index_id,
+                 n_location_vals, offset, embedded):
+        """
+        Initialize section header; offset is that of the section values
+        in the file (whether embedded in the header or not).
+        """
+
+        self.name = name
+        self.type_name = type_name
+        self.n_vals = n_vals
+        self.location_id = location_id
+        self.index_id = index_id
+        self.n_location_vals = n_location_vals
+        self.offset = offset
+        self.embedded = embedded
+
+    #---------------------------------------------------------------------------
+
+    def __repr__(self):
+
+        return 'io_section(%r, %r, n_vals=%d, location_id=%d)' \
+            % (self.name, self.type_name, self.n_vals, self.location_id)
+
+#===============================================================================
+# File reader
+#===============================================================================
+
+class io_file(object):
+    """
+    Memory-mapped Code_Saturne I/O file, with an index of its sections.
+    """
+
+    #---------------------------------------------------------------------------
+
+    def __init__(self, path):
+        """
+        Open a file and build its section index.
+        """
+
+        self.path = path
+        self.sections = []
+
+        self.__f = open(path, 'rb')
+        try:
+            self.__mm = mmap.mmap(self.__f.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self.__mm = b''
+
+        mm = self.__mm
+
+        if mm[:64].rstrip(b'\0') != _base_header:
+            self.close()
+            raise ValueError('File format of "%s" is not recognized:\n'
+                             'First %d bytes: "%s".'
+                             % (path, 64, mm[:64].rstrip(b'\0')))
+
+        self.file_type = mm[64:128].split(b'\0')[0].decode('utf-8', 'replace')
+
+        self.header_size, self.header_align, self.body_align \
+            = struct.unpack('>3Q', mm[128:152])
+
+        self.__build_index()
+
+    #---------------------------------------------------------------------------
+
+    def __build_index(self):
+        """
+        Read all section headers.
+        """
+
+        mm = self.__mm
+        end = len(mm)
+        ha = self.header_align
+        ba = self.body_align
+
+        offset = 152
+
+        while True:
+
+            offset += (ha - (offset % ha)) % ha
+            if offset + self.header_size > end:
+                break
+
+            h_vals = struct.unpack('>6Q', mm[offset:offset+48])
+
+            type_name = mm[offset+48:offset+56]
+            embedded = (h_vals[1] > 0 and type_name[7:8] == b'e')
+            type_name = type_name.split(b'\0')[0].decode('ascii')
+
+            name = mm[offset+56:offset+h_vals[0]].split(b'\0')[0]
+            name = name.decode('utf-8', 'replace')
+
+            n_vals = h_vals[1]
+            type_size = 0
+            if n_vals > 0:
+                if type_name not in _dtypes:
+                    raise ValueError('Type "%s" is not known\n'
+                                     'Known types: "c ", "i4", "i8", "u4", '
+                                     '"u8", "r4", "r8".' % type_name)
+                type_size = _dtypes[type_name].itemsize
+
+            h_end = offset + max(self.header_size, h_vals[0])
+
+            if embedded:
+                data_offset = offset + 56 + h_vals[5]
+                offset = h_end
+            else:
+                data_offset = h_end + (ba - (h_end % ba)) % ba
+                offset = data_offset + n_vals*type_size
+
+            self.sections.append(io_section(name, type_name, n_vals,
+                                            h_vals[2], h_vals[3], h_vals[4],
+                                            data_offset, embedded))
+
+    #---------------------------------------------------------------------------
+
+    def close(self):
+        """
+        Close the file. The mapping is released once values returned
+        by values() are not referenced anymore.
+        """
+
+        if self.__mm:
+            try:
+                self.__mm.close()
+            except BufferError:  # views still referenced
+                pass
+        self.__mm = b''
+        self.__f.close()
+
+    #---------------------------------------------------------------------------
+
+    def __enter__(self):
+
+        return self
+
+    #---------------------------------------------------------------------------
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+    #---------------------------------------------------------------------------
+
+    def find(self, name, location_id=None):
+        """
+        Return the first section with given name (and location id if
+        given), or None.
+        """
+
+        for s in self.sections:
+            if s.name == name:
+                if location_id == None or s.location_id == location_id:
+                    return s
+
+        return None
+
+    #---------------------------------------------------------------------------
+
+    def values(self, section):
+        """
+        Return the values of a section (or of the section with given name)
+        as an array referencing the file mapping, with big-endian data type.
+        """
+
+        if not isinstance(section, io_section):
+            s = self.find(section)
+            if s == None:
+                raise KeyError('section "%s" not found in "%s"'
+                               % (section, self.path))
+            section = s
+
+        if section.n_vals == 0:
+            return numpy.empty(0)
+
+        return numpy.frombuffer(self.__mm,
+                                dtype=_dtypes[section.type_name],
+                                count=section.n_vals,
+                                offset=section.offset)
+
+#===============================================================================
+# Comparison functions
+#===============================================================================
+
+def _compare_type(type_name):
+    """
+    Return type used for comparison: 'c', 'i' (all integers) or 'r'.
+    """
+
+    if type_name[0] == 'u':
+        return 'i'
+
+    return type_name[0]
+
+#-------------------------------------------------------------------------------
+
+def compare_sections(v1, v2, compare_type, threshold=1.e-30, n_ids=0):
+    """
+    Compare values of 2 sections with the same size and compare type.
+    Return the number of differences, the maximum, total, maximum relative
+    and total relative differences (for real values), and the array of ids
+    of the first n_ids differing values.
+    """
+
+    n_diffs = 0
+    f_stats = [0., 0., 0., 0.]
+    ids = []
+
+    for s in range(0, len(v1), _block_size):
+
+        b1 = v1[s:s+_block_size]
+        b2 = v2[s:s+_block_size]
+
+        if compare_type == 'r':
+            a1 = b1.astype(numpy.float64)
+            a2 = b2.astype(numpy.float64)
+            delta = numpy.abs(a1 - a2)
+            mask = delta > threshold
+            n = int(numpy.count_nonzero(mask))
+            if n > 0:
+                delta = delta[mask]
+                delta_r = delta / numpy.maximum(numpy.abs(a1[mask]),
+                                                numpy.abs(a2[mask]))
+                f_stats[0] = max(f_stats[0], float(delta.max()))
+                f_stats[1] += float(delta.sum())
+                f_stats[2] = max(f_stats[2], float(delta_r.max()))
+                f_stats[3] += float(delta_r.sum())
+        elif compare_type == 'i':
+            mask = b1.astype(numpy.int64) != b2.astype(numpy.int64)
+            n = int(numpy.count_nonzero(mask))
+        else:
+            mask = b1 != b2
+            n = int(numpy.count_nonzero(mask))
+
+        if n > 0 and len(ids) < n_ids:
+            ids.extend(numpy.nonzero(mask)[0][:n_ids-len(ids)] + s)
+
+        n_diffs += n
+
+    return n_diffs, f_stats, numpy.array(ids, dtype=numpy.int64)
+
+#-------------------------------------------------------------------------------
+
+def _echo_header(out, s):
+    """
+    Output header of section of a single file.
+    """
+
+    if s.n_vals > 0:
+        out.write('  "%-32s"; Type: %-6s; Location: %2d; Size: %d\n'
+                  % (s.name, s.type_name, s.location_id, s.n_vals))
+    else:
+        out.write('  "%-32s"\n' % s.name)
+
+#-------------------------------------------------------------------------------
+
+def _echo_diff_header(out, s1, s2):
+    """
+    Output header of sections with differences.
+    """
+
+    if s1.type_name != s2.type_name:
+        out.write('  "%-32s"; Location: %2d Size: %d\n'
+                  '    Type: %-6s;  |  Type: %-6s; \n'
+                  % (s1.name, s1.location_id, s1.n_vals,
+                     s1.type_name, s2.type_name))
+    else:
+        out.write('  "%-32s"; Location: %2d; Type: %-6s; Size: %d\n'
+                  % (s1.name, s1.location_id, s1.type_name, s1.n_vals))
+
+#-------------------------------------------------------------------------------
+
+def _compare_and_echo(out, f1, s1, f2, s2, f_fmt, threshold, n_echo):
+    """
+    Compare 2 sections with matching names and locations, and output
+    differences in the same format as cs_io_dump.
+    Return 1 if data differs, 0 otherwise.
+    """
+
+    if s1.n_vals == 0 and s2.n_vals == 0:
+        return 0
+
+    t1 = ' '
+    t2 = ' '
+    c1 = ' '
+    c2 = ' '
+    if s1.n_vals > 0:
+        t1 = s1.type_name
+        c1 = _compare_type(t1)
+    if s2.n_vals > 0:
+        t2 = s2.type_name
+        c2 = _compare_type(t2)
+
+    if s1.n_vals != s2.n_vals or c1 != c2:
+        if s1.n_vals == s2.n_vals:
+            out.write('  "%-32s"; Location: %2d; Size: %d\n'
+                      '    Type: %-6s; |  Type: %-6s\n\n'
+                      % (s1.name, s1.location_id, s1.n_vals, t1, t2))
+        elif t1 == t2:
+            out.write('  "%-32s"; Location: %2d; Type: %-6s\n'
+                      '    Size: %d  |  Size: %d\n\n'
+                      % (s1.name, s1.location_id, t1, s1.n_vals, s2.n_vals))
+        else:
+            out.write('  "%-32s"; Location: %2d\n'
+                      '    Type: %-6s; Size: %d  |  Type: %-6s; Size: %d\n\n'
+                      % (s1.name, s1.location_id, t1, s1.n_vals,
+                         t2, s2.n_vals))
+        return 1
+
+    v1 = f1.values(s1)
+    v2 = f2.values(s2)
+
+    n_diffs, f_stats, ids = compare_sections(v1, v2, c1, threshold, n_echo)
+
+    if n_diffs == 0:
+        return 0
+
+    _echo_diff_header(out, s1, s2)
+
+    if n_echo > 0:
+        if c1 == 'r':
+            if f_fmt:
+                fmt = '    %12d:  %' + f_fmt + '  |  %' + f_fmt + '\n'
+            else:
+                fmt = '    %12d:  %22.15e  | %22.15e\n'
+        elif c1 == 'i':
+            fmt = '    %12d:  %d  | %d\n'
+        else:
+            fmt = '    %12d:  %s  | %s\n'
+        for i in ids:
+            a = v1[i]
+            b = v2[i]
+            if c1 == 'c':
+                a = a.decode('latin-1')
+                b = b.decode('latin-1')
+            out.write(fmt % (i+1, a, b))
+
+    if t1[0] == 'r':
+        out.write('    Differences: %d; Max: %g; Mean: %g; '
+                  'Rel Max: %6.2e; Rel Mean: %6.2e\n\n'
+                  % (n_diffs, f_stats[0], f_stats[1]/n_diffs,
+                     f_stats[2], f_stats[3]/n_diffs))
+    else:
+        out.write('    Differences: %d\n\n' % n_diffs)
+
+    return 1
+
+#-------------------------------------------------------------------------------
+
+def compare_files(path1, path2, location_id=None, section=None,
+                  f_fmt=None, threshold=1.e-30, n_echo=0, out=sys.stdout):
+    """
+    Compare 2 files section by section, with the same output as
+    "cs_io_dump --diff". Return 0 if contents are identical, 1 otherwise.
+    """
+
+    files = []
+
+    try:
+        for p in (path1, path2):
+            out.write('\nOpening input file: "%s"\n\n' % p)
+            f = io_file(p)
+            files.append(f)
+            out.write('  File type: %s\n' % f.file_type)
+            out.write('\n'
+                      '  Base header size: %d\n'
+                      '  Header alignment: %d\n'
+                      '  Body alignment:   %d\n'
+                      % (f.header_size, f.header_align, f.body_align))
+
+        f1, f2 = files
+
+        out.write('\n')
+
+        def match_filter(s):
+            if section != None and s.name != section:
+                return False
+            if location_id != None and s.location_id != location_id:
+                return False
+            return True
+
+        # Index second file sections by name and location
+
+        index2 = {}
+        for j, s2 in enumerate(f2.sections):
+            index2.setdefault((s2.name, s2.location_id), []).append(j)
+
+        n_diffs = 0
+        compared1 = [False]*len(f1.sections)
+        compared2 = [False]*len(f2.sections)
+
+        for i, s1 in enumerate(f1.sections):
+            if not match_filter(s1):
+                compared1[i] = True
+                continue
+            for j in index2.get((s1.name, s1.location_id), []):
+                n_diffs += _compare_and_echo(out, f1, s1, f2, f2.sections[j],
+                                             f_fmt, threshold, n_echo)
+                compared1[i] = True
+                compared2[j] = True
+
+        has_unmatched1 = not all(compared1)
+        if has_unmatched1:
+            out.write('Sections only found in file "%s":\n\n' % path1)
+            for i, s1 in enumerate(f1.sections):
+                if not compared1[i]:
+                    _echo_header(out, s1)
+            out.write('\n')
+
+        for j, s2 in enumerate(f2.sections):
+            if not match_filter(s2):
+                compared2[j] = True
+
+        has_unmatched2 = not all(compared2)
+        if has_unmatched2:
+            out.write('Sections only found in file "%s":\n\n' % path2)
+            for j, s2 in enumerate(f2.sections):
+                if not compared2[j]:
+                    _echo_header(out, s2)
+
+        out.write('\n')
+
+    finally:
+        for f in files:
+            f.close()
+
+    if n_diffs > 0 or has_unmatched1 or has_unmatched2:
+        return 1
+
+    return 0
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -99,6 +99,120 @@ def dump_req_fields(req_fields):
         print("===========================")
 
 
+#===============================================================================
+# Expression trees used by the optimization pass
+#===============================================================================
+
+# Functions without side effects, which may be evaluated once for
+# identical arguments.
+
+_pure_functions = ('pow', 'exp', 'log', 'log10', 'sqrt', 'cbrt',
+                   'sin', 'cos', 'tan', 'asin', 'acos', 'atan', 'atan2',
+                   'sinh', 'cosh', 'tanh', 'floor', 'ceil', 'fabs',
+                   'fmin', 'fmax', 'erf', 'cs_math_pow2', 'cs_math_pow3',
+                   'cs_math_pow4', 'cs_math_fabs', 'cs_math_fmin',
+                   'cs_math_fmax')
+
+# Binary operators handled by the optimization pass, with precedence
+# (other operators, such as '%', leave the expression unchanged).
+
+_binary_precedence = {'||':1, '&&':2, '==':3, '!=':3,
+                      '<':4, '>':4, '<=':4, '>=':4,
+                      '+':5, '-':5, '*':6, '/':6}
+
+_unary_operators = ('-', '+', '!')
+
+# Tokens separating expressions in statements.
+
+_statement_delimiters = (';', ',', '=', '+=', '-=', '*=', '/=', '?', ':',
+                         'if', 'else', 'then', 'return')
+
+# Tokens for which the optimization pass is not applied
+# (loops or increments may modify any symbol).
+
+_unoptimized_tokens = ('for', 'while', 'do', 'goto')
+
+_re_int_literal = re.compile('^(0|[1-9][0-9]*)$')
+_re_float_literal = re.compile('^([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?$')
+
+#-------------------------------------------------------------------------------
+
+class expr_node(object):
+    """
+    Node of an expression tree.
+    kind is one of 'num', 'sym', 'ref' (temporary variable), 'call',
+    'paren', 'unop', 'binop', 'raw' (group left unchanged), or 'run'
+    (root of a parsed expression).
+    tok is the main token (value, function name, operator or opening
+    parenthesis), args the list of child nodes, and seps the list of
+    other tokens (parentheses and commas).
+    """
+
+    __slots__ = ('kind', 'tok', 'args', 'seps', 'value')
+
+    def __init__(self, kind, tok, args=None, seps=None, value=None):
+        self.kind = kind
+        self.tok = tok
+        self.args = args or []
+        self.seps = seps or []
+        self.value = value
+
+#-------------------------------------------------------------------------------
+
+def group_elements(e):
+    """
+    Return the list of elements of a group (sub-expression), or None
+    if the given element is a token.
+    """
+
+    if isinstance(e, list):
+        return e
+    elif isinstance(e[0], list):
+        return e[0]
+
+    return None
+
+#-------------------------------------------------------------------------------
+
+def first_token(e):
+    """
+    Return the first token of an element or expression node.
+    """
+
+    if isinstance(e, expr_node):
+        if e.kind in ('binop', 'run'):
+            return first_token(e.args[0])
+        elif e.kind == 'paren':
+            return e.seps[0]
+        elif e.kind == 'raw':
+            return first_token(e.tok)
+        return e.tok
+
+    g = group_elements(e)
+    if g != None:
+        return first_token(g[0])
+
+    return e
+
+#-------------------------------------------------------------------------------
+
+def c_literal(v):
+    """
+    Return the C literal matching a folded value, or None if not
+    representable.
+    """
+
+    if isinstance(v, int):
+        if v < -2**31 or v >= 2**31:
+            return None
+        return str(v)
+
+    s = repr(v)
+    if s in ('inf', '-inf', 'nan'):
+        return None
+
+    return s
+
 #===============================================================================
 # Mathematical expressions parser
 #===============================================================================
@@ -109,8 +223,16 @@ class cs_math_parser:
     """
 
     #-------------------------
-    def __init__(self):
-        # Nothing to do
+    def __init__(self, optimize=True, dump_file=None):
+        """
+        Initialize parser. If optimize is True, invariant subexpressions
+        are moved out of element loops, constants are folded, and
+        repeated subexpressions are computed only once. If dump_file is
+        given, generated code is appended to that file.
+        """
+
+        self.optimize = optimize
+        self.dump_file = dump_file
 
         return
     #-------------------------
@@ -807,6 +929,510 @@ class cs_math_parser:
         return lf
     #-------------------------
 
+    #-------------------------
+    def parse_run(self, elements):
+        """
+        Build an expression tree from a list of elements containing no
+        statement delimiter. Raise ValueError if the expression is not
+        handled by the optimization pass.
+        """
+
+        pos = [0]
+        n_elts = len(elements)
+
+        def peek():
+            if pos[0] < n_elts:
+                return elements[pos[0]]
+            return None
+
+        def is_op(e, ops):
+            return e != None and group_elements(e) == None and e[0] in ops
+
+        def parse_group(e):
+            g = group_elements(e)
+            if len(g) < 3 or g[0][0] != '(' or g[-1][0] != ')':
+                raise ValueError
+            # Split along commas
+            args = []
+            seps = [g[0]]
+            sub = []
+            for x in g[1:-1]:
+                if group_elements(x) == None and x[0] == ',':
+                    args.append(self.parse_run(sub))
+                    seps.append(x)
+                    sub = []
+                else:
+                    sub.append(x)
+            args.append(self.parse_run(sub))
+            seps.append(g[-1])
+            return args, seps
+
+        def parse_primary():
+            e = peek()
+            if e == None:
+                raise ValueError
+            pos[0] += 1
+            if group_elements(e) != None:
+                if group_elements(e)[0][0] != '(':
+                    return expr_node('raw', e)  # translated syntax
+                args, seps = parse_group(e)
+                if len(args) != 1:
+                    raise ValueError
+                return expr_node('paren', None, args, seps)
+            tk = e[0]
+            if tk in _unary_operators:
+                return expr_node('unop', e, [parse_primary()])
+            if tk in _binary_precedence or tk in _statement_delimiters:
+                raise ValueError
+            if tk[0] in '0123456789.':
+                if _re_int_literal.match(tk):
+                    return expr_node('num', e, value=int(tk))
+                elif _re_float_literal.match(tk):
+                    return expr_node('num', e, value=float(tk))
+                raise ValueError
+            n = peek()
+            if n != None and group_elements(n) != None:
+                pos[0] += 1
+                args, seps = parse_group(n)
+                return expr_node('call', e, args, seps)
+            return expr_node('sym', e)
+
+        def parse_binary(min_prec):
+            lhs = parse_primary()
+            while True:
+                e = peek()
+                if not is_op(e, _binary_precedence):
+                    break
+                prec = _binary_precedence[e[0]]
+                if prec < min_prec:
+                    break
+                pos[0] += 1
+                rhs = parse_binary(prec + 1)
+                lhs = expr_node('binop', e, [lhs, rhs])
+            return lhs
+
+        if n_elts == 0:
+            raise ValueError
+
+        node = parse_binary(1)
+        if pos[0] != n_elts:
+            raise ValueError
+
+        return node
+    #-------------------------
+
+    #-------------------------
+    def node_text(self, node):
+        """
+        Return the C code matching an expression tree.
+        """
+
+        k = node.kind
+        if k in ('num', 'sym', 'ref'):
+            return node.tok[0]
+        elif k == 'call':
+            return node.tok[0] + '(' \
+                + ', '.join([self.node_text(a) for a in node.args]) + ')'
+        elif k == 'paren':
+            return '(' + self.node_text(node.args[0]) + ')'
+        elif k == 'unop':
+            return node.tok[0] + self.node_text(node.args[0])
+        elif k == 'binop':
+            return self.node_text(node.args[0]) + ' ' + node.tok[0] + ' ' \
+                + self.node_text(node.args[1])
+    #-------------------------
+
+    #-------------------------
+    def node_elements(self, node, ctx=None):
+        """
+        Return the list of elements (tokens and groups) matching an
+        expression tree, replacing repeated subexpressions found in
+        the given context.
+        """
+
+        if ctx != None and node.kind != 'run':
+            node = self.replace_common(node, ctx)
+
+        k = node.kind
+        if k in ('num', 'sym', 'ref', 'raw'):
+            return [node.tok]
+        elif k == 'run':
+            if not node.value:
+                ctx = None
+            return self.node_elements(node.args[0], ctx)
+        elif k in ('call', 'paren'):
+            g = [node.seps[0]]
+            for i, a in enumerate(node.args):
+                g += self.node_elements(a, ctx)
+                g.append(node.seps[i+1])
+            if k == 'call':
+                return [node.tok, g]
+            return [g]
+        elif k == 'unop':
+            return [node.tok] + self.node_elements(node.args[0], ctx)
+        elif k == 'binop':
+            r_ctx = ctx
+            if node.tok[0] in ('&&', '||'):
+                r_ctx = None
+            return self.node_elements(node.args[0], ctx) + [node.tok] \
+                + self.node_elements(node.args[1], r_ctx)
+    #-------------------------
+
+    #-------------------------
+    def node_type(self, node, ctx):
+        """
+        Return the C type of an expression tree.
+        """
+
+        k = node.kind
+        if k == 'num':
+            if isinstance(node.value, int):
+                return 'int'
+        elif k == 'sym':
+            if node.tok[0] in ctx['int_symbols']:
+                return 'int'
+        elif k == 'ref':
+            return node.value[0]
+        elif k == 'paren':
+            return self.node_type(node.args[0], ctx)
+        elif k == 'unop':
+            if node.tok[0] == '!':
+                return 'int'
+            return self.node_type(node.args[0], ctx)
+        elif k == 'binop':
+            if _binary_precedence[node.tok[0]] < 5:
+                return 'int'
+            if self.node_type(node.args[0], ctx) == 'int' \
+               and self.node_type(node.args[1], ctx) == 'int':
+                return 'int'
+
+        return 'cs_real_t'
+    #-------------------------
+
+    #-------------------------
+    def fold_constants(self, node):
+        """
+        Replace arithmetic operations on numeric literals by their result,
+        using C evaluation rules.
+        """
+
+        node.args = [self.fold_constants(a) for a in node.args]
+
+        k = node.kind
+        v = None
+
+        if k == 'paren':
+            if node.args[0].kind == 'num':
+                v = node.args[0].value
+
+        elif k == 'unop':
+            a = node.args[0]
+            if a.kind == 'num' and node.tok[0] in ('-', '+'):
+                v = a.value
+                if node.tok[0] == '-':
+                    v = -v
+
+        elif k == 'binop':
+            a, b = node.args
+            op = node.tok[0]
+            if a.kind == 'num' and b.kind == 'num' and op in '+-*/':
+                x, y = a.value, b.value
+                if op == '+':
+                    v = x + y
+                elif op == '-':
+                    v = x - y
+                elif op == '*':
+                    v = x * y
+                elif y != 0:
+                    if isinstance(x, int) and isinstance(y, int):
+                        v = abs(x) // abs(y)
+                        if (x < 0) != (y < 0):
+                            v = -v
+                    else:
+                        v = x / y
+
+        if v != None:
+            text = c_literal(v)
+            if text != None:
+                t = first_token(node)
+                return expr_node('num', (text, t[1], t[2]), value=v)
+
+        return node
+    #-------------------------
+
+    #-------------------------
+    def is_defined_in(self, node, symbols):
+        """
+        Check if an expression tree only depends on given symbols
+        (and on numeric literals, temporary variables and functions
+        without side effects).
+        """
+
+        k = node.kind
+        if k == 'num':
+            return True
+        elif k == 'sym':
+            return node.tok[0] in symbols
+        elif k == 'ref':
+            return True
+        elif k == 'raw':
+            return False
+        elif k == 'call' and node.tok[0] not in _pure_functions:
+            return False
+
+        for a in node.args:
+            if not self.is_defined_in(a, symbols):
+                return False
+
+        return True
+    #-------------------------
+
+    #-------------------------
+    def is_compound(self, node):
+        """
+        Check if an expression tree contains at least one operation.
+        """
+
+        if node.kind == 'paren':
+            return self.is_compound(node.args[0])
+
+        return node.kind in ('call', 'unop', 'binop')
+    #-------------------------
+
+    #-------------------------
+    def temporary_ref(self, node, ctx, key, prefix, invariant):
+        """
+        Return a reference to the temporary variable holding the value
+        of an expression tree, adding its definition if needed.
+        """
+
+        text = self.node_text(node)
+        defs = ctx[key]
+
+        if text not in defs:
+            name = prefix + str(len(defs))
+            c_type = self.node_type(node, ctx)
+            defs[text] = (name, c_type)
+        name, c_type = defs[text]
+
+        t = first_token(node)
+
+        return expr_node('ref', (name, t[1], t[2]), value=(c_type, invariant))
+    #-------------------------
+
+    #-------------------------
+    def hoist_invariants(self, node, ctx, top=False):
+        """
+        Replace loop-invariant subexpressions by temporary variables
+        defined before the loop.
+        """
+
+        if not self.is_compound(node):
+            return node
+
+        if self.is_defined_in(node, ctx['invariant']) \
+           and not (top and node.kind == 'paren'):
+            return self.temporary_ref(node, ctx, 'hoisted', '_meg_h', True)
+
+        if node.kind == 'binop' and node.tok[0] in ('&&', '||'):
+            node.args[0] = self.hoist_invariants(node.args[0], ctx)
+        else:
+            node.args = [self.hoist_invariants(a, ctx) for a in node.args]
+
+        return node
+    #-------------------------
+
+    #-------------------------
+    def count_common(self, node, ctx):
+        """
+        Count occurrences of subexpressions which may be computed at the
+        beginning of the loop body.
+        """
+
+        if not self.is_compound(node):
+            return
+
+        if node.kind != 'paren' \
+           and self.is_defined_in(node, ctx['available']):
+            text = self.node_text(node)
+            ctx['count'][text] = ctx['count'].get(text, 0) + 1
+
+        args = node.args
+        if node.kind == 'binop' and node.tok[0] in ('&&', '||'):
+            args = args[:1]
+        for a in args:
+            self.count_common(a, ctx)
+    #-------------------------
+
+    #-------------------------
+    def replace_common(self, node, ctx):
+        """
+        Replace a repeated subexpression by a temporary variable defined
+        at the beginning of the loop body.
+        """
+
+        if node.kind == 'paren' or not self.is_compound(node):
+            return node
+
+        if self.is_defined_in(node, ctx['available']) \
+           and ctx['count'].get(self.node_text(node), 0) > 1:
+            return self.temporary_ref(node, ctx, 'common', '_meg_c', False)
+
+        return node
+    #-------------------------
+
+    #-------------------------
+    def optimize_level(self, elements, ctx, conditional=False):
+        """
+        Build expression trees from the expressions of a list of statements,
+        folding constants and hoisting invariants. Return the list of
+        elements in which expressions are replaced by their trees.
+        Expressions which may not be evaluated for every element are
+        marked as conditional.
+        """
+
+        new_elts = []
+        run = []
+
+        stmt_cond = False  # in statement controlled by 'if' or 'else'
+        pending_cond = False  # expecting condition of 'if'
+
+        def flush(cond):
+            if not run:
+                return
+            try:
+                node = self.fold_constants(self.parse_run(run))
+                if not cond:
+                    node = self.hoist_invariants(node, ctx, top=True)
+                    self.count_common(node, ctx)
+                new_elts.append(expr_node('run', None, [node], value=not cond))
+            except ValueError:
+                new_elts.extend(run)
+            del run[:]
+
+        for e in elements:
+            g = group_elements(e)
+            if g != None and g[0][0] == '{':
+                flush(conditional or stmt_cond)
+                new_elts.append([g[0]]
+                                + self.optimize_level(g[1:-1], ctx, True)
+                                + [g[-1]])
+                stmt_cond = False
+            elif g != None and pending_cond:
+                run.append(e)
+                flush(conditional or stmt_cond)
+                pending_cond = False
+                stmt_cond = True
+            elif g == None and e[0] in _statement_delimiters:
+                flush(conditional or stmt_cond)
+                new_elts.append(e)
+                if e[0] == 'if':
+                    pending_cond = True
+                elif e[0] in ('else', '?'):
+                    stmt_cond = True
+                elif e[0] == ';':
+                    stmt_cond = False
+            else:
+                run.append(e)
+
+        flush(conditional or stmt_cond)
+
+        return new_elts
+    #-------------------------
+
+    #-------------------------
+    def rebuild_level(self, elements, ctx):
+        """
+        Replace expression trees by matching elements.
+        """
+
+        new_elts = []
+
+        for e in elements:
+            if isinstance(e, expr_node):
+                new_elts.extend(self.node_elements(e, ctx))
+            elif isinstance(e, list):
+                new_elts.append(self.rebuild_level(e, ctx))
+            else:
+                new_elts.append(e)
+
+        return new_elts
+    #-------------------------
+
+    #-------------------------
+    def optimize_expressions(self, expressions, flat_tokens,
+                             glob_tokens, loop_tokens):
+        """
+        Optimize expressions evaluated in a loop on elements:
+        constants are folded, subexpressions depending only on symbols
+        defined outside the loop are moved to temporary variables
+        defined before the loop, and repeated subexpressions are computed
+        once at the beginning of the loop body.
+        Return the updated expressions and the lists of definitions to
+        add before the loop and at the beginning of the loop body.
+        """
+
+        # Symbols modified by the expression
+
+        assigned = set()
+        for i, t in enumerate(flat_tokens):
+            if t[0] in _unoptimized_tokens:
+                return expressions, [], []
+            if i > 0:
+                if t[0] in ('=', '+=', '-=', '*=', '/='):
+                    assigned.add(flat_tokens[i-1][0])
+                elif t[0] in ('+', '-') and flat_tokens[i-1][0] == t[0] \
+                     and flat_tokens[i-1][1:] == (t[1], t[2]-1):
+                    return expressions, [], []  # increment or decrement
+
+        invariant = set(glob_tokens.keys()) - set(loop_tokens.keys()) - assigned
+        available = (set(glob_tokens.keys()) | set(loop_tokens.keys())) \
+                    - assigned
+
+        int_symbols = [k for k in glob_tokens.keys()
+                       if glob_tokens[k].startswith('const int ')]
+
+        ctx = {'invariant':invariant,
+               'available':available,
+               'int_symbols':int_symbols,
+               'hoisted':{},
+               'common':{},
+               'count':{}}
+
+        expressions = self.optimize_level(expressions, ctx)
+        expressions = self.rebuild_level(expressions, ctx)
+
+        defs = []
+        for d in (ctx['hoisted'], ctx['common']):
+            l = [(n, t, text) for text, (n, t) in d.items()]
+            l.sort(key=lambda x: int(x[0][6:]))
+            defs.append(['const %s %s = %s;\n' % (t, n, text)
+                         for n, t, text in l])
+
+        return expressions, defs[0], defs[1]
+    #-------------------------
+
+    #-------------------------
+    def dump_code(self, expression, usr_defs, usr_code):
+        """
+        Append an expression and the matching generated code to the
+        dump file.
+        """
+
+        f = open(self.dump_file, 'a')
+        f.write('/* Expression:\n\n')
+        for l in expression.split('\n'):
+            f.write('   ' + l + '\n')
+        f.write('*/\n\n')
+        for l in usr_defs:
+            f.write(l)
+        f.write('/* loop on elements */\n')
+        for l in usr_code:
+            f.write('  ' + l)
+        f.write('\n')
+        f.close()
+    #-------------------------
+
     #-------------------------
     def parse_expression(self, expression, req, known_symbols,
                          func_type, glob_tokens, loop_tokens,
@@ -904,11 +1530,24 @@ class cs_math_parser:
 
         #-------------------------
         tokens = self.rename_math_functions(tokens)
+        flat_tokens = tokens
         tokens = self.build_expressions(exp_lines, tokens)
         tokens = self.update_expressions_syntax(tokens)
         tokens = self.recurse_expressions_syntax(tokens)
         #-------------------------
 
+        #-------------------------
+        # Optimize expressions
+        if self.optimize:
+            tokens, hoisted_defs, common_defs \
+                = self.optimize_expressions(tokens, flat_tokens,
+                                            glob_tokens, loop_tokens)
+            if hoisted_defs:
+                usr_defs += hoisted_defs + ['\n']
+            if common_defs:
+                usr_code += common_defs + ['\n']
+        #-------------------------
+
         #-------------------------
         # Rebuild lines
         new_text = self.rebuild_text(tokens, comments)
@@ -916,5 +1555,8 @@ class cs_math_parser:
             usr_code.append(line + '\n')
         #-------------------------
 
+        if self.dump_file:
+            self.dump_code(expression, usr_defs, usr_code)
+
         return usr_code, usr_defs
 
@@ -125,6 +125,75 @@ cs_meg_immersed_boundaries_inout(int         *ipenal,
 """
 }
 
+# Return type, arguments and dispatch keys of each function type
+
+_function_args = {'vol':('void',
+                         [('const cs_zone_t', '*zone'),
+                          ('cs_field_t', '*f[]')],
+                         ['zone->name', 'f[0]->name']),
+                  'bnd':('cs_real_t *',
+                         [('const cs_zone_t', '*zone'),
+                          ('const char', '*field_name'),
+                          ('const char', '*condition')],
+                         ['field_name', 'condition', 'zone->name']),
+                  'src':('cs_real_t *',
+                         [('const cs_zone_t', '*zone'),
+                          ('const char', '*name'),
+                          ('const char', '*source_type')],
+                         ['zone->name', 'name', 'source_type']),
+                  'ini':('cs_real_t *',
+                         [('const cs_zone_t', '*zone'),
+                          ('const char', '*field_name')],
+                         ['zone->name', 'field_name']),
+                  'ibm':('void',
+                         [('int', '*ipenal'),
+                          ('const char', '*object_name'),
+                          ('cs_real_3_t', ' xyz'),
+                          ('cs_real_t', ' t')],
+                         ['object_name'])}
+
+_dispatch_helpers = \
+"""/*----------------------------------------------------------------------------
+ * Compare n_keys strings of a key with those of a dispatch table entry.
+ *----------------------------------------------------------------------------*/
+
+static inline int
+_meg_key_compare(int                n_keys,
+                 const char  *const key[],
+                 const char  *const entry[])
+{
+  for (int i = 0; i < n_keys; i++) {
+    int c = strcmp(key[i], entry[i]);
+    if (c != 0)
+      return c;
+  }
+  return 0;
+}
+
+/*----------------------------------------------------------------------------
+ * Return the id of the first entry of a sorted dispatch table whose keys
+ * are not lower than a given key (binary search).
+ *----------------------------------------------------------------------------*/
+
+static int
+_meg_key_lower_bound(int                n_keys,
+                     const char  *const key[],
+                     int                n_entries,
+                     const char  *const keys[])
+{
+  int start = 0, end = n_entries;
+  while (start < end) {
+    int mid = start + (end - start)/2;
+    if (_meg_key_compare(n_keys, key, keys + mid*n_keys) > 0)
+      start = mid + 1;
+    else
+      end = mid;
+  }
+  return start;
+}
+
+"""
+
 _function_names = {'vol':'cs_meg_volume_function.c',
                    'bnd':'cs_meg_boundary_function.c',
                    'src':'cs_meg_source_terms.c',
@@ -191,7 +260,13 @@ def parse_gui_expression(expression,
     if func_type == 'ibm':
         ntabs = 2
 
-    parser = cs_math_parser()
+    # Optimization may be disabled, and generated code dumped for checking,
+    # using environment variables.
+
+    optimize = (os.getenv('CS_MEG_OPTIMIZE', '1') != '0')
+    dump_file = os.getenv('CS_MEG_DUMP')
+
+    parser = cs_math_parser(optimize=optimize, dump_file=dump_file)
 
     expr_list, expr_user = parser.parse_expression(expression,
                                                    req,
@@ -215,6 +290,86 @@ def parse_gui_expression(expression,
 # Utility functions
 #===============================================================================
 
+def c_function_header(return_type, name, args, static=False):
+    """
+    Return the C definition header of a function, with aligned arguments.
+    """
+
+    w = max([len(a[0]) for a in args]) + 1
+
+    header = return_type + '\n' + name + '('
+    if static:
+        header = 'static ' + header
+
+    indent = ' '*(len(name) + 1)
+    for i, a in enumerate(args):
+        if i > 0:
+            header += ',\n' + indent
+        header += a[0].ljust(w) + ' ' + a[1].strip()
+
+    return header + ')\n'
+
+#---------------------------------------------------------------------------
+
+def generate_dispatch_code(func_type, entries):
+    """
+    Generate the body of a cs_meg_* function calling the functions
+    matching its arguments through a dispatch table sorted by keys.
+    entries is a list of (keys, function name) tuples.
+    """
+
+    return_type, args, key_exps = _function_args[func_type]
+    n_keys = len(key_exps)
+
+    call_args = ', '.join([re.sub('[^A-Za-z0-9_]', '', a[1]) for a in args])
+    arg_types = ', '.join([(a[0] + ' ' + re.sub('[A-Za-z0-9_]', '', a[1])).strip()
+                          for a in args])
+
+    # Sort entries by keys, in the same order as strcmp;
+    # entries with identical keys keep their definition order
+
+    entries = sorted(entries,
+                     key=lambda e: [k.encode('utf-8') for k in e[0]])
+
+    code  = '/* Dispatch table, sorted by ('
+    code += ', '.join(key_exps) + ') */\n\n'
+
+    code += 'typedef %s\n(_meg_function_t)(%s);\n\n' % (return_type, arg_types)
+
+    code += 'static const int _n_meg_functions = %d;\n\n' % len(entries)
+
+    code += 'static const char *const _meg_keys[] = {\n'
+    for keys, f_name in entries:
+        code += '  ' + ', '.join(['"%s"' % k for k in keys]) + ',\n'
+    code += '};\n\n'
+
+    code += 'static _meg_function_t *const _meg_functions[] = {\n'
+    for keys, f_name in entries:
+        code += '  %s,\n' % f_name
+    code += '};\n\n'
+
+    code += _dispatch_helpers
+
+    code += '/*============================================================================\n'
+    code += ' * Public function definitions\n'
+    code += ' *============================================================================*/\n\n'
+
+    code += _function_header[func_type]
+
+    code += '  const char *key[] = {%s};\n\n' % ', '.join(key_exps)
+    code += '  for (int i = _meg_key_lower_bound(%d, key, _n_meg_functions, _meg_keys);\n' % n_keys
+    code += '       i < _n_meg_functions\n'
+    code += '         && _meg_key_compare(%d, key, _meg_keys + i*%d) == 0;\n' % (n_keys, n_keys)
+    code += '       i++)\n'
+
+    if return_type == 'void':
+        code += '    _meg_functions[i](%s);\n' % call_args
+    else:
+        code += '    new_vals = _meg_functions[i](%s);\n' % call_args
+        code += '\n  return new_vals;\n'
+
+    return code
+
 #-------------------------
 def break_expression(exp):
 
@@ -320,6 +475,35 @@ class mei_to_c_interpreter:
 
     #---------------------------------------------------------------------------
 
+    def block_dispatch_keys(self, func_type, func_key):
+        """
+        Return the dispatch keys of a block (see _function_args), and the
+        list of additional (C expression, value) conditions to check.
+        """
+
+        func_params = self.funcs[func_type][func_key]
+        zone, name = func_key.split('::')
+
+        conditions = []
+
+        if func_type == 'vol':
+            nsplit = name.split('+')
+            keys = [zone, nsplit[0]]
+            for i in range(1, len(nsplit)):
+                conditions.append(('f[%d]->name' % i, nsplit[i]))
+        elif func_type == 'bnd':
+            keys = [name, func_params['cnd'], zone]
+        elif func_type == 'src':
+            keys = [zone, name, func_params['tpe']]
+        elif func_type == 'ini':
+            keys = [zone, name]
+        elif func_type == 'ibm':
+            keys = [name]
+
+        return keys, conditions
+
+    #---------------------------------------------------------------------------
+
     def write_cell_block(self, func_key):
 
         func_params = self.funcs['vol'][func_key]
@@ -417,15 +601,9 @@ class mei_to_c_interpreter:
         if parsed_exp[1] != '':
             usr_defs += parsed_exp[1]
 
-        # Write the block
-        nsplit = name.split('+')
-        usr_blck = tab + 'if (strcmp(f[0]->name, "%s") == 0 &&\n' % (nsplit[0])
-        for i in range(1,len(nsplit)):
-            usr_blck += tab + '    strcmp(f[%d]->name, "%s") == 0 &&\n' % (i, nsplit[i])
-
-        usr_blck += tab + '    strcmp(zone->name, "%s") == 0) {\n' % (zone)
-
-        usr_blck += usr_defs
+        # Write the block (matching conditions are handled by the
+        # dispatch code, see block_dispatch_keys)
+        usr_blck = usr_defs
 
         usr_blck += 2*tab + 'for (cs_lnum_t e_id = 0; e_id < zone->n_elts; e_id++) {\n'
         usr_blck += 3*tab + 'cs_lnum_t c_id = zone->elt_ids[e_id];\n'
@@ -433,7 +611,6 @@ class mei_to_c_interpreter:
         usr_blck += usr_code
 
         usr_blck += 2*tab + '}\n'
-        usr_blck += tab + '}\n'
 
         return usr_blck
 
@@ -532,13 +709,9 @@ class mei_to_c_interpreter:
         if parsed_exp[1] != '':
             usr_defs += parsed_exp[1]
 
-        # Write the block
-        block_cond  = tab + 'if (strcmp(field_name, "%s") == 0 &&\n' % (field_name)
-        block_cond += tab + '    strcmp(condition, "%s") == 0 &&\n' % (cname)
-        block_cond += tab + '    strcmp(zone->name, "%s") == 0) {\n' % (zone)
-        usr_blck = block_cond + '\n'
-
-        usr_blck += usr_defs
+        # Write the block (matching conditions are handled by the
+        # dispatch code, see block_dispatch_keys)
+        usr_blck = usr_defs
 
         if need_for_loop:
             usr_blck += 2*tab + 'for (cs_lnum_t e_id = 0; e_id < zone->n_elts; e_id++) {\n'
@@ -549,8 +722,6 @@ class mei_to_c_interpreter:
         if need_for_loop:
             usr_blck += 2*tab + '}\n'
 
-        usr_blck += tab + '}\n'
-
         return usr_blck
 
     #---------------------------------------------------------------------------
@@ -635,13 +806,9 @@ class mei_to_c_interpreter:
         if parsed_exp[1] != '':
             usr_defs += parsed_exp[1]
 
-        # Write the block
-        block_cond  = tab + 'if (strcmp(zone->name, "%s") == 0 &&\n' % (zone)
-        block_cond += tab + '    strcmp(name, "%s") == 0 && \n' % (name)
-        block_cond += tab + '    strcmp(source_type, "%s") == 0 ) {\n' % (source_type)
-        usr_blck = block_cond + '\n'
-
-        usr_blck += usr_defs
+        # Write the block (matching conditions are handled by the
+        # dispatch code, see block_dispatch_keys)
+        usr_blck = usr_defs
 
         usr_blck += 2*tab + 'for (cs_lnum_t e_id = 0; e_id < zone->n_elts; e_id++) {\n'
         usr_blck += 3*tab + 'cs_lnum_t c_id = zone->elt_ids[e_id];\n'
@@ -649,7 +816,6 @@ class mei_to_c_interpreter:
         usr_blck += usr_code
 
         usr_blck += 2*tab + '}\n'
-        usr_blck += tab + '}\n'
 
         return usr_blck
 
@@ -747,12 +913,9 @@ class mei_to_c_interpreter:
         if parsed_exp[1] != '':
             usr_defs += parsed_exp[1]
 
-        # Write the block
-        block_cond  = tab + 'if (strcmp(zone->name, "%s") == 0 &&\n' % (zone)
-        block_cond += tab + '    strcmp(field_name, "%s") == 0 ) {\n' % (name)
-        usr_blck = block_cond + '\n'
-
-        usr_blck += usr_defs
+        # Write the block (matching conditions are handled by the
+        # dispatch code, see block_dispatch_keys)
+        usr_blck = usr_defs
 
         usr_blck += 2*tab + 'for (cs_lnum_t e_id = 0; e_id < zone->n_elts; e_id++) {\n'
         usr_blck += 3*tab + 'cs_lnum_t c_id = zone->elt_ids[e_id];\n'
@@ -760,7 +923,6 @@ class mei_to_c_interpreter:
         usr_blck += usr_code
 
         usr_blck += 2*tab + '}\n'
-        usr_blck += tab + '}\n'
 
         return usr_blck
 
@@ -833,11 +995,12 @@ class mei_to_c_interpreter:
         if parsed_exp[1] != '':
             usr_defs += parsed_exp[1]
 
-        usr_blck = tab + 'if (strcmp(object_name, "%s") == 0) {' % (name)
+        # Write the block (matching conditions are handled by the
+        # dispatch code, see block_dispatch_keys)
+        usr_blck = ''
         if usr_defs != '':
             usr_blck += usr_defs + '\n'
         usr_blck += usr_code
-        usr_blck += tab + '}\n'
 
         return usr_blck
 
@@ -1665,21 +1828,47 @@ class mei_to_c_interpreter:
 #            if self.module_name != "code_saturne":
 #                code_to_write += _file_header2
             code_to_write += _file_header3
-            code_to_write += _function_header[func_type]
-            for key in self.funcs[func_type].keys():
+
+            # One function per block, called through a dispatch table
+
+            return_type, args, key_exps = _function_args[func_type]
+            entries = []
+
+            for i, key in enumerate(self.funcs[func_type].keys()):
                 zone_name, var_name = key.split('::')
                 var_name = var_name.replace("+", ", ")
                 m1 = _block_comments[func_type] % (var_name, zone_name)
                 m2 = '/*-' + '-'*len(m1) + '-*/\n'
                 m1 = '/* ' + m1 + ' */\n'
 
-                code_to_write += '  ' + m2
-                code_to_write += '  ' + m1
-                code_to_write += self.write_block(func_type, key)
-                code_to_write += '  ' + m2 + '\n'
-
-            if func_type in ['bnd', 'src', 'ini']:
-                code_to_write += '  return new_vals;\n'
+                f_name = '_meg_function_%d' % i
+                keys, conditions = self.block_dispatch_keys(func_type, key)
+                entries.append((keys, f_name))
+
+                code_to_write += m2 + m1 + m2 + '\n'
+                code_to_write += c_function_header(return_type, f_name,
+                                                   args, static=True)
+                code_to_write += '{\n'
+                if return_type != 'void':
+                    code_to_write += '  %snew_vals = NULL;\n\n' % return_type
+                if conditions:
+                    c = ' ||\n      '.join(['strcmp(%s, "%s") != 0' % cnd
+                                            for cnd in conditions])
+                    code_to_write += '  if (' + c + ')\n'
+                    code_to_write += '    return;\n\n'
+
+                # Blocks are written for the body of a conditional
+                block = self.write_block(func_type, key)
+                for l in block.splitlines(True):
+                    if l[:2] == '  ':
+                        l = l[2:]
+                    code_to_write += l
+
+                if return_type != 'void':
+                    code_to_write += '\n  return new_vals;\n'
+                code_to_write += '}\n\n'
+
+            code_to_write += generate_dispatch_code(func_type, entries)
 
             code_to_write += _file_footer
 
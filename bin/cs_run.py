@@ -27,6 +27,8 @@ This module describes the script used to run a study/case for Code_Saturne.
 
 This module defines the following functions:
 - process_cmd_line
+- get_notebook_overrides
+- run
 - main
 """
 
@@ -78,6 +80,23 @@ def process_cmd_line(argv, pkg):
                       metavar="<param>",
                       help="path or name of the parameters file")
 
+    parser.add_option("--notebook-args", dest="notebook_args", type="string",
+                      action="append", metavar="<name>=<value>",
+                      help="override the value of notebook variables " \
+                           + "(may be repeated)")
+
+    parser.add_option("--notebook-file", dest="notebook_file", type="string",
+                      metavar="<file>",
+                      help="override the value of notebook variables " \
+                           + "listed in a file (with the notebook import " \
+                           + "format: name and value per line, separated " \
+                           + "by blanks for .txt files, commas otherwise)")
+
+    parser.add_option("--warm-start", dest="warm_start",
+                      action="store_true",
+                      help="restart from the checkpoint of the finished run " \
+                           + "of the case with the closest notebook values")
+
     parser.add_option("--case", dest="case", type="string",
                       metavar="<case>",
                       help="path to the case's directory")
@@ -130,6 +149,9 @@ def process_cmd_line(argv, pkg):
     parser.set_defaults(execute=False)
     parser.set_defaults(finalize=False)
     parser.set_defaults(param=None)
+    parser.set_defaults(notebook_args=None)
+    parser.set_defaults(notebook_file=None)
+    parser.set_defaults(warm_start=False)
     parser.set_defaults(coupling=None)
     parser.set_defaults(domain=None)
     parser.set_defaults(id=None)
@@ -158,6 +180,28 @@ def process_cmd_line(argv, pkg):
         sys.stderr.write(err_str)
         sys.exit(1)
 
+    if options.coupling and (options.notebook_file or options.notebook_args
+                             or options.warm_start):
+        cmd_line = sys.argv[0]
+        for arg in sys.argv[1:]:
+            cmd_line += ' ' + arg
+        err_str = 'Error:\n' + cmd_line + '\n' \
+                  '--coupling and --notebook-*/--warm-start options ' \
+                  'are incompatible.\n'
+        sys.stderr.write(err_str)
+        sys.exit(1)
+
+    # Notebook variable overrides (file first, then command line)
+
+    notebook = None
+    if options.notebook_file or options.notebook_args:
+        try:
+            notebook = get_notebook_overrides(options.notebook_file,
+                                              options.notebook_args)
+        except Exception as e:
+            sys.stderr.write('Error:\n' + str(e) + '\n')
+            sys.exit(1)
+
     casedir, staging_dir = cs_case.get_case_dir(case=options.case,
                                                 param=options.param,
                                                 coupling=options.coupling,
@@ -233,10 +277,56 @@ def process_cmd_line(argv, pkg):
     n_procs = options.nprocs
     n_threads = options.nthreads
 
-    return  (casedir, staging_dir, options.id, param, options.coupling,
+    return  (casedir, staging_dir, options.id, param, notebook,
+             options.warm_start, options.coupling,
              options.id_prefix, options.id_suffix, options.suggest_id, force_id,
              n_procs, n_threads, stages, compute_build)
 
+#===============================================================================
+# Notebook variable overrides
+#===============================================================================
+
+def get_notebook_overrides(notebook_file=None, notebook_args=None):
+    """
+    Build a dictionary of notebook variable values from a file using the
+    notebook import format (name and value on each line, separated by
+    blanks for .txt files, commas otherwise), and from a list of
+    <name>=<value> strings (each possibly containing several blank-separated
+    assignments), the latter having priority.
+    """
+
+    notebook = {}
+
+    if notebook_file:
+        ext = os.path.splitext(notebook_file)[1]
+        f = open(notebook_file, 'r')
+        for line in f.readlines():
+            if ext == '.txt':
+                content = line.split()
+            else:
+                content = line.split(',')
+            if len(content) >= 2:
+                notebook[content[0].strip()] = content[1].strip()
+        f.close()
+
+    if notebook_args:
+        for a in notebook_args:
+            for kv in a.split():
+                i = kv.find('=')
+                if i < 1:
+                    raise ValueError('notebook variable override "' + kv
+                                     + '" is not of the form <name>=<value>.')
+                notebook[kv[:i]] = kv[i+1:]
+
+    for k in notebook:
+        try:
+            float(notebook[k])
+        except ValueError:
+            raise ValueError('value "' + notebook[k] + '" of notebook'
+                             + ' variable "' + k + '" is not a number.')
+
+    return notebook
+
 #===============================================================================
 # Run the calculation
 #===============================================================================
@@ -247,7 +337,7 @@ def run(argv, pkg):
     returns return code, run id, and results directory path when created.
     """
 
-    (casedir, staging_dir, run_id, param, coupling,
+    (casedir, staging_dir, run_id, param, notebook, warm_start, coupling,
      id_prefix, id_suffix, suggest_id, force, n_procs, n_threads,
      stages, compute_build) = process_cmd_line(argv, pkg)
 
@@ -296,7 +386,8 @@ def run(argv, pkg):
 
     else:
         # Values in case and associated domain set from parameters
-        d = cs_case_domain.domain(pkg, package_compute=pkg_compute, param=param)
+        d = cs_case_domain.domain(pkg, package_compute=pkg_compute, param=param,
+                                  notebook=notebook, warm_start=warm_start)
 
         # Now handle case for the corresponding calculation domain(s).
         c = cs_case.case(pkg,
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+This module defines a timer for the stages of a run (data preparation,
+compilation, preprocessing, solver, results copy), with optional
+profiling of the Python stages.
+
+This module defines the following class:
+- run_timer
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import contextlib
+import datetime
+import json
+import os
+import time
+
+#===============================================================================
+# Class used to time run stages
+#===============================================================================
+
+class run_timer(object):
+    """
+    Record wall-clock and CPU times of nested run stages. Each stage is
+    recorded with its path (names of enclosing stages and its own name,
+    separated by '/'), the associated domain if any, its start time
+    (relative to the timer creation), and elapsed times.
+    """
+
+    #---------------------------------------------------------------------------
+
+    def __init__(self, enabled=True, profile=None):
+        """
+        Initialize timer. If profile is not given, top-level Python stages
+        are profiled with cProfile if the CS_RUN_PROFILE environment
+        variable is set (and not 0).
+        """
+
+        self.enabled = enabled
+
+        if profile == None:
+            profile = os.getenv('CS_RUN_PROFILE') not in (None, '', '0')
+        self.profile = profile
+
+        self.records = []
+        self.profiles = []
+        self.stack = []
+
+        self.t_start = time.time()
+        self.date = datetime.datetime.now().isoformat()
+
+    #---------------------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def stage(self, name, domain=None, python=True):
+        """
+        Context manager timing a stage. Set python to False for stages
+        running mostly external processes, which are not profiled.
+        """
+
+        if not self.enabled:
+            yield
+            return
+
+        self.stack.append(name)
+        r = {'name': name,
+             'path': '/'.join(self.stack),
+             'domain': domain,
+             'start': time.time() - self.t_start}
+        self.records.append(r)
+
+        prof = None
+        if self.profile and python and len(self.stack) == 1:
+            import cProfile
+            prof = cProfile.Profile()
+            prof.enable()
+
+        t0 = time.time()
+        c0 = os.times()
+
+        try:
+            yield
+        finally:
+            c1 = os.times()
+            r['wall'] = time.time() - t0
+            r['cpu'] = (c1[0] + c1[1]) - (c0[0] + c0[1])
+            r['cpu_children'] = (c1[2] + c1[3]) - (c0[2] + c0[3])
+            if prof != None:
+                prof.disable()
+                self.profiles.append((name, prof))
+            self.stack.pop()
+
+    #---------------------------------------------------------------------------
+
+    def write_json(self, dir_path, name='run_timings.json'):
+        """
+        Write stage timings to a JSON file, appending them to those
+        of previous stages of the same run if the file exists.
+        """
+
+        if not self.enabled or not self.records:
+            return
+
+        path = os.path.join(dir_path, name)
+
+        runs = []
+        if os.path.isfile(path):
+            try:
+                f = open(path)
+                runs = json.load(f)['runs']
+                f.close()
+            except Exception:
+                runs = []
+
+        runs.append({'date': self.date, 'stages': self.records})
+
+        f = open(path, 'w')
+        json.dump({'runs': runs}, f, indent=1, sort_keys=True)
+        f.write('\n')
+        f.close()
+
+    #---------------------------------------------------------------------------
+
+    def write_profiles(self, dir_path):
+        """
+        Write the profiles of top-level stages, if any, to
+        run_profile_<stage>.prof files (readable with the pstats module).
+        """
+
+        for name, prof in self.profiles:
+            prof.dump_stats(os.path.join(dir_path,
+                                         'run_profile_' + name + '.prof'))
+
+    #---------------------------------------------------------------------------
+
+    def summary_str(self):
+        """
+        Return a summary line with the times of top-level stages.
+        """
+
+        s = ''
+        for r in self.records:
+            if r['path'] == r['name'] and 'wall' in r:
+                s += ', %s %.2f s' % (r['name'], r['wall'])
+
+        return s[2:]
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -35,21 +35,6 @@ import platform
 from optparse import OptionParser
 from datetime import datetime, date
 
-import smtplib
-
-try: # email version 3.0 (Python2 up to 2.6)
-    from email.Utils import COMMASPACE, formatdate
-    from email import Encoders
-    from email.MIMEMultipart import MIMEMultipart
-    from email.MIMEBase import MIMEBase
-    from email.MIMEText import MIMEText
-except Exception: # email version 4.0 (Python2 from Python 2.5)
-    from email.utils import COMMASPACE, formatdate
-    from email import encoders
-    from email.mime.multipart import MIMEMultipart
-    from email.mime.base import MIMEBase
-    from email.mime.text import MIMEText
-
 #-------------------------------------------------------------------------------
 # Application modules import
 #-------------------------------------------------------------------------------
@@ -97,6 +82,12 @@ def process_cmd_line(argv, pkg):
     parser.add_option("--n-procs",  dest="n_procs", default=None, type="int",
                       help="Optional number of processors requested for the computations")
 
+    parser.add_option("--max-cores", dest="max_cores", default=None, type="int",
+                      help="run independent cases concurrently, using at most MAX_CORES cores in total (default: available cores if --jobs is given)")
+
+    parser.add_option("-j", "--jobs", dest="n_jobs", default=None, type="int",
+                      help="run at most N_JOBS cases concurrently (default: no limit other than --max-cores)")
+
     parser.add_option("-n", "--n-iterations", dest="n_iterations",
                       type="int", help="maximum number of iterations for cases of the study")
 
@@ -104,6 +95,10 @@ def process_cmd_line(argv, pkg):
                       action="store_true", dest="compare", default=False,
                       help="compare results between repository and destination")
 
+    parser.add_option("--compare-jobs", dest="compare_jobs", default=None,
+                      type="int",
+                      help="number of simultaneous checkpoint comparisons (default: value of --jobs, or 1)")
+
     parser.add_option("-d", "--ref-dir", dest="reference", type="string",
                       help="absolute reference directory to compare dest with")
 
@@ -214,6 +209,21 @@ def send_mail(send_from, send_to, subject, text, files=[], server="localhost"):
     """
     Send the report by mail.
     """
+    import smtplib
+
+    try: # email version 3.0 (Python2 up to 2.6)
+        from email.Utils import COMMASPACE, formatdate
+        from email import Encoders
+        from email.MIMEMultipart import MIMEMultipart
+        from email.MIMEBase import MIMEBase
+        from email.MIMEText import MIMEText
+    except Exception: # email version 4.0 (Python2 from Python 2.5)
+        from email.utils import COMMASPACE, formatdate
+        from email import encoders
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.base import MIMEBase
+        from email.mime.text import MIMEText
+
     assert type(send_to) == list
     assert type(files)   == list
 
@@ -285,13 +295,18 @@ def run_studymanager(pkg, options):
 
     dif = pkg.get_io_dump()
 
-    for p in exe, dif:
-        if not os.path.isfile(p):
-            print("Error: executable %s not found." % p)
-            if not sys.platform.startswith('win'):
-                return 1
+    if not os.path.isfile(exe):
+        print("Error: executable %s not found." % exe)
+        if not sys.platform.startswith('win'):
+            return 1
+
+    # Checkpoint files are compared using the Python implementation
+    # when the dump tool is not available.
 
-    dif += " -d"
+    if os.path.isfile(dif):
+        dif += " -d"
+    else:
+        dif = None
 
     # Read the file of parameters
 
@@ -311,7 +326,10 @@ def run_studymanager(pkg, options):
     studies.reporting(" Code name:         " + pkg.name)
     studies.reporting(" Kernel version:    " + pkg.version)
     studies.reporting(" Install directory: " + pkg.get_dir('exec_prefix'))
-    studies.reporting(" File dump:         " + dif)
+    if dif:
+        studies.reporting(" File dump:         " + dif)
+    else:
+        studies.reporting(" File dump:         Python (cs_io_file)")
 
     studies.reporting("\n Informations:")
     studies.reporting(" -------------\n")
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+This module defines a summary of the features activated in a case, used
+to configure the browser tree. It only reads the XML document (no node is
+created, and no model class is loaded), using the models' default values
+for missing nodes.
+
+This module contains the following function:
+- getCaseFeatures
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import sys, unittest
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.model.XMLmodel import ModelTest
+
+#-------------------------------------------------------------------------------
+# Utility function: get features summary from case
+#-------------------------------------------------------------------------------
+
+def getCaseFeatures(case):
+    """
+    This function returns a dictionary of activated features for a case.
+    """
+
+    f = {}
+
+    f['neptune_cfd'] = (case.xmlRootNode().tagName == "NEPTUNE_CFD_GUI")
+
+    f['ale'] = False
+    f['turbomachinery'] = False
+    f['fans'] = False
+    f['thermal'] = 0
+    f['cht'] = False
+    f['gas_combustion'] = False
+    f['solid_fuels'] = False
+    f['electrical'] = False
+    f['atmospheric'] = False
+    f['compressible'] = False
+    f['groundwater'] = False
+    f['lagrangian'] = False
+
+    node_pm = case.xmlGetNode('thermophysical_models')
+
+    if node_pm:
+
+        node = node_pm.xmlGetNode('ale_method')
+        if node and node['status'] == 'on':
+            f['ale'] = True
+        node = node_pm.xmlGetNode('turbomachinery', 'model')
+        if node and node['model'] != "off":
+            f['turbomachinery'] = True
+        node = node_pm.xmlGetNode('fans')
+        if node:
+            f['fans'] = True
+
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('gas_combustion', 'model')
+            if node and node['model'] in ('ebu', 'd3p', 'lwp'):
+                f['gas_combustion'] = True
+                f['thermal'] = 1
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('solid_fuels', 'model')
+            if node and node['model'] in ('homogeneous_fuel',
+                                          'homogeneous_fuel_moisture',
+                                          'homogeneous_fuel_moisture_lagr'):
+                f['solid_fuels'] = True
+                f['thermal'] = 1
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('joule_effect', 'model')
+            if node and node['model'] in ('joule', 'arc'):
+                f['electrical'] = True
+                f['thermal'] = 1
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('atmospheric_flows',  'model')
+            if node and node['model'] != 'off':
+                f['atmospheric'] = True
+                if node['model'] == 'constant':
+                    f['thermal'] = -1
+                elif node['model'] in ('dry', 'humid'):
+                    f['thermal'] = 1
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('compressible_model', 'model')
+            if node and node['model'] != 'off':
+                f['compressible'] = True
+                f['thermal'] = 1
+
+        if not f['thermal']:
+            node = node_pm.xmlGetNode('thermal_scalar', 'model')
+            if node and node['model'] != 'off':
+                f['thermal'] = 2
+
+        node = node_pm.xmlGetNode('groundwater_model',  'model')
+        if node and node['model'] != 'off':
+            f['groundwater'] = True
+            f['thermal'] = -1
+            f['fans'] = False
+
+        if f['thermal'] > 0:
+            f['cht'] = True
+
+    node = case.xmlGetNode('lagrangian', 'model')
+    if node and node['model'] != "off":
+        f['lagrangian'] = True
+
+    # Options for NEPTUNE_CFD (defaults from MainFieldsModel
+    # and InterfacialForcesModel)
+
+    f['fields'] = 0
+    f['non_condens'] = False
+    f['nucleate_boiling'] = False
+    f['droplet_condens'] = False
+    f['particles_interactions'] = False
+    f['itf_area'] = False
+    f['itf_h_transfer'] = False
+
+    if f['neptune_cfd'] and node_pm:
+
+        f['fans'] = False
+        f['thermal'] = 1
+        f['cht'] = True
+
+        fields = []
+        node_f = node_pm.xmlGetNode('fields')
+        if node_f:
+            fields = node_f.xmlGetNodeList('field')
+        f['fields'] = len(fields)
+
+    if f['fields'] > 1:
+        predefined_flow = "None"
+        node = node_pm.xmlGetNode('predefined_flow')
+        if node:
+            predefined_flow = node['choice']
+
+        for node in fields:
+            n = node.xmlGetChildNode('phase')
+            if n and n['choice'] == 'solid':
+                f['particles_interactions'] = True
+            n = node.xmlGetChildNode('type')
+            if n and n['choice'] == 'dispersed':
+                f['itf_area'] = True
+
+        node = case.xmlGetNode('closure_modeling')
+        if node:
+            node = node.xmlGetNode('interfacial_forces')
+        if node:
+            node = node.xmlGetChildNode('continuous_field_momentum_transfer')
+        if node and node.xmlGetString('BubblesForLIM') == 'on':
+            f['itf_area'] = True
+
+        if predefined_flow in ("free_surface", "boiling_flow"):
+            f['non_condens'] = True
+            f['nucleate_boiling'] = True
+            f['itf_h_transfer'] = True
+        elif predefined_flow == "droplet_flow":
+            f['non_condens'] = True
+            f['droplet_condens'] = True
+            f['itf_h_transfer'] = True
+        elif predefined_flow == "particles_flow":
+            f['particles_interactions'] = True
+            f['itf_h_transfer'] = True
+
+    # Volume zones
+
+    f['initialization'] = False
+    f['source_terms'] = False
+    f['head_losses'] = False
+    f['porosity'] = False
+    f['groundwater_laws'] = False
+
+    node_vol = None
+    node_domain = case.xmlGetNode('solution_domain')
+    if node_domain:
+        node_vol = node_domain.xmlGetNode('volumic_conditions')
+
+    if node_vol:
+        for node in node_vol.xmlGetChildNodeList('zone'):
+            if (node['initialization'] == 'on'):
+                f['initialization'] = True
+            if (node['momentum_source_term'] == 'on'
+                or node['mass_source_term'] == 'on'
+                or node['thermal_source_term'] == 'on'
+                or node['scalar_source_term'] == 'on'):
+                f['source_terms'] = True
+            if node['head_losses'] == 'on':
+                f['head_losses'] = True
+            if node['porosity'] == 'on':
+                f['porosity'] = True
+            if node['groundwater_law'] == 'on':
+                f['groundwater_laws'] = True
+
+    return f
+
+#-------------------------------------------------------------------------------
+# CaseFeatures test case
+#-------------------------------------------------------------------------------
+
+class CaseFeaturesTestCase(ModelTest):
+    """
+    """
+    def checkGetCaseFeatures(self):
+        """Check whether features could be read without modifying the case"""
+        s = self.case.toString()
+        f = getCaseFeatures(self.case)
+        assert f['neptune_cfd'] == False and f['thermal'] == 0, \
+            'Could not get features of an empty case'
+        assert self.case.toString() == s, \
+            'Case modified by getCaseFeatures'
+
+        node = self.case.root().xmlInitChildNode('thermophysical_models')
+        node.xmlInitNode('thermal_scalar')['model'] = 'temperature_celsius'
+        node.xmlInitNode('groundwater_model')['model'] = 'off'
+        node = self.case.root().xmlInitChildNode('lagrangian')
+        node['model'] = 'one_way'
+        f = getCaseFeatures(self.case)
+        assert f['thermal'] == 2 and f['cht'] == True \
+            and f['lagrangian'] == True and f['groundwater'] == False, \
+            'Could not get thermal and lagrangian features'
+
+
+def suite():
+    testSuite = unittest.makeSuite(CaseFeaturesTestCase, "check")
+    return testSuite
+
+
+def runTest():
+    print("CaseFeaturesTestCase")
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -28,6 +28,9 @@ It provides a management of the XML document, which reflets the treated case.
 
 This module defines the following classes:
 - Dico
+- XMLIndex
+- XMLJournalStep
+- XMLJournal
 - XMLElement
 - XMLDocument
 - Case
@@ -38,7 +41,7 @@ This module defines the following classes:
 # Library modules import
 #-------------------------------------------------------------------------------
 
-import os, sys, unittest, logging
+import os, sys, unittest, logging, hashlib, tempfile, io, shutil
 from xml.dom.minidom import Document, parse, parseString, Node
 
 #-------------------------------------------------------------------------------
@@ -189,6 +192,427 @@ else:
         return v
 
 
+def _xmlSerializerRules():
+    """
+    Return the escaping rules of the minidom serializer, which depend
+    on the Python version: whether quotes are escaped in text nodes, and
+    whether whitespace is escaped (thus kept when parsing) in attributes.
+    """
+    d = Document()
+    e = d.createElement('a')
+    e.setAttribute('b', '\n')
+    e.appendChild(d.createTextNode('"'))
+    s = e.toxml()
+    return '&quot;' in s, '&#10;' in s
+
+_xml_quot_in_text, _xml_ws_in_attr = _xmlSerializerRules()
+
+
+class _xmlHashWriter:
+    """
+    File writer also computing the hash of the written contents.
+    """
+    def __init__(self, f):
+        self.f = f
+        self.h = hashlib.sha1()
+
+    def write(self, s):
+        self.f.write(s)
+        self.h.update(s.encode('utf-8'))
+
+    def hexdigest(self):
+        return self.h.hexdigest()
+
+
+class XMLIndex:
+    """
+    Index of the ELEMENT_NODE nodes of a document by tag name and
+    attribute value. It is kept up to date by the XMLElement methods which
+    modify the document, so nodes must not be modified directly with the
+    minidom API when the index is active.
+    """
+    def __init__(self, doc):
+        """
+        Constructor: build the index of the whole document.
+        """
+        self.doc    = doc
+        self.tags   = {}  # tag -> set of nodes
+        self.attrs  = {}  # (tag, attr) -> set of nodes
+        self.values = {}  # (tag, attr, value) -> set of nodes
+
+        self.addSubtree(doc)
+
+
+    def __add(self, d, key, node):
+        """
+        Add a node to the set associated to a key.
+        """
+        s = d.get(key)
+        if s is None:
+            d[key] = set([node])
+        else:
+            s.add(node)
+
+
+    def __discard(self, d, key, node):
+        """
+        Remove a node from the set associated to a key.
+        """
+        s = d.get(key)
+        if s is not None:
+            s.discard(node)
+            if not s:
+                del d[key]
+
+
+    def __elementNodes(self, node):
+        """
+        Return the list of ELEMENT_NODE nodes of a subtree (including its root).
+        """
+        elements = []
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.nodeType == Node.ELEMENT_NODE:
+                elements.append(n)
+            if n.childNodes:
+                stack.extend(n.childNodes)
+        return elements
+
+
+    def contains(self, node):
+        """
+        Return True if the node is indexed.
+        """
+        s = self.tags.get(node.nodeName)
+        return s is not None and node in s
+
+
+    def addSubtree(self, node):
+        """
+        Index a node and all its descendants.
+        """
+        for n in self.__elementNodes(node):
+            tag = n.tagName
+            self.__add(self.tags, tag, n)
+            for attr, value in list(n.attributes.items()):
+                self.__add(self.attrs, (tag, attr), n)
+                self.__add(self.values, (tag, attr, value), n)
+
+
+    def removeSubtree(self, node):
+        """
+        Remove a node and all its descendants from the index.
+        """
+        for n in self.__elementNodes(node):
+            tag = n.tagName
+            self.__discard(self.tags, tag, n)
+            for attr, value in list(n.attributes.items()):
+                self.__discard(self.attrs, (tag, attr), n)
+                self.__discard(self.values, (tag, attr, value), n)
+
+
+    def updateAttribute(self, node, attr, old_value):
+        """
+        Update the index after the modification of a node attribute;
+        'old_value' is None if the attribute did not exist before.
+        """
+        if not self.contains(node):
+            return
+
+        tag = node.tagName
+        if old_value is not None:
+            self.__discard(self.values, (tag, attr, old_value), node)
+        if node.hasAttribute(attr):
+            self.__add(self.attrs, (tag, attr), node)
+            self.__add(self.values, (tag, attr, node.getAttribute(attr)), node)
+        else:
+            self.__discard(self.attrs, (tag, attr), node)
+
+
+    def sortByDocumentOrder(self, nodeList):
+        """
+        Return the given nodes sorted in document order.
+        """
+        positions = {}
+
+        def path(n):
+            p = []
+            while n.parentNode is not None:
+                parent = n.parentNode
+                d = positions.get(parent)
+                if d is None:
+                    d = dict((c, i) for i, c in enumerate(parent.childNodes))
+                    positions[parent] = d
+                p.append(d[n])
+                n = parent
+            p.reverse()
+            return p
+
+        if len(nodeList) < 2:
+            return list(nodeList)
+        return sorted(nodeList, key=path)
+
+
+    def nodeList(self, root, tag, attrList, kwargs, childOnly=False):
+        """
+        Return the list of the descendants of 'root' (or of its children
+        only if 'childOnly' is True) with the given tag, which have all the
+        attributes of 'attrList' and the attribute values of 'kwargs',
+        in document order (same result as XMLElement._nodeList).
+        """
+        attrList = [str(a) for a in attrList]
+        values = [(str(k), str(v)) for k, v in list(kwargs.items())]
+
+        # Select the smallest candidate set; an empty value also
+        # matches a missing attribute, so only the tag may then be used.
+
+        candidates = self.tags.get(tag, ())
+        if values and "" not in [v for k, v in values]:
+            for k, v in values:
+                s = self.values.get((tag, k, v), ())
+                if len(s) < len(candidates):
+                    candidates = s
+        for a in attrList:
+            s = self.attrs.get((tag, a), ())
+            if len(s) < len(candidates):
+                candidates = s
+
+        nodeList = []
+        for node in candidates:
+            if node.tagName != tag:
+                continue
+            iok = 1
+            for a in attrList:
+                if not node.hasAttribute(a):
+                    iok = 0
+                    break
+            if iok:
+                for k, v in values:
+                    if node.getAttribute(k) != v:
+                        iok = 0
+                        break
+            if not iok:
+                continue
+            n = node.parentNode
+            if childOnly:
+                iok = n is root
+            else:
+                while n is not None and n is not root:
+                    n = n.parentNode
+                iok = n is root
+            if iok:
+                nodeList.append(node)
+
+        return self.sortByDocumentOrder(nodeList)
+
+
+class XMLJournalStep:
+    """
+    Step of a journal: list of operations recorded between two undo
+    points, and estimated memory size of the step.
+    """
+    def __init__(self):
+        """
+        Constructor.
+        """
+        self.ops  = []
+        self.size = 0
+
+
+class XMLJournal:
+    """
+    Journal of the modifications of a document, used for undo/redo.
+    The XMLElement methods which modify the document record node-level
+    operations in the current step, so that steps may be reverted or
+    applied again in place. As for the index, nodes must not be modified
+    directly with the minidom API when the journal is active.
+    """
+    def __init__(self, doc, max_size=16*1024*1024):
+        """
+        Constructor. 'max_size' is the memory budget (in bytes) of the
+        undo and redo steps.
+        """
+        self.doc      = doc
+        self.max_size = max_size
+        self.step     = None  # step in which operations are recorded
+        self.modified = True  # modified since the last new step
+
+
+    def __subtreeSize(self, node):
+        """
+        Return the estimated memory size of a subtree.
+        """
+        size = 0
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            size += 64
+            if n.nodeType == Node.ELEMENT_NODE:
+                for attr, value in list(n.attributes.items()):
+                    size += 64 + len(attr) + len(value)
+            elif n.nodeType in (Node.TEXT_NODE, Node.COMMENT_NODE):
+                size += len(n.data)
+            if n.childNodes:
+                stack.extend(n.childNodes)
+        return size
+
+
+    def __record(self, op, size):
+        """
+        Add an operation to the current step.
+        """
+        self.step.ops.append(op)
+        self.step.size += size
+        self.modified = True
+
+
+    def newStep(self):
+        """
+        Start a new step, in which the next operations are recorded.
+        """
+        self.step = XMLJournalStep()
+        self.modified = False
+        return self.step
+
+
+    def recordAttribute(self, node, attr, old_value, new_value):
+        """
+        Record the modification of an attribute; values are None
+        when the attribute does not exist. For a removal, this must be
+        called before the attribute is removed, so that its position
+        may be restored.
+        """
+        if old_value != new_value:
+            position = None
+            if new_value is None:
+                position = list(node.attributes.keys()).index(attr)
+            size = 64 + len(attr) + len(old_value or '') + len(new_value or '')
+            self.__record(('attr', node, attr, old_value, new_value, position),
+                          size)
+
+
+    def recordText(self, node, old_data, new_data):
+        """
+        Record the modification of a text node.
+        """
+        if old_data != new_data:
+            self.__record(('text', node, old_data, new_data),
+                          64 + len(old_data) + len(new_data))
+
+
+    def recordInsert(self, node):
+        """
+        Record the insertion of a node in the document.
+        """
+        self.__record(('insert', node.parentNode, node, node.nextSibling),
+                      self.__subtreeSize(node))
+
+
+    def recordRemove(self, node):
+        """
+        Record the removal of a node from the document (before its removal).
+        """
+        self.__record(('remove', node.parentNode, node, node.nextSibling),
+                      self.__subtreeSize(node))
+
+
+    def __setAttribute(self, node, attr, value, index, position=None):
+        """
+        Set or remove (if value is None) an attribute. A new attribute
+        is added at the given position, or last.
+        """
+        if node.hasAttribute(attr):
+            old_value = node.getAttribute(attr)
+        else:
+            old_value = None
+        if value is None:
+            if old_value is not None:
+                node.removeAttribute(attr)
+        elif old_value is None and position is not None:
+            items = list(node.attributes.items())
+            items.insert(position, (attr, value))
+            for a, v in items[position+1:]:
+                node.removeAttribute(a)
+            for a, v in items[position:]:
+                node.setAttribute(a, v)
+        else:
+            node.setAttribute(attr, value)
+        if index is not None:
+            index.updateAttribute(node, attr, old_value)
+
+
+    def __insert(self, parent, node, next_sibling, index):
+        """
+        Insert a node before a given sibling (or at the end if this sibling
+        is not a child of the parent node anymore).
+        """
+        if node.parentNode is not None:
+            return
+        if next_sibling is not None and next_sibling.parentNode is not parent:
+            next_sibling = None
+        parent.insertBefore(node, next_sibling)
+        if index is not None and (parent is index.doc or index.contains(parent)):
+            index.addSubtree(node)
+
+
+    def __remove(self, parent, node, index):
+        """
+        Remove a node from its parent.
+        """
+        if node.parentNode is not parent:
+            return
+        if index is not None:
+            index.removeSubtree(node)
+        parent.removeChild(node)
+
+
+    def revert(self, step, index=None):
+        """
+        Revert the operations of a step, updating the given index.
+        """
+        for op in reversed(step.ops):
+            if op[0] == 'attr':
+                self.__setAttribute(op[1], op[2], op[3], index, op[5])
+            elif op[0] == 'text':
+                op[1].data = op[2]
+            elif op[0] == 'insert':
+                self.__remove(op[1], op[2], index)
+            elif op[0] == 'remove':
+                self.__insert(op[1], op[2], op[3], index)
+        self.modified = True
+
+
+    def apply(self, step, index=None):
+        """
+        Apply again the operations of a reverted step, updating the
+        given index.
+        """
+        for op in step.ops:
+            if op[0] == 'attr':
+                self.__setAttribute(op[1], op[2], op[4], index)
+            elif op[0] == 'text':
+                op[1].data = op[3]
+            elif op[0] == 'insert':
+                self.__insert(op[1], op[2], op[3], index)
+            elif op[0] == 'remove':
+                self.__remove(op[1], op[2], index)
+        self.modified = True
+
+
+    def limitSize(self, undo, redo):
+        """
+        Remove the oldest records of the 'undo' list (lists of the form
+        [page, step, index, tab]) so that the size of steps does not exceed
+        the memory budget. The most recent record is always kept.
+        """
+        size = 0
+        for r in undo + redo:
+            size += r[1].size
+        while size > self.max_size and len(undo) > 1:
+            size -= undo.pop(0)[1].size
+
+
 class XMLElement:
     """
     XML element base class
@@ -303,6 +727,59 @@ class XMLElement:
         return XMLElement(self.doc, el, self.ca)
 
 
+    def _xmlIndex(self):
+        """
+        Return the active index of the case document if it applies to
+        the current node, None otherwise.
+        """
+        index = getattr(self.ca, 'xml_index', None)
+        if index is not None:
+            if (self.el.ownerDocument or self.el) is index.doc:
+                return index
+        return None
+
+
+    def _xmlJournal(self):
+        """
+        Return the active journal of the case document if it applies to
+        the current node and a step is being recorded, None otherwise.
+        """
+        journal = getattr(self.ca, 'xml_journal', None)
+        if journal is not None and journal.step is not None:
+            if (self.el.ownerDocument or self.el) is journal.doc:
+                return journal
+        return None
+
+
+    def _xmlModified(self):
+        """
+        Increment the modification counter of the case document.
+        """
+        if getattr(self.ca, 'xml_generation', None) is not None:
+            self.ca.xml_generation += 1
+
+
+    def _xmlSetAttribute(self, attr, value):
+        """
+        Set an attribute of the current node and update the index
+        and journal.
+        """
+        self._xmlModified()
+        index = self._xmlIndex()
+        journal = self._xmlJournal()
+        if self.el.hasAttribute(attr):
+            old_value = self.el.getAttribute(attr)
+        else:
+            old_value = None
+
+        self.el.setAttribute(attr, value)
+
+        if index is not None:
+            index.updateAttribute(self.el, attr, old_value)
+        if journal is not None:
+            journal.recordAttribute(self.el, attr, old_value, value)
+
+
     def xmlCreateAttribute(self, **kwargs):
         """
         Set attributes to a XMLElement node, only if these attributes
@@ -310,7 +787,7 @@ class XMLElement:
         """
         for attr, value in list(kwargs.items()):
             if not self.el.hasAttribute(attr):
-                self.el.setAttribute(attr, _encode(str(value)))
+                self._xmlSetAttribute(attr, _encode(str(value)))
 
         log.debug("xmlCreateAttribute-> %s" % self.__xmlLog())
 
@@ -355,7 +832,7 @@ class XMLElement:
         Set several attribute (key=value) to a node
         """
         for attr, value in list(kwargs.items()):
-            self.el.setAttribute(attr, _encode(str(value)))
+            self._xmlSetAttribute(attr, _encode(str(value)))
 
         log.debug("xmlSetAttribute-> %s" % self.__xmlLog())
 
@@ -365,7 +842,15 @@ class XMLElement:
         Delete the XMLElement node attribute
         """
         if self.el.hasAttribute(attr):
+            self._xmlModified()
+            old_value = self.el.getAttribute(attr)
+            journal = self._xmlJournal()
+            if journal is not None:
+                journal.recordAttribute(self.el, attr, old_value, None)
             self.el.removeAttribute(attr)
+            index = self._xmlIndex()
+            if index is not None:
+                index.updateAttribute(self.el, attr, old_value)
 
         log.debug("xmlDelAttribute-> %s %s" % (attr, self.__xmlLog()))
 
@@ -387,7 +872,7 @@ class XMLElement:
         Set a XMLElement attribute an its value
         with a dictionary syntax: node['attr'] = value
         """
-        self.el.setAttribute(attr, _encode(str(value)))
+        self._xmlSetAttribute(attr, _encode(str(value)))
 
         log.debug("__setitem__-> %s" % self.__xmlLog())
 
@@ -528,6 +1013,10 @@ class XMLElement:
         """
         Return a list of Element (and not XMLElement)!
         """
+        index = self._xmlIndex()
+        if index is not None:
+            return index.nodeList(self.el, tag, attrList, kwargs)
+
         nodeList = []
 
         # Get the nodes list
@@ -568,6 +1057,10 @@ class XMLElement:
         """
         Return a list of first child Element node from the explored XMLElement node.
         """
+        index = self._xmlIndex()
+        if index is not None:
+            return index.nodeList(self.el, tag, attrList, kwargs, childOnly=True)
+
         nodeList = self._nodeList(tag, *attrList, **kwargs)
 
         childNodeList = []
@@ -620,7 +1113,18 @@ class XMLElement:
 
         log.debug("xmlAddChild-> %s %s" % (tag, self.__xmlLog()))
 
-        return self._inst(self.el.insertBefore(el, nn))
+        el = self.el.insertBefore(el, nn)
+        self._xmlModified()
+
+        index = self._xmlIndex()
+        if index is not None and (self.el is index.doc or index.contains(self.el)):
+            index.addSubtree(el)
+
+        journal = self._xmlJournal()
+        if journal is not None:
+            journal.recordInsert(el)
+
+        return self._inst(el)
 
 
     def xmlSetTextNode(self, newTextNode):
@@ -633,14 +1137,20 @@ class XMLElement:
 
         if type(newTextNode) != str: newTextNode = str(newTextNode)
 
+        self._xmlModified()
+        journal = self._xmlJournal()
+
         if self.el.hasChildNodes():
             for n in self.el.childNodes:
                 if n.nodeType == Node.TEXT_NODE:
+                    old_data = n.data
                     n.data = _encode(newTextNode)
+                    if journal is not None:
+                        journal.recordText(n, old_data, n.data)
         else:
-            self._inst(
-                self.el.appendChild(
-                    self.doc.createTextNode(_encode(newTextNode))))
+            n = self.el.appendChild(self.doc.createTextNode(_encode(newTextNode)))
+            if journal is not None:
+                journal.recordInsert(n)
 
         log.debug("xmlSetTextNode-> %s" % self.__xmlLog())
 
@@ -856,6 +1366,10 @@ class XMLElement:
         Create a comment XMLElement node.
         """
         elt = self._inst( self.el.appendChild(self.doc.createComment(data)) )
+        self._xmlModified()
+        journal = self._xmlJournal()
+        if journal is not None:
+            journal.recordInsert(elt.el)
         log.debug("xmlAddComment-> %s" % self.__xmlLog())
         return elt
 
@@ -1021,9 +1535,19 @@ class XMLElement:
         Copy all childsNode of oldNode to the node newNode.
         'deep' is the childs and little-childs level of the copy.
         """
+        index = self._xmlIndex()
+        if index is not None and not index.contains(self.el):
+            index = None
+        journal = self._xmlJournal()
+
         if oldNode.el.hasChildNodes():
+            self._xmlModified()
             for n in oldNode.el.childNodes:
-                self._inst(self.el.appendChild(n.cloneNode(deep)))
+                c = self.el.appendChild(n.cloneNode(deep))
+                if index is not None:
+                    index.addSubtree(c)
+                if journal is not None:
+                    journal.recordInsert(c)
 
         log.debug("xmlChildsCopy-> %s" % self.__xmlLog())
 
@@ -1032,8 +1556,19 @@ class XMLElement:
         """
         Destroy a single node.
         """
+        self._xmlModified()
+        index = self._xmlIndex()
+        if index is not None:
+            index.removeSubtree(self.el)
+
+        # Removed nodes are kept by the journal for undo
+        journal = self._xmlJournal()
+        if journal is not None:
+            journal.recordRemove(self.el)
+
         oldChild = self.el.parentNode.removeChild(self.el)
-        oldChild.unlink()
+        if journal is None:
+            oldChild.unlink()
 
 
     def xmlRemoveChild(self, tag, *attrList, **kwargs):
@@ -1053,10 +1588,18 @@ class XMLElement:
         Each element of the returned list is an instance of the XMLElement
         class.
         """
+        self._xmlModified()
+        index = self._xmlIndex()
+        journal = self._xmlJournal()
         childNodeList = []
         while self.el.hasChildNodes():
+            if index is not None:
+                index.removeSubtree(self.el.firstChild)
+            if journal is not None:
+                journal.recordRemove(self.el.firstChild)
             oldChild = self.el.removeChild(self.el.firstChild)
-            oldChild.unlink()
+            if journal is None:
+                oldChild.unlink()
 
 
     def xmlNormalizeWhitespace(self, text):
@@ -1180,6 +1723,8 @@ class XMLDocument(XMLElement):
         if isinstance(node, XMLElement):
             node = node.el
 
+        self._xmlModified()
+
         for n in node.childNodes:
             if n.nodeType == Node.TEXT_NODE:
                 if node.tagName[-7:] != 'formula':
@@ -1211,6 +1756,8 @@ class XMLDocument(XMLElement):
         if isinstance(node, XMLElement):
             node = node.el
 
+        self._xmlModified()
+
         elementNode = 0
         for n in node.childNodes:
             if n.nodeType == Node.ELEMENT_NODE:
@@ -1230,6 +1777,137 @@ class XMLDocument(XMLElement):
                     while n.data[-1] in (" ", "\n", "\t"):
                         n.data = n.data[:-1]
 
+
+    def __xmlEscape(self, data, attr=False):
+        """
+        Escape text as written by the minidom serializer, after the
+        normalization which applies when it is parsed.
+        """
+        data = data.replace('\r\n', '\n').replace('\r', '\n')
+        data = data.replace('&', '&amp;').replace('<', '&lt;')
+        data = data.replace('>', '&gt;')
+        if attr:
+            data = data.replace('"', '&quot;')
+            if _xml_ws_in_attr:
+                data = data.replace('\n', '&#10;').replace('\t', '&#9;')
+            else:
+                data = data.replace('\n', ' ').replace('\t', ' ')
+        elif _xml_quot_in_text:
+            data = data.replace('"', '&quot;')
+        return data
+
+
+    def __xmlWriteComment(self, writer, node):
+        """
+        Write a comment node for xmlWriteIO.
+        """
+        if '--' in node.data:
+            raise ValueError("'--' is not allowed in a comment node")
+        data = node.data.replace('\r\n', '\n').replace('\r', '\n')
+        writer.write('<!--' + data + '-->')
+
+
+    def __xmlWriteElement(self, writer, node, indent):
+        """
+        Write an element node for xmlWriteIO. Text nodes are those of the
+        pretty-printed document, cleaned as by xmlCleanHighLevelBlank.
+        """
+        tag = node.tagName
+        writer.write('<' + tag)
+        a_names = list(node.attributes.keys())
+        if sys.version_info < (3, 8):
+            a_names.sort()
+        for a_name in a_names:
+            writer.write(' ' + a_name + '="'
+                         + self.__xmlEscape(node.getAttribute(a_name), True)
+                         + '"')
+
+        # Children and text runs, as parsed from the pretty-printed node
+
+        items = []
+        children = node.childNodes
+        has_elements = False
+        if len(children) == 1 and children[0].nodeType == Node.TEXT_NODE:
+            if children[0].data:
+                items.append(children[0].data)
+        elif children:
+            sub_indent = indent + '  '
+            run = '\n'
+            for n in children:
+                if n.nodeType == Node.TEXT_NODE:
+                    run += sub_indent + n.data + '\n'
+                elif n.nodeType in (Node.ELEMENT_NODE, Node.COMMENT_NODE):
+                    items.append(run + sub_indent)
+                    items.append(n)
+                    run = '\n'
+                    if n.nodeType == Node.ELEMENT_NODE:
+                        has_elements = True
+                else:
+                    raise ValueError('Unhandled node type')
+            items.append(run + indent)
+
+        # Cleaning of text runs
+
+        formula = 'formula' in tag and 'dirichlet_formula' not in tag
+        if formula or not has_elements:
+            cleaned = []
+            for item in items:
+                if not isinstance(item, str):
+                    cleaned.append(item)
+                    continue
+                item = item.replace('\r\n', '\n').replace('\r', '\n')
+                if formula:
+                    item = item.strip(' \n\t')
+                    if not item:
+                        raise ValueError('Blank text in formula node')
+                elif tag[-7:] != 'formula':
+                    item = self.xmlNormalizeWhitespace(item)
+                else:
+                    item = item.strip(' \n\t')
+                if item:
+                    cleaned.append(item)
+            items = cleaned
+
+        if not items:
+            writer.write('/>')
+            return
+
+        writer.write('>')
+        for item in items:
+            if isinstance(item, str):
+                writer.write(self.__xmlEscape(item))
+            elif item.nodeType == Node.ELEMENT_NODE:
+                self.__xmlWriteElement(writer, item, indent + '  ')
+            else:
+                self.__xmlWriteComment(writer, item)
+        writer.write('</' + tag + '>')
+
+
+    def xmlWriteIO(self, writer):
+        """
+        Write the document to a file-like object in a single pass, as
+        it is saved: identical to the pretty-printed document, parsed
+        again and cleaned with xmlCleanHighLevelBlank. Return False if
+        the document contains nodes which are not handled, in which case
+        the output is incomplete.
+        """
+        if sys.version[0] == '2':
+            return False
+
+        try:
+            writer.write('<?xml version="1.0" encoding="utf-8"?>')
+            for n in self.doc.childNodes:
+                if n.nodeType == Node.ELEMENT_NODE:
+                    self.__xmlWriteElement(writer, n, '')
+                elif n.nodeType == Node.COMMENT_NODE:
+                    self.__xmlWriteComment(writer, n)
+                else:
+                    return False
+        except ValueError:
+            return False
+
+        return True
+
 #-------------------------------------------------------------------------------
 # XML utility functions
 #-------------------------------------------------------------------------------
@@ -1240,10 +1918,15 @@ class Case(Dico, XMLDocument):
                  package=None,
                  file_name="",
                  module=None,
-                 studymanager=False):
+                 studymanager=False,
+                 indexed=False):
         """
         Instantiate a new dico and a new xml doc
         """
+        self.xml_index = None
+        self.xml_journal = None
+        self.xml_generation = 0
+
         Dico.__init__(self)
         XMLDocument.__init__(self, case=self)
 
@@ -1278,7 +1961,69 @@ class Case(Dico, XMLDocument):
         self.record_local = False
         self.record_global = True
         self.xml_prev = ""
-        self.xml_saved = self.toString()
+        self.xml_hash = None
+        self.xml_hash_generation = None
+        self.xml_saved_hash = self.__xmlHash(self.toString())
+        self.xml_saved_generation = None
+
+        if indexed:
+            self.xmlIndexEnable()
+
+
+    def xmlIndexEnable(self):
+        """
+        Build an index of the document nodes by tag and attribute values,
+        so that node queries do not need to scan the whole tree.
+        """
+        self.xml_index = XMLIndex(self.doc)
+
+
+    def xmlIndexDisable(self):
+        """
+        Drop the index of the document nodes.
+        """
+        self.xml_index = None
+
+
+    def xmlJournalEnable(self, max_size=16*1024*1024):
+        """
+        Record the modifications of the document in a journal,
+        for undo/redo.
+        """
+        self.xml_journal = XMLJournal(self.doc, max_size)
+
+
+    def xmlJournalDisable(self):
+        """
+        Drop the journal of the document modifications.
+        """
+        self.xml_journal = None
+
+
+    def parse(self, d):
+        """
+        return a xml doc from a file
+        """
+        XMLDocument.parse(self, d)
+        self.xml_generation += 1
+        if self.xml_index is not None:
+            self.xmlIndexEnable()
+        if self.xml_journal is not None:
+            self.xmlJournalEnable(self.xml_journal.max_size)
+        return self
+
+
+    def parseString(self, d):
+        """
+        return a xml doc from a string
+        """
+        XMLDocument.parseString(self, d)
+        self.xml_generation += 1
+        if self.xml_index is not None:
+            self.xmlIndexEnable()
+        if self.xml_journal is not None:
+            self.xmlJournalEnable(self.xml_journal.max_size)
+        return self
 
 
     def module_name(self):
@@ -1297,14 +2042,32 @@ class Case(Dico, XMLDocument):
         return self.doc.documentElement
 
 
+    def __xmlHash(self, s):
+        """
+        Return the hash of a document string.
+        """
+        if not isinstance(s, bytes):
+            s = s.encode('utf-8')
+        return hashlib.sha1(s).hexdigest()
+
+
     def isModified(self):
         """
         Return True if the xml doc is modified.
+        The document is serialized and hashed only if it was modified
+        since the last call (or save).
         """
         # return self['saved'] == "no"
 
-        s = self.toIOString()
-        if s == self.xml_saved:
+        if self.xml_generation == self.xml_saved_generation:
+            return False
+
+        if self.xml_hash_generation != self.xml_generation:
+            self.xml_hash = self.__xmlHash(self.toIOString())
+            self.xml_hash_generation = self.xml_generation
+
+        if self.xml_hash == self.xml_saved_hash:
+            self.xml_saved_generation = self.xml_generation
             return False
         else:
             return True
@@ -1334,6 +2097,10 @@ class Case(Dico, XMLDocument):
         """
         Transform to string for IO.
         """
+        f = io.StringIO()
+        if self.xmlWriteIO(f):
+            return f.getvalue()
+
         d = XMLDocument().parseString(self.toPrettyString())
         d.xmlCleanHighLevelBlank(d.root())
         return d.toString()
@@ -1343,24 +2110,48 @@ class Case(Dico, XMLDocument):
         """
         This method writes the associated xml file.
         See saveCase and saveCaseAs methods in the Main module.
+        The file is written to a temporary file first, then renamed,
+        so that it is never left incomplete.
         """
+        file_name = self['xmlfile']
+        tmp_name = os.path.join(os.path.dirname(file_name),
+                                '.' + os.path.basename(file_name)
+                                + '.' + str(os.getpid()))
         try:
+            file = open(tmp_name, 'w')
+            written = False
             if prettyString:
-                d = XMLDocument().parseString(self.toPrettyString())
+                writer = _xmlHashWriter(file)
+                written = self.xmlWriteIO(writer)
+            if written:
+                self.xml_saved_hash = writer.hexdigest()
             else:
-                d = self
-            d.xmlCleanHighLevelBlank(d.root())
-            s = d.toString()
-            file = open(self['xmlfile'], 'w')
-            file.write(s)
+                file.seek(0)
+                file.truncate()
+                if prettyString:
+                    d = XMLDocument().parseString(self.toPrettyString())
+                else:
+                    d = self
+                d.xmlCleanHighLevelBlank(d.root())
+                s = d.toString()
+                file.write(s)
+                self.xml_saved_hash = self.__xmlHash(s)
+                d.doc.unlink()
             file.close()
-            self.xml_saved = s
+            if os.path.isfile(file_name):
+                shutil.copymode(file_name, tmp_name)
+            getattr(os, 'replace', os.rename)(tmp_name, file_name)
+            self.xml_saved_generation = None
+            if prettyString:
+                self.xml_saved_generation = self.xml_generation
             self['saved'] = "yes"
-            d.doc.unlink()
         except IOError as e:
             msg = "Error: unable to save the XML document file."
             print(msg)
             print("I/O error({0}): {1}".format(e.errno, e.strerror))
+        finally:
+            if os.path.isfile(tmp_name):
+                os.remove(tmp_name)
 
 
     def pythonSaveDocument(self):
@@ -1923,6 +2714,150 @@ class XMLengineTestCase(unittest.TestCase):
                'Could not use the xmlSaveDocument method'
 
 
+    def checkXmlIndex(self):
+        """Check whether indexed queries give the same results as scans."""
+        case = Case(indexed=True)
+        case.parseString(u'<root><zones>'\
+                         u'<zone label="z1" nature="wall"><b v="1"/></zone>'\
+                         u'<zone label="z2" nature="inlet"><b/></zone>'\
+                         u'</zones><b v="1"/></root>')
+        ref = Case()
+        ref.parseString(case.toString())
+
+        def check(c, r):
+            for args, kwargs in ((('zone',), {}),
+                                 (('zone', 'nature'), {}),
+                                 (('zone',), {'nature':'wall'}),
+                                 (('zone', 'label'), {'nature':'outlet'}),
+                                 (('b',), {'v':'1'}),
+                                 (('b',), {'v':''})):
+                l1 = [n.toString() for n in c.xmlGetNodeList(*args, **kwargs)]
+                l2 = [n.toString() for n in r.xmlGetNodeList(*args, **kwargs)]
+                assert l1 == l2, 'Could not use the XMLIndex class'
+                n1 = c.xmlGetNode('zones')
+                n2 = r.xmlGetNode('zones')
+                l1 = [n.toString() for n in n1.xmlGetChildNodeList(*args, **kwargs)]
+                l2 = [n.toString() for n in n2.xmlGetChildNodeList(*args, **kwargs)]
+                assert l1 == l2, 'Could not use the XMLIndex class'
+
+        check(case, ref)
+
+        for c in (case, ref):
+            n = c.xmlGetNode('zones')
+            n.xmlInitChildNode('zone', label='z0')['nature'] = 'outlet'
+            n.xmlGetChildNode('zone', label='z1')['nature'] = 'symmetry'
+            n.xmlGetChildNode('zone', label='z2').xmlRemoveNode()
+            n.xmlGetChildNode('zone', label='z0').xmlDelAttribute('label')
+            z = n.xmlGetChildNode('zone', label='z1')
+            n.xmlAddChild('zone', nature='wall').xmlChildsCopy(z)
+        check(case, ref)
+
+        case.xmlGetNode('zones').xmlRemoveChildren()
+        ref.xmlGetNode('zones').xmlRemoveChildren()
+        check(case, ref)
+
+
+    def checkXmlJournal(self):
+        """Check whether journal steps are reverted and applied again."""
+        case = Case(indexed=True)
+        case.parseString(u'<root><zones>'\
+                         u'<zone label="z1" nature="wall"><b v="1"/></zone>'\
+                         u'<zone label="z2" nature="inlet">text</zone>'\
+                         u'</zones></root>')
+        case.xmlJournalEnable()
+        journal = case.xml_journal
+
+        states = [case.toString()]
+        steps = []
+
+        n = case.xmlGetNode('zones')
+        steps.append(journal.newStep())
+        n.xmlInitChildNode('zone', label='z0')['nature'] = 'outlet'
+        n.xmlGetChildNode('zone', label='z1')['nature'] = 'symmetry'
+        n.xmlGetChildNode('zone', label='z2').xmlSetTextNode('new text')
+        states.append(case.toString())
+
+        steps.append(journal.newStep())
+        n.xmlGetChildNode('zone', label='z2').xmlRemoveNode()
+        n.xmlGetChildNode('zone', label='z0').xmlDelAttribute('label')
+        z = n.xmlGetChildNode('zone', label='z1')
+        n.xmlAddChild('zone', nature='wall').xmlChildsCopy(z)
+        states.append(case.toString())
+
+        steps.append(journal.newStep())
+        z.xmlRemoveChildren()
+        z.xmlSetData('c', 2.5)
+        states.append(case.toString())
+
+        for i in range(len(steps)-1, -1, -1):
+            journal.revert(steps[i], case.xml_index)
+            assert case.toString() == states[i], \
+                'Could not revert a step of the XMLJournal class'
+        for i in range(len(steps)):
+            journal.apply(steps[i], case.xml_index)
+            assert case.toString() == states[i+1], \
+                'Could not apply a step of the XMLJournal class'
+
+        ref = Case(indexed=True)
+        ref.parseString(case.toString())
+        for args, kwargs in ((('zone',), {}),
+                             (('zone',), {'nature':'wall'}),
+                             (('b',), {'v':'1'}),
+                             (('c',), {})):
+            l1 = [n.toString() for n in case.xmlGetNodeList(*args, **kwargs)]
+            l2 = [n.toString() for n in ref.xmlGetNodeList(*args, **kwargs)]
+            assert l1 == l2, 'Could not update the index with the XMLJournal class'
+
+
+    def checkXmlWriteIO(self):
+        """Check whether the document is written as pretty-printed and cleaned."""
+        case = Case()
+        case.parseString(u'<root><zones><!-- c -->'\
+                         u'<zone label="z1" nature="wall"> a  b\n</zone>'\
+                         u'<formula>\n  x = 1;\n  y = 2;  </formula>'\
+                         u'<dirichlet_formula> z = 3; </dirichlet_formula>'\
+                         u'<b v="1&amp;2">x</b> <c/>text'\
+                         u'</zones></root>')
+        d = XMLDocument().parseString(case.toPrettyString())
+        d.xmlCleanHighLevelBlank(d.root())
+        f = io.StringIO()
+        assert case.xmlWriteIO(f), 'Could not write the document in one pass'
+        assert f.getvalue() == d.toString(), \
+            'Could not write the document as pretty-printed and cleaned'
+
+
+    def checkIsModified(self):
+        """Check whether modifications of the case are detected."""
+        fd, file_name = tempfile.mkstemp(suffix='.xml')
+        os.close(fd)
+        try:
+            case = Case()
+            case.parseString(u'<root><zones><zone label="z1"/></zones></root>')
+            case['xmlfile'] = file_name
+            case.xmlSaveDocument()
+            assert not case.isModified(), \
+                'Could not detect an unmodified case'
+
+            n = case.xmlGetNode('zone', label='z1')
+            n['nature'] = 'wall'
+            assert case.isModified(), 'Could not detect an attribute change'
+            assert case.isModified(), 'Could not detect an attribute change'
+
+            n.xmlDelAttribute('nature')
+            assert not case.isModified(), \
+                'Could not detect a case back to its saved state'
+
+            n.xmlInitChildNode('b').xmlSetTextNode('text')
+            assert case.isModified(), 'Could not detect a node addition'
+            case.xmlSaveDocument()
+            assert not case.isModified(), 'Could not detect a saved case'
+
+            case.xmlGetNode('b').xmlRemoveNode()
+            assert case.isModified(), 'Could not detect a node removal'
+        finally:
+            os.remove(file_name)
+
+
 ##    def checkFailUnless(self):
 ##        """Test"""
 ##        self.failUnless(1==1, "One should be one.")
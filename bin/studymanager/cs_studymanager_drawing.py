@@ -27,6 +27,7 @@
 #-------------------------------------------------------------------------------
 
 import os, sys, string, logging
+import hashlib, json
 from string import *
 
 #-------------------------------------------------------------------------------
@@ -41,6 +42,8 @@ except ImportError:
 
 matplotlib.use("Agg")
 
+import numpy
+
 #-------------------------------------------------------------------------------
 # matplotlib config
 #-------------------------------------------------------------------------------
@@ -82,6 +85,91 @@ log = logging.getLogger(__file__)
 log.setLevel(logging.NOTSET)
 #log.setLevel(logging.DEBUG)
 
+#===============================================================================
+# Data files loader
+#===============================================================================
+
+# Parsed data files, indexed by path: (mtime, size, data, first row number)
+_data_files = {}
+
+def load_data_file(file_name):
+    """
+    Parse a data file (columns separated by whitespace or ", ", lines
+    beginning with '#' ignored, optional header line) into a 2D array,
+    with one row per line. Files are parsed only once, unless they
+    have been modified in between.
+    Return the array and the number of the first data row (2 if a header
+    was skipped, 1 otherwise), used when there is no abscissa column.
+    """
+    key = os.path.abspath(file_name)
+    st = os.stat(key)
+
+    d = _data_files.get(key)
+    if d and d[0] == st.st_mtime and d[1] == st.st_size:
+        return d[2], d[3]
+
+    rows = []
+    first_row = 1
+
+    f = open(key, 'r')
+    for line in f:
+        line = line.lstrip()
+        if line and line[0] != '#':
+            rows.append(line.replace(", ", " ").split())
+    f.close()
+
+    # for CSV files, try to detect a header to skip it
+    if rows:
+        try:
+            float(rows[0][0])
+        except ValueError:
+            rows = rows[1:]
+            first_row = 2
+
+    n_cols = 0
+    for r in rows:
+        n_cols = max(n_cols, len(r))
+
+    try:
+        data = numpy.array(rows, dtype=float)
+        if data.ndim != 2:
+            raise ValueError
+    except ValueError:
+        # ragged or non-numeric lines: pad with NaN
+        data = numpy.full((len(rows), n_cols), numpy.nan)
+        for i, r in enumerate(rows):
+            for j, v in enumerate(r):
+                try:
+                    data[i, j] = float(v)
+                except ValueError:
+                    pass
+
+    if len(rows) == 0:
+        data = numpy.empty((0, 0))
+
+    _data_files[key] = (st.st_mtime, st.st_size, data, first_row)
+
+    return data, first_row
+
+#-------------------------------------------------------------------------------
+
+def clear_data_files():
+    """
+    Release parsed data files.
+    """
+    _data_files.clear()
+
+#-------------------------------------------------------------------------------
+
+def data_column(data, col):
+    """
+    Return a column (numbered from 1) of an array built by load_data_file.
+    """
+    if data.shape[0] == 0:
+        return numpy.empty(0)
+
+    return data[:, col-1]
+
 #===============================================================================
 # Plot class
 #===============================================================================
@@ -104,9 +192,15 @@ class Plot(object):
         self.ismesure = False
         self.cmd      = []
 
-        # Open file of data
+        # Data file and definition of the curve (used to check
+        # whether a figure needs to be rendered again)
+
+        self.file_name = file
+        self.definition = repr(sorted(parser.getAttributes(node).items()))
+
+        # Load data (shared by all curves of a given file)
 
-        self.f = open(file, 'r')
+        self.data, self.first_row = load_data_file(file)
 
         # Read mandatory attributes
         self.subplots = [int(s) for s in parser.getAttribute(node,"spids").split()]
@@ -144,16 +238,12 @@ class Plot(object):
         except:
             yerrp = None
 
-        self.f.close()
-
         # Error Bar
-        self.f = open(file, 'r')
         self.xerr = self.uploadErrorBar(xerr, xerrp, xcol)
-        self.f.close()
-
-        self.f = open(file, 'r')
         self.yerr = self.uploadErrorBar(yerr, yerrp, ycol)
-        self.f.close()
+
+        # Only extracted data is kept (curves are sent to other processes)
+        self.data = None
 
         # List of additional matplotlib commands
         for k, v in parser.getAttributes(node).items():
@@ -180,37 +270,22 @@ class Plot(object):
 
     def uploadData(self, xcol, ycol, xplus, xscale, yplus, yscale):
         """
-        Upload and parse data
+        Extract data from the loaded file
         """
-        j = 0
-
-        for line in self.f.readlines():
-            line = line.lstrip()
-            if line and line[0] != '#':
-                j += 1
-                line = line.replace(", ", " ") # compatibility with CSV
-                line = line.lstrip()
-
-                # for CSV files, try to detect a header to skip it
-                if j == 1:
-                    try:
-                        val = float(line.split()[0])
-                    # if it can not be converted to float
-                    except ValueError as not_float:
-                        continue
-
-                if xcol:
-                    self.xspan.append(float(line.split()[xcol-1])*xscale + xplus)
-                else:
-                    self.xspan.append(j)
-
-                self.yspan.append(float(line.split()[ycol-1])*yscale + yplus)
+        n_rows = self.data.shape[0]
+
+        if xcol:
+            self.xspan = (data_column(self.data, xcol)*xscale + xplus).tolist()
+        else:
+            self.xspan = list(range(self.first_row, self.first_row + n_rows))
+
+        self.yspan = (data_column(self.data, ycol)*yscale + yplus).tolist()
 
     #---------------------------------------------------------------------------
 
     def uploadErrorBar(self, errorbar, errorp, col):
         """
-        load and parse data for Measurement uncertainty
+        Extract data for Measurement uncertainty
         """
         if errorbar == None and errorp == None:
             return None
@@ -222,40 +297,12 @@ class Plot(object):
                       "The error definition by percentage will be ignored.")
 
             if len(errorbar) == 2:
-                error = [ [], [] ]
-                j = 0
-                for line in self.f.readlines():
-                    line = line.lstrip()
-                    if line and line[0] != '#':
-                        j += 1
-                        line = line.replace(", ", " ") # compatibility with CSV
-                        line = line.lstrip()
-                        # for CSV files, try to detect a header to skip it
-                        if j == 1:
-                            try:
-                                val = float(line.split()[0])
-                            except ValueError as not_float:
-                                continue
-                        error[0].append(float(line.split()[errorbar[0]-1]))
-                        error[1].append(float(line.split()[errorbar[1]-1]))
+                error = [data_column(self.data, errorbar[0]).tolist(),
+                         data_column(self.data, errorbar[1]).tolist()]
                 return error
 
             elif len(errorbar) == 1:
-                error = []
-                j = 0
-                for line in self.f.readlines():
-                    line = line.lstrip()
-                    if line and line[0] != '#':
-                        j += 1
-                        line = line.replace(", ", " ") # compatibility with CSV
-                        line = line.lstrip()
-                        # for CSV files, try to detect a header to skip it
-                        if j == 1:
-                            try:
-                                val = float(line.split()[0])
-                            except ValueError as not_float:
-                                continue
-                        error.append(float(line.split()[errorbar[0]-1]))
+                error = data_column(self.data, errorbar[0]).tolist()
                 return error
         elif errorp:
             if col == 0:
@@ -263,21 +310,7 @@ class Plot(object):
                       "unspecified data set (column number missing).\n")
                 sys.exit(1)
             else:
-                error = []
-                j = 0
-                for line in self.f.readlines():
-                    line = line.lstrip()
-                    if line and line[0] != '#':
-                        j += 1
-                        line = line.replace(", ", " ") # compatibility with CSV
-                        line = line.lstrip()
-                        # for CSV files, try to detect a header to skip it
-                        if j == 1:
-                            try:
-                                val = float(line.split()[0])
-                            except ValueError as not_float:
-                                continue
-                        error.append(errorp/100.*float(line.split()[col-1]))
+                error = (errorp/100.*data_column(self.data, col)).tolist()
                 return error
 
 #===============================================================================
@@ -303,17 +336,15 @@ class Probes(object):
         self.xerr     = None
         self.yerr     = None
 
-        xcol = 1
+        self.file_name = file_name
+        self.definition = repr(('probe', fig, ycol))
 
-        f = open(file_name, 'r')
+        xcol = 1
 
-        for line in f.readlines():
-            line = line.lstrip()
-            if line and line[0] != '#':
-                self.xspan.append(float(line.split()[xcol - 1]))
-                self.yspan.append(float(line.split()[ycol - 1]))
+        data, first_row = load_data_file(file_name)
 
-        f.close()
+        self.xspan = data_column(data, xcol).tolist()
+        self.yspan = data_column(data, ycol).tolist()
 
     #---------------------------------------------------------------------------
 
@@ -407,6 +438,15 @@ class Figure(object):
                 if p.id == id:
                     self.subplots.append(p)
 
+        self.definition = repr(sorted(parser.getAttributes(node).items()))
+        for p in self.subplots:
+            self.definition += repr((p.id, p.xlabel, p.ylabel, p.title,
+                                     p.legstatus, p.legpos, p.xlim, p.ylim,
+                                     p.cmd))
+            for curve in p.curves:
+                self.definition += repr((curve.definition, curve.fmt,
+                                         curve.ismesure, curve.cmd))
+
     #---------------------------------------------------------------------------
 
     def layout(self):
@@ -435,7 +475,7 @@ class Figure(object):
             rcParams['font.size'] = 4
             rcParams['lines.markersize']= 1
             nbrow = 5
-            nbcol = (nbr-1)/nbrow+1
+            nbcol = (nbr-1)//nbrow+1
             hs=0.5
             if nbcol > 7:
                 hs = 1.0
@@ -450,7 +490,7 @@ class Figure(object):
             nbrow = 4
             rcParams['font.size'] = 5
             rcParams['lines.markersize'] = 2
-            nbcol = (nbr-1) / nbrow+1
+            nbcol = (nbr-1)//nbrow+1
             hs=0.45
             if nbcol > 5:
                 hs = 0.8
@@ -461,7 +501,7 @@ class Figure(object):
             ws = 0.99
         elif nbr > 6:
             nbrow = 3
-            nbcol = (nbr-1) / nbrow+1
+            nbcol = (nbr-1)//nbrow+1
             rcParams['lines.markersize'] = 3
             rcParams['font.size'] = 6
             hs = 0.4
@@ -472,7 +512,7 @@ class Figure(object):
             ws = 0.8
         elif nbr > 2:
             nbrow = 2
-            nbcol = (nbr-1) / nbrow+1
+            nbcol = (nbr-1)//nbrow+1
             hs = 0.3
             if nbcol > 2:
               hs = 0.45
@@ -497,13 +537,17 @@ class Plotter(object):
     """
     Manager of the matplotlib commands.
     """
-    def __init__ (self, parser):
+    def __init__ (self, parser, n_procs=None):
         """
         Constructor of the plotter.
         @type parser: C{Parser} instance
         @param parser: parser of the xml file
+        @type n_procs: C{int}
+        @param n_procs: number of processes used to render figures
+                        (number of processors by default)
         """
         self.parser = parser
+        self.n_procs = n_procs
 
         # initialisation for each Study
         self.curves  = []
@@ -515,15 +559,8 @@ class Plotter(object):
         """
         Compute the number of column of the data file.
         """
-        nbr = 0
-        f = open(file_name, 'r')
-        for line in f.readlines():
-            line = line.lstrip()
-            if line and line[0] != '#':
-                nbr = len(line.split())
-                break
-        f.close()
-        return nbr
+        data, first_row = load_data_file(file_name)
+        return data.shape[1]
 
     #---------------------------------------------------------------------------
 
@@ -532,7 +569,7 @@ class Plotter(object):
         Method used to plot all plots from a I{study_label} (all cases).
         @type study_label: C{String}
         @param study_label: label of a study
-
+        Return the numbers of rendered and skipped figures.
         """
         # disable tex in Matplotlib (use Mathtext instead)
         rcParams['text.usetex'] = not disable_tex
@@ -633,193 +670,280 @@ class Plotter(object):
                                        subplots,
                                        default_fmt))
 
-        # create one figure and use it for all figures
-        # this figure is the current figure
-        fig = plt.figure()
+        post_dir = os.path.join(self.parser.getDestination(),
+                                study_label,
+                                "POST")
 
+        # store the name of the figures for the build of
+        # the detailed report without the png or pdf extension.
         for figure in self.figures:
-            # Plot curve
-            self.plot_figure(figure)
-
-            f = os.path.join(self.parser.getDestination(),
-                             study_label,
-                             "POST",
-                             figure.file_name)
-
-            # store the name of the figure for the build of
-            # the detailed report without the png or pdf extension.
+            f = os.path.join(post_dir, figure.file_name)
             study_object.matplotlib_figures.append(f)
 
-            # save the figure
-            self.__save(f, figure)
+        # data files are not needed anymore (curves store extracted data)
+        clear_data_files()
 
-        # close current figure
-        plt.close()
+        return self.render_figures(self.figures, post_dir, disable_tex)
 
     #---------------------------------------------------------------------------
 
-    def __draw_curve(self, ax, curve, p):
+    def render_figures(self, figures, post_dir, disable_tex):
         """
-        Draw a single curve.
+        Render figures in a given directory, using a pool of processes.
+        Figures are skipped when a hash of their definition and of their
+        data files is the same as when they were last rendered (hashes
+        being stored in the directory).
+        Return the numbers of rendered and skipped figures.
         """
+        from code_saturne import cs_cache
 
-        # data sets x and y
-        xspan = curve.xspan
-        yspan = curve.yspan
-
-        # data sets errors on x and y
-        xerr = curve.xerr
-        yerr = curve.yerr
-
-        # draw curve with error bars
-        if xerr or yerr:
-            lines = ax.errorbar(xspan, yspan,
-                                xerr=xerr,
-                                yerr=yerr,
-                                fmt=curve.fmt,
-                                label=curve.legend)
-        # draw curve only
-        else:
-            lines = ax.plot(xspan, yspan, curve.fmt, label=curve.legend)
+        hash_path = os.path.join(post_dir, ".figures_hash.json")
 
+        hashes = {}
+        try:
+            f = open(hash_path)
+            hashes = json.load(f)
+            f.close()
+        except Exception:
+            pass
+
+        files_hash = {}
+        new_hashes = {}
+        tasks = []
+
+        for figure in figures:
+            h = hashlib.sha1()
+            h.update(repr((matplotlib.__version__, disable_tex,
+                           figure.fmt, figure.definition)).encode('utf-8'))
+            for p in figure.subplots:
+                for curve in p.curves:
+                    k = curve.file_name
+                    if not k in files_hash:
+                        h_f = cs_cache.hash_files(hashlib.sha1(), [k])
+                        files_hash[k] = h_f.hexdigest()
+                    h.update(files_hash[k].encode('utf-8'))
+
+            f = os.path.join(post_dir, figure.file_name) + "." + figure.fmt
+            if hashes.get(f) == h.hexdigest() and os.path.isfile(f):
+                continue
+
+            new_hashes[f] = h.hexdigest()
+            tasks.append((figure, f, disable_tex))
+
+        n_procs = self.n_procs
+        if n_procs == None:
+            import multiprocessing
+            n_procs = multiprocessing.cpu_count()
+        n_procs = min(n_procs, len(tasks))
+
+        if n_procs > 1:
+            import multiprocessing
+            pool = multiprocessing.Pool(n_procs)
+            try:
+                pool.map(render_figure, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for t in tasks:
+                render_figure(t)
 
-        # additional matplotlib raw commands for line2D
-        line = lines[0]
-        for cmd in curve.cmd:
+        if new_hashes:
+            hashes.update(new_hashes)
             try:
-                exec(cmd)
-            except:
-                print("Error with the matplotlib command: %s" % cmd)
+                f = open(hash_path, 'w')
+                json.dump(hashes, f)
+                f.close()
+            except Exception:
+                pass
 
-    #---------------------------------------------------------------------------
+        return len(tasks), len(figures) - len(tasks)
 
-    def __draw_axis(self, ax, p):
-        if p.xlabel:
-            ax.set_xlabel(p.xlabel)
-        if p.ylabel:
-            ax.set_ylabel(p.ylabel)
-        if p.xlim:
-            ax.set_xlim((p.xlim[0], p.xlim[1]))
-        if p.ylim:
-            ax.set_ylim((p.ylim[0], p.ylim[1]))
+#===============================================================================
+# Figure rendering functions
+# (module level functions, so as to be run in separate processes)
+#===============================================================================
 
-    #---------------------------------------------------------------------------
+def draw_curve(ax, curve, p):
+    """
+    Draw a single curve.
+    """
 
-    def __draw_legend(self, ax, p, bool, hs, ws, ri, le):
-        if p.legstatus == "on":
-            handles, labels = ax.get_legend_handles_labels()
-
-            if p.legpos == None:
-                ax.legend(handles,
-                          labels,
-                          bbox_to_anchor=(1.02, 1),
-                          loc=2,
-                          borderaxespad=0.,
-                          markerscale=0.5)
-            else:
+    # data sets x and y
+    xspan = curve.xspan
+    yspan = curve.yspan
+
+    # data sets errors on x and y
+    xerr = curve.xerr
+    yerr = curve.yerr
+
+    # draw curve with error bars
+    if xerr or yerr:
+        lines = ax.errorbar(xspan, yspan,
+                            xerr=xerr,
+                            yerr=yerr,
+                            fmt=curve.fmt,
+                            label=curve.legend)
+    # draw curve only
+    else:
+        lines = ax.plot(xspan, yspan, curve.fmt, label=curve.legend)
+
+
+    # additional matplotlib raw commands for line2D
+    line = lines[0]
+    for cmd in curve.cmd:
+        try:
+            exec(cmd)
+        except:
+            print("Error with the matplotlib command: %s" % cmd)
+
+#-------------------------------------------------------------------------------
+
+def draw_axis(ax, p):
+    if p.xlabel:
+        ax.set_xlabel(p.xlabel)
+    if p.ylabel:
+        ax.set_ylabel(p.ylabel)
+    if p.xlim:
+        ax.set_xlim((p.xlim[0], p.xlim[1]))
+    if p.ylim:
+        ax.set_ylim((p.ylim[0], p.ylim[1]))
+
+#-------------------------------------------------------------------------------
+
+def draw_legend(ax, p, bool, hs, ws, ri, le):
+    if p.legstatus == "on":
+        handles, labels = ax.get_legend_handles_labels()
+
+        if p.legpos == None:
+            ax.legend(handles,
+                      labels,
+                      bbox_to_anchor=(1.02, 1),
+                      loc=2,
+                      borderaxespad=0.,
+                      markerscale=0.5)
+        else:
+            id_loc = 2
+            if   p.legpos[0] > 0.9 and p.legpos[1] > 0.9:
+                id_loc = 1
+            elif p.legpos[0] > 0.9 and p.legpos[1] < 0.1:
+                id_loc = 4
+            elif p.legpos[0] < 0.1 and p.legpos[1] < 0.1:
+                id_loc = 3
+            elif p.legpos[0] < 0.1 and p.legpos[1] > 0.9:
+                id_loc = 2
+            elif p.legpos[1] > 0.9:
                 id_loc = 2
-                if   p.legpos[0] > 0.9 and p.legpos[1] > 0.9:
-                    id_loc = 1
-                elif p.legpos[0] > 0.9 and p.legpos[1] < 0.1:
-                    id_loc = 4
-                elif p.legpos[0] < 0.1 and p.legpos[1] < 0.1:
-                    id_loc = 3
-                elif p.legpos[0] < 0.1 and p.legpos[1] > 0.9:
-                    id_loc = 2
-                elif p.legpos[1] > 0.9:
-                    id_loc = 2
-                elif p.legpos[1] < 0.1:
-                    id_loc = 3
-                elif p.legpos[0] > 0.9:
-                    id_loc = 4
-                elif p.legpos[0] < 0.1:
-                    id_loc = 3
-                ax.legend(handles,
-                          labels,
-                          bbox_to_anchor=(p.legpos[0], p.legpos[1]),
-                          loc=id_loc,
-                          borderaxespad=0.,
-                          markerscale=0.5)
-
-                if bool:
-                    ri2 = min(0.9, ri*1.1)
-                    le2 = max(0.125, le/1.1)
-                    ws2 = min(0.3, ws/1.8)
-                    plt.subplots_adjust(hspace=hs,
-                                        wspace=ws2,
-                                        right=ri2,
-                                        left=le2)
+            elif p.legpos[1] < 0.1:
+                id_loc = 3
+            elif p.legpos[0] > 0.9:
+                id_loc = 4
+            elif p.legpos[0] < 0.1:
+                id_loc = 3
+            ax.legend(handles,
+                      labels,
+                      bbox_to_anchor=(p.legpos[0], p.legpos[1]),
+                      loc=id_loc,
+                      borderaxespad=0.,
+                      markerscale=0.5)
+
+            if bool:
+                ri2 = min(0.9, ri*1.1)
+                le2 = max(0.125, le/1.1)
+                ws2 = min(0.3, ws/1.8)
+                ax.figure.subplots_adjust(hspace=hs,
+                                          wspace=ws2,
+                                          right=ri2,
+                                          left=le2)
 
-    #---------------------------------------------------------------------------
+#-------------------------------------------------------------------------------
 
-    def plot_figure(self, figure):
-        """
-        Plotter of a single figure with several subplots.
-        """
+def draw_figure(fig, figure):
+    """
+    Draw a single figure with several subplots on a matplotlib figure.
+    Raw matplotlib commands (from the studymanager file) may use
+    the pyplot interface, so the current axes are set before they
+    are executed.
+    """
 
-        # clears the entire current figure
-        plt.clf()
+    # set size
+    if figure.figsize:
+        fig.set_size_inches(figure.figsize)
 
-        # get current figure and set size
-        if figure.figsize:
-            fig = plt.gcf()
-            fig.set_size_inches(figure.figsize)
+    # Layout
+    nbrow, nbcol, hs, ri, le, ws = figure.layout()
+    log.debug("draw_figure --> layout: nbcol: %s nbrow: %s " % (nbcol, nbrow))
+    fig.subplots_adjust(hspace=hs, wspace=ws, right=ri, left=le, bottom=0.2)
 
-        # Layout
-        nbrow, nbcol, hs, ri, le, ws = figure.layout()
-        log.debug("plot_figure --> layout: nbcol: %s nbrow: %s " % (nbcol, nbrow))
-        plt.subplots_adjust(hspace=hs, wspace=ws, right=ri, left=le, bottom=0.2)
+    # draw curves in the right subplot
+    axes = []
+    for idx, p in enumerate(figure.subplots):
+        log.debug("draw_figure --> plot draw: id = %s" % p.id)
+        ax = fig.add_subplot(nbrow, nbcol, idx + 1)
+        axes.append(ax)
+        plt.sca(ax)
 
-        # draw curves in the right subplot
-        for p in figure.subplots:
-            idx = figure.subplots.index(p)
-            log.debug("plot_figure --> plot draw: id = %s" % p.id)
-            ax = plt.subplot(nbrow, nbcol, idx + 1)
+        for curve in p.curves:
+            draw_curve(ax, curve, p)
 
-            for curve in p.curves:
-                self.__draw_curve(ax, curve, p)
+    # title of subplot, axis and legend
+    bool = len(figure.subplots) > 1
 
-        # title of subplot, axis and legend
-        bool = len(figure.subplots) > 1
+    for ax, p in zip(axes, figure.subplots):
+        if p.title:
+            ax.set_title(p.title)
 
-        for p in figure.subplots:
-            idx = figure.subplots.index(p)
-            ax = plt.subplot(nbrow, nbcol, idx + 1)
+        draw_axis(ax, p)
 
-            if p.title:
-                ax.set_title(p.title)
+        if len(p.curves) > 0:
+            draw_legend(ax, p, bool, hs, ws, ri, le)
 
-            self.__draw_axis(ax, p)
+    # title of the figure
+    if figure.title:
+        fig.suptitle(figure.title, fontsize=12)
 
-            if len(p.curves) > 0:
-                self.__draw_legend(ax, p, bool, hs, ws, ri, le)
+    # additional matplotlib raw commands for subplot
+    for ax, p in zip(axes, figure.subplots):
+        plt.sca(ax)
+        for cmd in p.cmd:
+            try:
+                exec(cmd)
+            except:
+                print("Error with the matplotlib command: %s" % cmd)
 
-        # title of the figure
-        if figure.title:
-           plt.suptitle(figure.title, fontsize=12)
+#-------------------------------------------------------------------------------
 
-        # additional matplotlib raw commands for subplot
-        for p in figure.subplots:
-            idx = figure.subplots.index(p)
-            ax = plt.subplot(nbrow, nbcol, idx + 1)
-            for cmd in p.cmd:
-                try:
-                    exec(cmd)
-                except:
-                    print("Error with the matplotlib command: %s" % cmd)
+def save_figure(fig, f, figure):
+    """method used to save the figure"""
+    fmt = figure.fmt
+    if fmt == "png":
+        dpi = 800
+        if figure.dpi:
+            dpi = figure.dpi
+        fig.savefig(f, format=fmt, dpi=dpi)
+    else:
+        fig.savefig(f, format=fmt)
 
-    #---------------------------------------------------------------------------
+#-------------------------------------------------------------------------------
 
-    def __save(self, f, figure):
-        """method used to save the figure"""
-        fmt = figure.fmt
-        f = f + "." + fmt
-        if fmt == "png":
-            dpi = 800
-            if figure.dpi:
-                dpi = figure.dpi
-            plt.savefig(f, format=fmt, dpi=dpi)
-        else:
-            plt.savefig(f, format=fmt)
+def render_figure(args):
+    """
+    Render a figure to a file, given a (figure, file name, disable_tex)
+    tuple. Each figure is drawn on its own matplotlib figure object.
+    """
+    figure, f, disable_tex = args
+
+    # settings changed by the layout only apply to the current figure
+    with matplotlib.rc_context():
+
+        # disable tex in Matplotlib (use Mathtext instead)
+        rcParams['text.usetex'] = not disable_tex
+
+        fig = plt.figure()
+        try:
+            draw_figure(fig, figure)
+            save_figure(fig, f, figure)
+        finally:
+            plt.close(fig)
 
 #-------------------------------------------------------------------------------
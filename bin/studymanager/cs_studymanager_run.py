@@ -51,9 +51,10 @@ log.setLevel(logging.NOTSET)
 
 #-------------------------------------------------------------------------------
 
-def run_studymanager_command(_c, _log, pythondir = None):
+def run_studymanager_command(_c, _log, pythondir = None, cwd = None):
     """
-    Run command with arguments.
+    Run command with arguments, in the current directory or
+    in a given directory.
     Redirection of the stdout or stderr of the command.
     """
     assert type(_c) == str or type(_c) == unicode
@@ -65,11 +66,14 @@ def run_studymanager_command(_c, _log, pythondir = None):
     except:
         _log.seek(0, 2)
 
+    if cwd == None:
+        cwd = os.getcwd()
+
     def __text(_t):
         return "\n\nExecution failed --> %s: %s" \
                 "\n - command: %s"                \
                 "\n - directory: %s\n\n" %        \
-                (_t, str(retcode), _c, os.getcwd())
+                (_t, str(retcode), _c, cwd)
 
     _l = ""
 
@@ -84,7 +88,7 @@ def run_studymanager_command(_c, _log, pythondir = None):
 
     try:
         t1 = time.time()
-        retcode = run_command(cmd, stdout=_log, stderr=_log, env=env)
+        retcode = run_command(cmd, stdout=_log, stderr=_log, env=env, cwd=cwd)
         t2 = time.time()
 
         if retcode < 0:
@@ -34,12 +34,24 @@ import string
 import time
 import logging
 import fnmatch
+import tempfile
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue  # Python2
+
+try:
+    from StringIO import StringIO  # Python2
+except ImportError:
+    from io import StringIO
 
 #-------------------------------------------------------------------------------
 # Application modules import
 #-------------------------------------------------------------------------------
 
 from code_saturne.cs_exec_environment import get_shell_type, enquote_arg
+from code_saturne.cs_exec_environment import get_available_cores
 from code_saturne.cs_compile import files_to_compile, compile_and_link
 from code_saturne import cs_create
 from code_saturne.cs_create import set_executable
@@ -442,7 +454,7 @@ class Case(object):
 
     #---------------------------------------------------------------------------
 
-    def __suggest_run_id(self):
+    def __suggest_run_id(self, cwd=None):
 
         cmd = enquote_arg(os.path.join(self.pkg.get_dir('bindir'), self.exe)) + " run --suggest-id"
         if self.subdomains:
@@ -452,7 +464,8 @@ class Case(object):
                              executable=get_shell_type(),
                              stdout=subprocess.PIPE,
                              stderr=subprocess.PIPE,
-                             universal_newlines=True)
+                             universal_newlines=True,
+                             cwd=cwd)
         i = p.communicate()[0]
         run_id = " ".join(i.split())
 
@@ -512,17 +525,56 @@ class Case(object):
 
     #---------------------------------------------------------------------------
 
-    def run(self):
+    def __scripts_dir(self):
         """
-        Check if a run with same result subdirectory name exists
-        and launch run if not.
+        Return the directory from which the case is launched.
         """
-        home = os.getcwd()
         if self.subdomains:
-            os.chdir(os.path.join(self.__dest, self.label))
+            return os.path.join(self.__dest, self.label)
         else:
-            os.chdir(os.path.join(self.__dest, self.label, 'SCRIPTS'))
+            return os.path.join(self.__dest, self.label, 'SCRIPTS')
+
+    #---------------------------------------------------------------------------
+
+    def get_n_procs(self):
+        """
+        Return the number of processor cores used by a run of the case,
+        based on the requested number of processes and threads per process.
+        """
+        n_procs = self.__data['n_procs']
+        n_threads = None
 
+        scripts_repo = os.path.join(self.__repo, self.label)
+        if not self.subdomains:
+            scripts_repo = os.path.join(scripts_repo, "SCRIPTS")
+
+        for path in (os.path.join(scripts_repo, "runcase"),
+                     os.path.join(scripts_repo, "runcase.bat")):
+            if os.path.isfile(path):
+                runcase = cs_runcase.runcase(path, create_if_missing=False)
+                if not n_procs:
+                    n_procs = runcase.get_nprocs()
+                n_threads = runcase.get_nthreads()
+                break
+
+        n_cores = 1
+        for n in (n_procs, n_threads):
+            try:
+                n_cores *= max(int(n), 1)
+            except Exception:
+                pass
+
+        return n_cores
+
+    #---------------------------------------------------------------------------
+
+    def prepare_run(self):
+        """
+        Check if a run with same result subdirectory name exists
+        and update the launcher if not.
+        Return None if the run must be launched, or the error status
+        of the existing run.
+        """
         if self.run_id:
             run_id = self.run_id
             run_dir = os.path.join(self.__dest, self.label, self.resu, run_id)
@@ -534,41 +586,79 @@ class Case(object):
                 else:
                     self.is_run = "OK"
                     error = 0
-                os.chdir(home)
 
                 return error
 
         else:
-            run_id, run_dir = self.__suggest_run_id()
+            scripts_dir = self.__scripts_dir()
+            run_id, run_dir = self.__suggest_run_id(scripts_dir)
 
             while os.path.isdir(run_dir):
-                run_id, run_dir = self.__suggest_run_id()
+                run_id, run_dir = self.__suggest_run_id(scripts_dir)
 
         self.run_id  = run_id
         self.run_dir = run_dir
 
         self.__updateRuncase(run_id)
 
+        return None
+
+    #---------------------------------------------------------------------------
+
+    def launch(self, log=None):
+        """
+        Launch a run prepared by prepare_run. Outputs of the run are
+        redirected to the given log (the studymanager log by default).
+        This does not change the working directory, so several cases
+        may be launched at the same time from different threads.
+        """
+        if log == None:
+            log = self.__log
+
+        scripts_dir = self.__scripts_dir()
+
         if sys.platform.startswith('win'):
-            error, self.is_time = run_studymanager_command("runcase.bat", self.__log)
+            cmd = enquote_arg(os.path.join(scripts_dir, "runcase.bat"))
         else:
-            error, self.is_time = run_studymanager_command("./runcase", self.__log)
+            cmd = "./runcase"
+
+        error, self.is_time = run_studymanager_command(cmd, log,
+                                                       cwd=scripts_dir)
 
         if not error:
             self.is_run = "OK"
         else:
             self.is_run = "KO"
 
-        os.chdir(home)
-
         return error
 
     #---------------------------------------------------------------------------
 
-    def runCompare(self, studies, r, d, threshold, args, reference=None):
-        home = os.getcwd()
+    def run(self):
+        """
+        Check if a run with same result subdirectory name exists
+        and launch run if not.
+        """
+        error = self.prepare_run()
+
+        if error == None:
+            error = self.launch()
+
+        return error
 
+    #---------------------------------------------------------------------------
+
+    def compare_checkpoints(self, r, d, threshold, args, reference=None):
+        """
+        Compare checkpoint files of the repository and the destination.
+        Messages are returned instead of being reported, and the state of
+        the case is not modified, so that several comparisons may be run
+        at the same time from different threads.
+        Return the list of field differences, the mesh sizes equality
+        flag, the list of messages and the elapsed time of the comparison.
+        """
         node = None
+        msgs = []
 
         if reference:
             result = os.path.join(reference, self.label, self.resu)
@@ -577,38 +667,60 @@ class Case(object):
         # check_dir called again here to get run_id (possibly date-hour)
         repo, msg = self.check_dir(node, result, r, "repo")
         if msg:
-            studies.reporting(msg)
+            msgs.append(msg)
         repo = os.path.join(result, repo, 'checkpoint', 'main')
 
         result = os.path.join(self.__dest, self.label, self.resu)
         # check_dir called again here to get run_id (possibly date-hour)
         dest, msg = self.check_dir(node, result, d, "dest")
         if msg:
-            studies.reporting(msg)
+            msgs.append(msg)
         dest = os.path.join(result, dest, 'checkpoint', 'main')
 
-        cmd = self.__diff + ' ' + repo + ' ' + dest
+        diff_args = ''
 
-        self.threshold = "default"
+        s_threshold = "default"
         if threshold != None:
-            cmd += ' --threshold ' + threshold
-            self.threshold = threshold
+            diff_args += ' --threshold ' + threshold
+            s_threshold = threshold
 
         if args != None:
-            cmd += (" " + args)
+            diff_args += (" " + args)
             l = args.split()
             try:
                 i = l.index('--threshold')
-                self.threshold = l[i+1]
+                s_threshold = l[i+1]
             except:
                 pass
 
-        l = subprocess.Popen(cmd,
-                             shell=True,
-                             executable=get_shell_type(),
-                             stdout=subprocess.PIPE,
-                             universal_newlines=True).stdout
-        lines = l.readlines()
+        t1 = time.time()
+        if self.__diff:
+            cmd = self.__diff + ' ' + repo + ' ' + dest + diff_args
+            l = subprocess.Popen(cmd,
+                                 shell=True,
+                                 executable=get_shell_type(),
+                                 stdout=subprocess.PIPE,
+                                 universal_newlines=True).stdout
+            lines = l.readlines()
+            l.close()
+        else:
+            # Python implementation (files must be last arguments)
+            from code_saturne import cs_bdiff
+            out = StringIO()
+            options, files, err = cs_bdiff.parse_diff_args(diff_args.split()
+                                                           + [repo, dest],
+                                                           self.pkg)
+            if err:
+                msgs.append("Error: comparison of %s and %s failed:\n%s"
+                            % (repo, dest, err))
+            elif files:
+                try:
+                    cs_bdiff.python_diff(options, files, out)
+                except Exception as e:
+                    msgs.append("Error: comparison of %s and %s failed:\n%s"
+                                % (repo, dest, str(e)))
+            lines = out.getvalue().splitlines(True)
+        t2 = time.time()
 
         # list of field differences
         tab = []
@@ -639,11 +751,9 @@ class Case(object):
                         tab.append([name.replace("_", "\_"),
                                     vals[1][1],
                                     vals[2][1],
-                                    self.threshold])
-
-        os.chdir(home)
+                                    s_threshold])
 
-        return tab, m_size_eq
+        return tab, m_size_eq, msgs, t2 - t1
 
     #---------------------------------------------------------------------------
 
@@ -783,7 +893,8 @@ class Study(object):
         @type exe: C{String}
         @param exe: name of the solver executable: C{code_saturne} or C{neptune_cfd}.
         @type dif: C{String}
-        @param dif: name of the diff executable: C{cs_io_dump -d}.
+        @param dif: name of the diff executable: C{cs_io_dump -d},
+                    or None to use the Python implementation (cs_io_file).
         @n_procs: C{int}
         @param n_procs: number of requested processors
         @type force_rm: C{True} or C{False}
@@ -1115,7 +1226,8 @@ class Studies(object):
         @type exe: C{String}
         @param exe: name of the solver executable: C{code_saturne} or C{neptune_cfd}.
         @type dif: C{String}
-        @param dif: name of the diff executable: C{cs_io_dump -d}.
+        @param dif: name of the diff executable: C{cs_io_dump -d},
+                    or None to use the Python implementation (cs_io_file).
         """
 
         # try to determine if current directory is a study one
@@ -1285,6 +1397,13 @@ class Studies(object):
         self.__quiet       = options.quiet
         self.__running     = options.runcase
         self.__n_iter      = options.n_iterations
+        self.__max_cores   = options.max_cores
+        self.__n_jobs      = options.n_jobs
+        self.__compare_jobs = options.compare_jobs
+        if not self.__compare_jobs:
+            self.__compare_jobs = 1
+            if options.n_jobs:
+                self.__compare_jobs = options.n_jobs
         self.__compare     = options.compare
         self.__ref         = options.reference
         self.__postpro     = options.post
@@ -1502,12 +1621,88 @@ class Studies(object):
 
     #---------------------------------------------------------------------------
 
+    def __create_control_file(self, s, case):
+        """
+        Create a control_file in the DATA directory of a case to limit
+        the number of iterations, if required.
+        """
+        if self.__n_iter is None:
+            return
+
+        if case.subdomains:
+            case_dir = os.path.join(self.__dest, s.label, case.label,
+                                    case.subdomains[0], "DATA")
+        else:
+            case_dir = os.path.join(self.__dest, s.label, case.label, "DATA")
+
+        path = os.path.join(case_dir, 'control_file')
+        if not os.path.exists(path):
+            control_file = open(path, 'w')
+            control_file.write("time_step_limit " + str(self.__n_iter) + "\n")
+            # Flush to ensure that control_file content is seen
+            # when control_file is copied to the run directory on all systems
+            control_file.flush()
+            control_file.close()
+
+    #---------------------------------------------------------------------------
+
+    def __report_run(self, case, error):
+        """
+        Report the status of a run, and update the compute and dest
+        attributes of the case in the file of parameters.
+        """
+        if case.is_time:
+            is_time = "%s s" % case.is_time
+        else:
+            is_time = "existed already"
+
+        if not error:
+            if not case.run_id:
+                self.reporting("    - run %s --> Warning suffix"
+                               " is not read" % case.label)
+
+            self.reporting('    - run %s --> OK (%s) in %s' \
+                           % (case.label, \
+                              is_time, \
+                              case.run_id))
+            self.__parser.setAttribute(case.node,
+                                       "compute",
+                                       "off")
+
+            # update dest="" attribute
+            n1 = self.__parser.getChildren(case.node, "compare")
+            n2 = self.__parser.getChildren(case.node, "script")
+            n3 = self.__parser.getChildren(case.node, "data")
+            n4 = self.__parser.getChildren(case.node, "probe")
+            n5 = self.__parser.getChildren(case.node, "resu")
+            n6 = self.__parser.getChildren(case.node, "input")
+            for n in n1 + n2 + n3 + n4 + n5 + n6:
+                if self.__parser.getAttribute(n, "dest") == "":
+                    self.__parser.setAttribute(n, "dest", case.run_id)
+        else:
+            if not case.run_id:
+                self.reporting('    - run %s --> FAILED (%s)' \
+                               % (case.label, is_time))
+            else:
+                self.reporting('    - run %s --> FAILED (%s) in %s' \
+                               % (case.label, \
+                                  is_time, \
+                                  case.run_id))
+
+        self.__log.flush()
+
+    #---------------------------------------------------------------------------
+
     def run(self):
         """
         Update and run all cases.
         Warning, if the markup of the case is repeated in the xml file of parameters,
         the run of the case is also repeated.
         """
+        if self.__max_cores or self.__n_jobs:
+            self.run_concurrent()
+            return
+
         for l, s in self.studies:
             self.reporting("  o Prepro scripts and runs for study: " + l)
             for case in s.cases:
@@ -1515,64 +1710,136 @@ class Studies(object):
                 if self.__running:
                     if case.compute == 'on' and case.is_compiled != "KO":
 
-                        if self.__n_iter is not None:
-                            if case.subdomains:
-                                case_dir = os.path.join(self.__dest, s.label, case.label,
-                                                        case.subdomains[0], "DATA")
-                            else:
-                                case_dir = os.path.join(self.__dest, s.label, case.label, "DATA")
-                            os.chdir(case_dir)
-                            # Create a control_file in each case DATA
-                            if not os.path.exists('control_file'):
-                                control_file = open('control_file','w')
-                                control_file.write("time_step_limit " + str(self.__n_iter) + "\n")
-                                # Flush to ensure that control_file content is seen
-                                # when control_file is copied to the run directory on all systems
-                                control_file.flush()
-                                control_file.close
+                        self.__create_control_file(s, case)
 
                         self.reporting('    - running %s ...' % case.label,
                                        stdout=True, report=False, status=True)
                         error = case.run()
-                        if case.is_time:
-                            is_time = "%s s" % case.is_time
-                        else:
-                            is_time = "existed already"
-
-                        if not error:
-                            if not case.run_id:
-                                self.reporting("    - run %s --> Warning suffix"
-                                               " is not read" % case.label)
-
-                            self.reporting('    - run %s --> OK (%s) in %s' \
-                                           % (case.label, \
-                                              is_time, \
-                                              case.run_id))
-                            self.__parser.setAttribute(case.node,
-                                                       "compute",
-                                                       "off")
-
-                            # update dest="" attribute
-                            n1 = self.__parser.getChildren(case.node, "compare")
-                            n2 = self.__parser.getChildren(case.node, "script")
-                            n3 = self.__parser.getChildren(case.node, "data")
-                            n4 = self.__parser.getChildren(case.node, "probe")
-                            n5 = self.__parser.getChildren(case.node, "resu")
-                            n6 = self.__parser.getChildren(case.node, "input")
-                            for n in n1 + n2 + n3 + n4 + n5 + n6:
-                                if self.__parser.getAttribute(n, "dest") == "":
-                                    self.__parser.setAttribute(n, "dest", case.run_id)
-                        else:
-                            if not case.run_id:
-                                self.reporting('    - run %s --> FAILED (%s)' \
-                                               % (case.label, is_time))
-                            else:
-                                self.reporting('    - run %s --> FAILED (%s) in %s' \
-                                               % (case.label, \
-                                                  is_time, \
-                                                  case.run_id))
+                        self.__report_run(case, error)
+
+        self.reporting('')
+
+    #---------------------------------------------------------------------------
+
+    def run_concurrent(self):
+        """
+        Update and run all cases, running independent cases at the same
+        time, within a total number of cores (--max-cores) and a maximum
+        number of simultaneous runs (--jobs).
+        Entries of the same case (repeated markups) share the case
+        directory, so they are handled in order, each one (prepro scripts
+        and run) only after the previous one has finished. Other runs are
+        launched in order, skipping those which do not fit in the available
+        cores until enough cores are released. Outputs of each run are
+        buffered and appended to the studymanager log when the run
+        finishes; prepro scripts, the report and the file of parameters
+        are only handled from the calling thread.
+        """
+        max_cores = self.__max_cores
+        if not max_cores:
+            max_cores = get_available_cores()
+        max_jobs = self.__n_jobs
+        if not max_jobs:
+            max_jobs = max_cores
+
+        # pending entries: [study label, study, case, number of cores]
+        # (number of cores set once prepro scripts have been run)
+
+        pending = []
+        for l, s in self.studies:
+            for case in s.cases:
+                pending.append([l, s, case, None])
+
+        if not pending:
+            return
+
+        self.reporting("  o Prepro scripts and runs (at most %d cores and"
+                       " %d simultaneous runs)" % (max_cores, max_jobs))
+
+        finished = queue.Queue()
+
+        # run_command exits (SystemExit) when a command cannot be started,
+        # so all exceptions are caught, and a result is always queued.
+
+        def launch(s, case, n_cores):
+            log = tempfile.TemporaryFile(mode='w+')
+            error = 1
+            try:
+                error = case.launch(log)
+            except BaseException:
+                import traceback
+                log.write(traceback.format_exc())
+                case.is_run = "KO"
+                error = 1
+            finally:
+                finished.put((s, case, n_cores, error, log))
+
+        busy = set()   # case directories of running or waiting entries
+        n_running = 0
+        n_cores_used = 0
+
+        while pending or n_running:
+
+            # handle entries whose case directory is free, launching
+            # runs which fit in available resources
+
+            waiting = set()
+            i = 0
+            while i < len(pending):
+                entry = pending[i]
+                l, s, case = entry[0:3]
+                key = (s.label, case.label)
+                if key in busy or key in waiting:
+                    i += 1
+                    continue
+
+                if entry[3] == None:
+                    self.prepro(l, s, case)
+                    if not (self.__running and case.compute == 'on'
+                            and case.is_compiled != "KO"):
+                        del pending[i]
+                        continue
+                    self.__create_control_file(s, case)
+                    entry[3] = min(case.get_n_procs(), max_cores)
+
+                n_cores = entry[3]
+                if n_running >= max_jobs \
+                   or n_cores_used + n_cores > max_cores:
+                    waiting.add(key)
+                    i += 1
+                    continue
+                del pending[i]
+
+                error = case.prepare_run()
+                if error != None:
+                    self.__report_run(case, error)
+                    continue
+
+                self.reporting('    - start %s/%s (%d cores) in %s' \
+                               % (s.label, case.label, n_cores, case.run_id))
+
+                t = threading.Thread(target=launch, args=(s, case, n_cores))
+                t.daemon = True
+                t.start()
+                busy.add(key)
+                n_running += 1
+                n_cores_used += n_cores
+
+            if not n_running:
+                continue
+
+            # wait for a run to finish
 
-                        self.__log.flush()
+            s, case, n_cores, error, log = finished.get()
+            busy.discard((s.label, case.label))
+            n_running -= 1
+            n_cores_used -= n_cores
+
+            log.seek(0)
+            self.__log.write(log.read())
+            log.close()
+
+            self.__report_run(case, error)
 
         self.reporting('')
 
@@ -1629,16 +1896,15 @@ class Studies(object):
 
     #---------------------------------------------------------------------------
 
-    def compare_case_and_report(self, case, repo, dest, threshold, args, reference=None):
+    def __report_compare(self, case, args, diff_value, m_size_eq, msgs):
         """
-        Compare the results for one computation and report
+        Report the result of one comparison and gather it with
+        other results of the case.
         """
-        case.is_compare = "done"
-        diff_value, m_size_eq = case.runCompare(self,
-                                                repo, dest,
-                                                threshold, args,
-                                                reference=reference)
+        for msg in msgs:
+            self.reporting(msg)
 
+        case.is_compare = "done"
         case.diff_value += diff_value
         case.m_size_eq = case.m_size_eq and m_size_eq
 
@@ -1654,45 +1920,87 @@ class Studies(object):
         else:
             self.reporting('    - compare %s (%s) --> NO DIFFERENCES FOUND' % (case.label, s_args))
 
-
     #---------------------------------------------------------------------------
 
     def compare(self):
         """
         Compare the results of the new computations with those from the Repository.
+        Comparisons are run by a pool of --compare-jobs threads, results
+        being reported in order as they become available.
         """
-        if self.__compare:
-            for l, s in self.studies:
+        if not self.__compare:
+            self.reporting('')
+            return
+
+        # build list of comparisons
+
+        comparisons = []
+        for l, s in self.studies:
+            # reference directory passed in studymanager command line overwrites
+            # destination in all cases (even if compare is defined by a
+            # compare markup with a non empty destination)
+            ref = None
+            if self.__ref:
+                ref = os.path.join(self.__ref, s.label)
+            for case in s.cases:
+                if case.compare == 'on' and case.is_run != "KO":
+                    is_compare, nodes, repo, dest, t, args = self.__parser.getCompare(case.node)
+                    n_case_compare = 0
+                    if is_compare:
+                        for i in range(len(nodes)):
+                            if is_compare[i]:
+                                comparisons.append((l, s, case, repo[i], dest[i],
+                                                    t[i], args[i], ref))
+                                n_case_compare += 1
+                    if not n_case_compare:
+                        comparisons.append((l, s, case, "", "", None, None, ref))
+
+        def compare_one(c):
+            l, s, case, repo, dest, t, args, ref = c
+            return case.compare_checkpoints(repo, dest, t, args, reference=ref)
+
+        t0 = time.time()
+
+        n_jobs = max(1, min(self.__compare_jobs, len(comparisons)))
+        if n_jobs > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(n_jobs)
+            results = pool.imap(compare_one, comparisons)
+        else:
+            pool = None
+            results = map(compare_one, comparisons)
+
+        # report results in order
+
+        times = []
+        current = None
+
+        for c, r in zip(comparisons, results):
+            l, s, case, repo, dest, t, args, ref = c
+            if l != current:
                 self.reporting('  o Compare study: ' + l)
-                # reference directory passed in studymanager command line overwrites
-                # destination in all cases (even if compare is defined by a
-                # compare markup with a non empty destination)
-                ref = None
-                if self.__ref:
-                    ref = os.path.join(self.__ref, s.label)
-                for case in s.cases:
-                    if case.compare == 'on' and case.is_run != "KO":
-                        is_compare, nodes, repo, dest, t, args = self.__parser.getCompare(case.node)
-                        if is_compare:
-                            for i in range(len(nodes)):
-                                if is_compare[i]:
-                                    self.compare_case_and_report(case,
-                                                                 repo[i],
-                                                                 dest[i],
-                                                                 t[i],
-                                                                 args[i],
-                                                                 reference=ref)
-                        if not is_compare or case.is_compare != "done":
-                            repo = ""
-                            dest = ""
-                            t    = None
-                            args = None
-                            self.compare_case_and_report(case,
-                                                         repo,
-                                                         dest,
-                                                         t,
-                                                         args,
-                                                         reference=ref)
+                current = l
+            diff_value, m_size_eq, msgs, t_diff = r
+            self.__report_compare(case, args, diff_value, m_size_eq, msgs)
+            s_args = ''
+            if args:
+                s_args = ', args: ' + args
+            times.append((l, case.label, case.run_id, s_args, t_diff))
+
+        if pool:
+            pool.close()
+            pool.join()
+
+        if times:
+            t_sum = 0.
+            self.reporting('')
+            self.reporting('  o Compare times (%d simultaneous comparisons)' % n_jobs)
+            for l, label, run_id, s_args, t_diff in times:
+                self.reporting('    - %s/%s (run_id: %s%s): %.2f s' \
+                               % (l, label, run_id, s_args, t_diff))
+                t_sum += t_diff
+            self.reporting('    - total: %.2f s, elapsed: %.2f s' \
+                           % (t_sum, time.time() - t0))
 
         self.reporting('')
 
@@ -1936,9 +2244,12 @@ class Studies(object):
         if self.__plotter:
             for l, s in self.studies:
                 self.reporting('  o Plot study: ' + l)
-                self.__plotter.plot_study(l, s,
-                                          self.__dis_tex,
-                                          self.__default_fmt)
+                n_rendered, n_skipped = \
+                    self.__plotter.plot_study(l, s,
+                                              self.__dis_tex,
+                                              self.__default_fmt)
+                self.reporting('    figures rendered: %d, skipped (unchanged): %d'
+                               % (n_rendered, n_skipped))
 
         self.reporting('')
 
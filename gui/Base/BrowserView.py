@@ -47,6 +47,7 @@ from code_saturne.Base.QtWidgets import *
 
 from code_saturne.Base.BrowserForm import Ui_BrowserForm
 from code_saturne.model.Common import GuiParam
+from code_saturne.model.CaseFeaturesModel import getCaseFeatures
 from code_saturne.Base.Toolbox import displaySelectedPage
 from code_saturne.Base.QtPage import from_qvariant, to_text_string
 
@@ -824,140 +825,16 @@ Performance settings
         if case['run_type'] != 'standard':
             return self.__configureTreePrepro(case)
 
-        p_module = ''
-        if case.xmlRootNode().tagName == "NEPTUNE_CFD_GUI":
-            p_module = 'neptune_cfd'
-
-        # Precompute some values
-        #-----------------------
-
-        m_tbm = False
-        m_fans = False
-        m_lagr = False
-        m_ale = False
-        m_thermal = 0
-        m_cht = False
-        m_gas_comb = False
-        m_sf_comb = False
-        m_elec = False
-        m_atmo = False
-        m_comp = False
-        m_gwf = False
-
-        node_pm = case.xmlGetNode('thermophysical_models')
-
-        if node_pm:
-
-            node = node_pm.xmlGetNode('ale_method')
-            if node and node['status'] == 'on':
-                m_ale = True
-            node = node_pm.xmlGetNode('turbomachinery', 'model')
-            if node and node['model'] != "off":
-                m_tbm = True
-            node = node_pm.xmlGetNode('fans')
-            if node:
-                m_fans = True
-
-            if not m_thermal:
-                node = node_pm.xmlGetNode('gas_combustion', 'model')
-                if node and node['model'] in ('ebu', 'd3p', 'lwp'):
-                    m_gas_comb = True
-                    m_thermal = 1
-            if not m_thermal:
-                node = node_pm.xmlGetNode('solid_fuels', 'model')
-                if node and node['model'] in ('homogeneous_fuel',
-                                              'homogeneous_fuel_moisture',
-                                              'homogeneous_fuel_moisture_lagr'):
-                    m_sf_comb = True
-                    m_thermal = 1
-            if not m_thermal:
-                node = node_pm.xmlGetNode('joule_effect', 'model')
-                if node and node['model'] in ('joule', 'arc'):
-                    m_elec = True
-                    m_thermal = 1
-            if not m_thermal:
-                node = node_pm.xmlGetNode('atmospheric_flows',  'model')
-                if node and node['model'] != 'off':
-                    m_atmo = True
-                    if node['model'] == 'constant':
-                        m_thermal = -1
-                    elif node['model'] in ('dry', 'humid'):
-                        m_thermal = 1
-            if not m_thermal:
-                node = node_pm.xmlGetNode('compressible_model', 'model')
-                if node and node['model'] != 'off':
-                    m_cpr = True
-                    m_thermal = 1
-
-            if not m_thermal:
-                node = node_pm.xmlGetNode('thermal_scalar', 'model')
-                if node and node['model'] != 'off':
-                    m_thermal = 2
-
-            node = node_pm.xmlGetNode('groundwater_model',  'model')
-            if node and node['model'] != 'off':
-                m_gwf = True
-                m_thermal = -1
-                m_fans = False
-
-            if m_thermal > 0:
-                m_cht = True
-
-        node = case.xmlGetNode('lagrangian', 'model')
-        if node and node['model'] != "off":
-            m_lagr = True
-
-        # Options for NEPTUNE_CFD if present:
-
-        m_ncfd = {}
-        m_ncfd['non_condens'] = False
-        m_ncfd['nucleate_boiling'] = False
-        m_ncfd['droplet_condens'] = False
-        m_ncfd['particles_interactions'] = False
-        m_ncfd['itf_area'] = False
-        m_ncfd['itf_h_transfer'] = False
-
-        ncfd_fields = 0
-
-        if p_module == 'neptune_cfd' and node_pm:
-
-            m_fans = False
-            m_thermal = 1
-            m_cht = True
-
-            node_f = node_pm.xmlInitNode('fields')
-            fields = node_f.xmlGetNodeList('field')
-            ncfd_fields = len(fields)
-
-        if ncfd_fields > 1:
-            from code_saturne.model.MainFieldsModel import MainFieldsModel
-            from code_saturne.model.NonCondensableModel import NonCondensableModel
-            from code_saturne.model.InterfacialForcesModel import InterfacialForcesModel
-            predefined_flow = MainFieldsModel(case).getPredefinedFlow()
-
-            if (len(MainFieldsModel(case).getSolidFieldIdList()) > 0):
-                m_ncfd['particles_interactions'] = True
-            if (len(MainFieldsModel(case).getDispersedFieldList()) > 0
-                or InterfacialForcesModel(case).getBubblesForLIMStatus() == 'on'):
-                m_ncfd['itf_area'] = True
-
-            if predefined_flow == "free_surface":
-                m_ncfd['non_condens'] = True
-                m_ncfd['nucleate_boiling'] = True
-                m_ncfd['itf_h_transfer'] = True
-            elif predefined_flow == "boiling_flow":
-                m_ncfd['non_condens'] = True
-                m_ncfd['nucleate_boiling'] = True
-                m_ncfd['itf_h_transfer'] = True
-            elif predefined_flow == "droplet_flow":
-                m_ncfd['non_condens'] = True
-                m_ncfd['droplet_condens'] = True
-                m_ncfd['itf_h_transfer'] = True
-            elif predefined_flow == "particles_flow":
-                m_ncfd['particles_interactions'] = True
-                m_ncfd['itf_h_transfer'] = True
-
-        is_ncfd = (p_module == 'neptune_cfd')
+        # Precompute some values (from XML only, without loading models)
+        #-----------------------------------------------------------------
+
+        f = getCaseFeatures(case)
+
+        m_ale = f['ale']
+        m_thermal = f['thermal']
+        m_lagr = f['lagrangian']
+        m_gwf = f['groundwater']
+        is_ncfd = f['neptune_cfd']
 
         # Manage visibility
         #------------------
@@ -971,32 +848,32 @@ Performance settings
         # Thermophysical Models
 
         self.setRowShow(self.tr('Calculation features'), True)
-        self.setRowShow(self.tr('Main fields'), (p_module == 'neptune_cfd'))
+        self.setRowShow(self.tr('Main fields'), is_ncfd)
         self.setRowShow(self.tr('Deformable mesh'), m_ale)
         self.setRowShow(self.tr('Turbulence models'))
         self.setRowShow(self.tr('Thermal model'), (m_thermal > -1))
         self.setRowShow(self.tr('Body forces'), (not m_gwf))
-        self.setRowShow(self.tr('Gas combustion'), m_gas_comb)
-        self.setRowShow(self.tr('Pulverized fuel combustion'), m_sf_comb)
-        self.setRowShow(self.tr('Electrical models'), m_elec)
-        self.setRowShow(self.tr('Conjugate heat transfer'), m_cht)
-        self.setRowShow(self.tr('Atmospheric flows'), m_atmo)
+        self.setRowShow(self.tr('Gas combustion'), f['gas_combustion'])
+        self.setRowShow(self.tr('Pulverized fuel combustion'), f['solid_fuels'])
+        self.setRowShow(self.tr('Electrical models'), f['electrical'])
+        self.setRowShow(self.tr('Conjugate heat transfer'), f['cht'])
+        self.setRowShow(self.tr('Atmospheric flows'), f['atmospheric'])
         self.setRowShow(self.tr('Species transport'))
-        self.setRowShow(self.tr('Turbomachinery'), m_tbm)
+        self.setRowShow(self.tr('Turbomachinery'), f['turbomachinery'])
         self.setRowShow(self.tr('Groundwater flows'), m_gwf)
-        self.setRowShow(self.tr('Fans'), m_fans)
+        self.setRowShow(self.tr('Fans'), f['fans'])
 
-        self.setRowShow(self.tr('Non condensable gases'), m_ncfd['non_condens'])
+        self.setRowShow(self.tr('Non condensable gases'), f['non_condens'])
         self.setRowShow(self.tr('Thermodynamics'), is_ncfd)
 
         # Closure modeling
 
-        self.setRowShow(self.tr('Closure modeling'), (ncfd_fields > 1))
-        self.setRowShow(self.tr('Interfacial enthalpy transfer'), m_ncfd['itf_h_transfer'])
-        self.setRowShow(self.tr('Interfacial area'), m_ncfd['itf_area'])
-        self.setRowShow(self.tr('Nucleate boiling parameters'), m_ncfd['nucleate_boiling'])
-        self.setRowShow(self.tr('Droplet condensation-evaporation'), m_ncfd['droplet_condens'])
-        self.setRowShow(self.tr('Particles interactions'), m_ncfd['particles_interactions'])
+        self.setRowShow(self.tr('Closure modeling'), (f['fields'] > 1))
+        self.setRowShow(self.tr('Interfacial enthalpy transfer'), f['itf_h_transfer'])
+        self.setRowShow(self.tr('Interfacial area'), f['itf_area'])
+        self.setRowShow(self.tr('Nucleate boiling parameters'), f['nucleate_boiling'])
+        self.setRowShow(self.tr('Droplet condensation-evaporation'), f['droplet_condens'])
+        self.setRowShow(self.tr('Particles interactions'), f['particles_interactions'])
 
         # Fluid properties
 
@@ -1011,35 +888,12 @@ Performance settings
 
         self.setRowShow(self.tr('Volume zones'), True)
 
-        node_domain = case.xmlGetNode('solution_domain')
-        node_vol = node_domain.xmlGetNode('volumic_conditions')
-        init = False
-        z_st = False
-        z_head_loss = False
-        z_porosity = False
-        z_groundwater = False
-
-        for node in node_vol.xmlGetChildNodeList('zone'):
-            if (node['initialization'] == 'on'):
-                init = True
-            if (node['momentum_source_term'] == 'on'
-                or node['mass_source_term'] == 'on'
-                or node['thermal_source_term'] == 'on'
-                or node['scalar_source_term'] == 'on'):
-                z_st = True
-            if node['head_losses'] == 'on':
-                z_head_loss = True
-            if node['porosity'] == 'on':
-                z_porosity = True
-            if node['groundwater_law'] == 'on':
-                z_groundwater = True
-
-        self.setRowShow(self.tr('Main fields initialization'), is_ncfd and init)
-        self.setRowShow(self.tr('Initialization'), (not is_ncfd) and init)
-        self.setRowShow(self.tr('Head losses'), z_head_loss)
-        self.setRowShow(self.tr('Porosity'), z_porosity)
-        self.setRowShow(self.tr('Source terms'), z_st)
-        self.setRowShow(self.tr('Groundwater laws'), z_groundwater)
+        self.setRowShow(self.tr('Main fields initialization'), is_ncfd and f['initialization'])
+        self.setRowShow(self.tr('Initialization'), (not is_ncfd) and f['initialization'])
+        self.setRowShow(self.tr('Head losses'), f['head_losses'])
+        self.setRowShow(self.tr('Porosity'), f['porosity'])
+        self.setRowShow(self.tr('Source terms'), f['source_terms'])
+        self.setRowShow(self.tr('Groundwater laws'), f['groundwater_laws'])
 
         # Boundary zones
 
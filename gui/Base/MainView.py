@@ -77,9 +77,6 @@ except:
 from code_saturne.Base.BrowserView import BrowserView
 from code_saturne.model import XMLengine
 from code_saturne.Base import QtCase
-from code_saturne.model.XMLinitialize import *
-from code_saturne.model.XMLinitializeNeptune import *
-from code_saturne.model.XMLmodel import *
 from code_saturne.model.Common import GuiParam, XML_DOC_VERSION
 from code_saturne.Base.Toolbox import displaySelectedPage
 
@@ -90,14 +87,10 @@ except:
 
 from code_saturne.Pages.WelcomeView import WelcomeView
 from code_saturne.model.IdentityAndPathesModel import IdentityAndPathesModel
-from code_saturne.Pages.XMLEditorView import XMLEditorView
-from code_saturne.Pages.BatchRunningDialogView import BatchRunningDialogView
-from code_saturne.Pages.OpenTurnsDialogView import OpenTurnsDialogView
 from code_saturne.model.ScriptRunningModel import ScriptRunningModel
 from code_saturne.model.SolutionDomainModel import getRunType
 from code_saturne.Base.QtPage import getexistingdirectory
 from code_saturne.Base.QtPage import from_qvariant, to_text_string, getopenfilename, getsavefilename
-from code_saturne.cs_mei_to_c import mei_to_c_interpreter
 
 #-------------------------------------------------------------------------------
 # log config
@@ -1091,6 +1084,7 @@ class MainView(object):
         print the case (xml file) on the current terminal
         """
         if hasattr(self, 'case'):
+            from code_saturne.Pages.XMLEditorView import XMLEditorView
             dialog = XMLEditorView(self, self.case)
             dialog.show()
 
@@ -1324,6 +1318,7 @@ class MainView(object):
         print the case (xml file) on the current terminal
         """
         if hasattr(self, 'case'):
+            from code_saturne.Pages.BatchRunningDialogView import BatchRunningDialogView
             dialog = BatchRunningDialogView(self, self.case)
             dialog.show()
 
@@ -1344,6 +1339,7 @@ class MainView(object):
             sys.path.insert(0, os.path.join(ydefx_root, 'lib/python3.6/site-packages/salome'))
 
         if hasattr(self, 'case'):
+            from code_saturne.Pages.OpenTurnsDialogView import OpenTurnsDialogView
             dialog = OpenTurnsDialogView(self, self.case)
             dialog.show()
 
@@ -1395,6 +1391,7 @@ class MainView(object):
         """
         state = 0
         if self.case['run_type'] == 'standard':
+            from code_saturne.cs_mei_to_c import mei_to_c_interpreter
             mci = mei_to_c_interpreter(self.case)
 
             mci_state = mci.save_all_functions()
@@ -1645,10 +1642,12 @@ class MainViewSaturne(QMainWindow, Ui_MainForm, MainView):
         prepro_only = self.case['run_type'] != 'standard'
         if self.case.xmlRootNode().tagName == "NEPTUNE_CFD_GUI" :
             from neptune_cfd.nc_package import package as nc_package
+            from code_saturne.model.XMLinitializeNeptune import XMLinitNeptune
             self.package = nc_package()
             return XMLinitNeptune(self.case).initialize(prepro_only)
         elif self.case.xmlRootNode().tagName == "Code_Saturne_GUI" :
             from code_saturne.cs_package import package as cs_package
+            from code_saturne.model.XMLinitialize import XMLinit
             self.package = cs_package()
             return XMLinit(self.case).initialize(prepro_only)
 
@@ -1820,15 +1819,8 @@ class MainViewSaturne(QMainWindow, Ui_MainForm, MainView):
                                              python_record[1],
                                              python_record[2]])
 
-            last_record = self.case['undo'].pop()
-            self.case.record_func_prev = None
-            self.case.xml_prev = ""
-            self.case['redo'].append([last_record[0],
-                                      self.case.toString(),
-                                      last_record[2],
-                                      last_record[3]])
+            last_record = self.case.undoLastStep()
 
-            self.case.parseString(last_record[1])
             self.Browser.activeSelectedPage(last_record[2])
             self.Browser.configureTree(self.case)
             self.case['current_index'] = last_record[2]
@@ -1854,15 +1846,8 @@ class MainViewSaturne(QMainWindow, Ui_MainForm, MainView):
                                              python_record[1],
                                              python_record[2]])
 
-            last_record = self.case['redo'].pop()
-            self.case.record_func_prev = None
-            self.case.xml_prev = ""
-            self.case['undo'].append([last_record[0],
-                                      self.case.toString(),
-                                      last_record[2],
-                                      last_record[3]])
+            last_record = self.case.redoLastStep()
 
-            self.case.parseString(last_record[1])
             self.Browser.activeSelectedPage(last_record[2])
             self.Browser.configureTree(self.case)
             self.case['current_index'] = last_record[2]
@@ -25,6 +25,9 @@
 """
 This module extends a case with undo/redo functionnality.
 
+Undo/redo records store the steps of the XML journal (the modified
+nodes only) rather than snapshots of the whole document.
+
 This module defines the following classes:
 - QtCase
 """
@@ -58,8 +61,9 @@ class QtCase(Case, QObject):
         """
         Instantiate a new dico and a new xml doc
         """
-        Case.__init__(self, package, file_name, studymanager)
+        Case.__init__(self, package, file_name, studymanager, indexed=True)
         QObject.__init__(self)
+        self.xmlJournalEnable()
 
 
     def undoStop(self):
@@ -84,7 +88,7 @@ class QtCase(Case, QObject):
                 self['dump_python'].append([f.__module__, f.func_name, c])
             else:
                 self['dump_python'].append([f.__module__, f.__name__, c])
-            if self.xml_prev != self.toString() or self.xml_prev == "":
+            if self.xml_journal.modified:
                 # control if function have same arguments
                 # last argument is value
                 same = True
@@ -98,8 +102,7 @@ class QtCase(Case, QObject):
                 if same:
                     pass
                 else:
-                    self['undo'].append([self['current_page'], self.toString(), self['current_index'], self['current_tab']])
-                    self.xml_prev = self.toString()
+                    self.undoNewStep()
                     self.record_func_prev = None
                     self.record_argument_prev = c
                     self.undo_signal.emit()
@@ -111,7 +114,7 @@ class QtCase(Case, QObject):
                 self['dump_python'].append([f.__module__, f.func_name, c])
             else:
                 self['dump_python'].append([f.__module__, f.__name__, c])
-            if self.xml_prev != self.toString():
+            if self.xml_journal.modified:
                 # control if function have same arguments
                 # last argument is value
                 same = True
@@ -127,11 +130,50 @@ class QtCase(Case, QObject):
                 else:
                     self.record_func_prev = f
                     self.record_argument_prev = c
-                    self['undo'].append([self['current_page'], self.toString(), self['current_index'], self['current_tab']])
-                    self.xml_prev = self.toString()
+                    self.undoNewStep()
                     self.undo_signal.emit()
 
 
+    def undoNewStep(self):
+        """
+        Start a new journal step, recording the following modifications.
+        """
+        step = self.xml_journal.newStep()
+        self['undo'].append([self['current_page'], step, self['current_index'], self['current_tab']])
+        self['redo'] = []
+        self['python_redo'] = []
+        self.xml_journal.limitSize(self['undo'], self['redo'])
+
+
+    def undoLastStep(self):
+        """
+        Revert the last step, and return its record.
+        """
+        last_record = self['undo'].pop()
+        self['redo'].append(last_record)
+        self.xml_journal.revert(last_record[1], self.xml_index)
+        self.xml_generation += 1
+        if self['undo']:
+            self.xml_journal.step = self['undo'][-1][1]
+        else:
+            self.xml_journal.step = None
+        self.record_func_prev = None
+        return last_record
+
+
+    def redoLastStep(self):
+        """
+        Apply again the last reverted step, and return its record.
+        """
+        last_record = self['redo'].pop()
+        self['undo'].append(last_record)
+        self.xml_journal.apply(last_record[1], self.xml_index)
+        self.xml_generation += 1
+        self.xml_journal.step = last_record[1]
+        self.record_func_prev = None
+        return last_record
+
+
 #-------------------------------------------------------------------------------
 # End of QtCase
 #-------------------------------------------------------------------------------
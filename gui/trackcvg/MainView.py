@@ -95,6 +95,131 @@ from xml.dom.minidom import parse, Document
 logging.basicConfig()
 log = logging.getLogger("MainView")
 
+#-------------------------------------------------------------------------------
+# incremental reader for probes and residuals files
+#-------------------------------------------------------------------------------
+
+class ProbesFileReader(object):
+    """
+    Read a probes or residuals file incrementally: the byte offset of the
+    last complete line read is kept, so that only rows appended since the
+    previous call are parsed (the file is read again from the start if it
+    was replaced or rewritten). Values are stored in a growing NumPy buffer.
+    """
+
+    def __init__(self, name, n_columns, separator=None, header=False,
+                 comment=None):
+        """
+        Constructor.
+        """
+        self.name = name
+        self.n_columns = n_columns
+        self.separator = separator
+        self.header = header
+        self.comment = comment
+
+        self.reset()
+
+
+    def reset(self):
+        """
+        Forget all data read so far.
+        """
+        self.offset = 0
+        self.identity = None
+        self.tail = b''
+        self.header_read = not self.header
+        self.n_rows = 0
+        self.data = numpy.empty((64, self.n_columns))
+        self.pending = numpy.empty(0)
+
+
+    def __append(self, values):
+        """
+        Append values to the buffer, by complete rows; incomplete rows
+        are kept for the next call.
+        """
+        if self.pending.size > 0:
+            values = numpy.concatenate((self.pending, values))
+
+        n_new = values.size // self.n_columns
+        n_values = n_new * self.n_columns
+        self.pending = values[n_values:].copy()
+
+        if n_new == 0:
+            return
+
+        n_rows = self.n_rows + n_new
+        if n_rows > self.data.shape[0]:
+            n_alloc = max(n_rows, 2*self.data.shape[0])
+            data = numpy.empty((n_alloc, self.n_columns))
+            data[:self.n_rows] = self.data[:self.n_rows]
+            self.data = data
+
+        self.data[self.n_rows:n_rows] = \
+            values[:n_values].reshape(n_new, self.n_columns)
+        self.n_rows = n_rows
+
+
+    def read(self):
+        """
+        Parse lines appended since the previous call, and return data
+        as an array of columns (view on the buffer).
+        """
+        try:
+            f = open(self.name, 'rb')
+        except IOError:
+            return self.data[:self.n_rows].transpose()
+
+        # File rewritten (for example by a new run): restart from scratch.
+        # This is detected by a new file, a shorter file, or a change of
+        # the last line read so far.
+        st = os.fstat(f.fileno())
+        identity = (st.st_dev, st.st_ino)
+        rewritten = (self.identity != None and identity != self.identity) \
+            or st.st_size < self.offset
+        if not rewritten and self.tail:
+            f.seek(self.offset - len(self.tail))
+            rewritten = (f.read(len(self.tail)) != self.tail)
+        if rewritten:
+            self.reset()
+        self.identity = identity
+
+        f.seek(self.offset)
+        chunk = f.read()
+        f.close()
+
+        # Ignore a trailing line which is not complete yet
+        e_id = chunk.rfind(b'\n')
+        if e_id < 0:
+            return self.data[:self.n_rows].transpose()
+        self.offset += e_id + 1
+        s_id = max(chunk.rfind(b'\n', 0, e_id) + 1, e_id - 255)
+        self.tail = chunk[s_id:e_id+1]
+
+        lines = chunk[:e_id].decode('utf-8', 'replace').split('\n')
+
+        if not self.header_read:
+            lines = lines[1:]
+            self.header_read = True
+
+        if self.comment:
+            lines = [l for l in lines if not l.startswith(self.comment)]
+
+        if self.separator:
+            text = self.separator.join(lines).split(self.separator)
+        else:
+            text = ' '.join(lines).split()
+
+        if text and text != ['']:
+            try:
+                values = numpy.array(text, dtype=float)
+            except ValueError:
+                values = numpy.array([float(v) for v in text if v.strip()])
+            self.__append(values)
+
+        return self.data[:self.n_rows].transpose()
+
 #-------------------------------------------------------------------------------
 # item class
 #-------------------------------------------------------------------------------
@@ -699,6 +824,7 @@ class MainView(object):
         self.fileList = []
         self.listingVariable = []
         self.listFileProbes = {}
+        self.fileReaders = {}
         self.modelCases = CaseStandardItemModel(self.parent, [], [])
         self.treeViewDirectory.setModel(self.modelCases)
         self.modelCases.dataChanged.connect(self.treeViewChanged)
@@ -1024,41 +1150,16 @@ class MainView(object):
 
     def ReadCsvFile(self, name, probes_number):
         """
+        Return the columns of a CSV file, reading only the rows
+        appended since the previous call.
         """
-        data = []
-        comp = 0
-        ficIn= open(name, 'r')
-        typ = 0 # O time / 1 iteration
-        for line in ficIn.readlines():
-            e_id = line.find('\n')
-            if e_id < 0:
-                continue
-            if comp > 0:
-                content = line[:e_id].split(',')
-
-                if comp == 1:
-                    if type(content[0]) == int:
-                        typ = 1
-
-                if typ == 0:
-                    for el in content:
-                        data.append(float(el))
-                else:
-                    data.append(float(content[0]))
-                    for el in content[1:]:
-                        data.append(float(el))
-            comp = comp + 1
-        ficIn.close()
-        A = numpy.array(data)
-        n = A.shape[0]
-        r = n % probes_number
-        if r > 0:
-            n -= r
-            A = numpy.resize(A, n)
-        B = A.reshape(-1, probes_number)
-        C = B.transpose()
+        reader = self.fileReaders.get(name)
+        if reader == None or reader.n_columns != probes_number:
+            reader = ProbesFileReader(name, probes_number,
+                                      separator=',', header=True)
+            self.fileReaders[name] = reader
 
-        return C
+        return reader.read()
 
 
     def ReadCsvFileHeader(self, name):
@@ -1077,42 +1178,15 @@ class MainView(object):
 
     def ReadDatFile(self, name, probes_number):
         """
+        Return the columns of a DAT file, reading only the rows
+        appended since the previous call.
         """
-        data = []
-        ficIn= open(name, 'r')
-        comp = 0
-        typ = 0 # O time / 1 iteration
-        for line in ficIn.readlines():
-            if not line.startswith("#"):
-                comp = comp + 1
-                e_id = line.find('\n')
-                if e_id < 0:
-                    continue
-                line = line[:e_id].lstrip()
-                content = line.split()
-
-                if comp == 1:
-                    if type(content[0]) == int:
-                        typ = 1
-
-                if typ == 0:
-                    for el in content:
-                        data.append(float(el))
-                else:
-                    data.append(float(content[0]))
-                    for el in content[1:]:
-                        data.append(float(el))
-        ficIn.close()
-        A = numpy.array(data)
-        n = A.shape[0]
-        r = n % probes_number
-        if r > 0:
-            n -= r
-            A = numpy.resize(A, n)
-        B = A.reshape(-1, probes_number)
-        C = B.transpose()
+        reader = self.fileReaders.get(name)
+        if reader == None or reader.n_columns != probes_number:
+            reader = ProbesFileReader(name, probes_number, comment='#')
+            self.fileReaders[name] = reader
 
-        return C
+        return reader.read()
 
 
     def ReadDatFileHeader(self, name):
@@ -1290,6 +1364,7 @@ class MainViewSaturne(QMainWindow, Ui_MainForm, MainView):
         self.fileList = []
         self.listingVariable = []
         self.listFileProbes = {}
+        self.fileReaders = {}
         self.timer = QTimer()
         self.timer.start(self.timeRefresh * 1000)
 
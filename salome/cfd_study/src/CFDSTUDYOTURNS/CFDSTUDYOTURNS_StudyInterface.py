@@ -27,6 +27,7 @@
 #-------------------------------------------------------------------------------
 
 import os, os.path
+import subprocess, time
 try:
     import ConfigParser as configparser # Python2
 except Exception:
@@ -37,6 +38,39 @@ except Exception:
 #-------------------------------------------------------------------------------
 
 
+# ==============================================================================
+# Utility functions
+# ==============================================================================
+
+def get_package(cfg):
+    """
+    Return the package according to the requested code by the user
+    """
+
+    pkg_name = cfg.get('study_parameters', 'code_name')
+
+    if pkg_name == 'code_saturne':
+        from code_saturne.cs_package import package
+    elif pkg_name == 'neptune_cfd':
+        from neptune_cfd.nc_package import package
+    else:
+        raise Exception("Uknown package: "+pkg_name)
+
+    return package()
+
+# ------------------------------------------------------------------------------
+
+def get_case_id(vars_dico):
+    """
+    Return the case id based on the variables names and values
+    """
+
+    items = []
+    for key in vars_dico.keys():
+        items.append(str(key[:4])+'_'+str(vars_dico[key]))
+
+    return "_".join(items)
+
 # ==============================================================================
 # OpenTurns Study Model class
 class cfd_openturns_study:
@@ -217,13 +251,7 @@ class cfd_openturns_study:
         Setting the case id based on the variables names and values
         """
 
-        self.case_id = ''
-
-        items = []
-        for key in self.vars_dico.keys():
-            items.append(str(key[:4])+'_'+str(self.vars_dico[key]))
-
-        self.case_id = "_".join(items)
+        self.case_id = get_case_id(self.vars_dico)
     # ---------------------------------------
 
     # ---------------------------------------
@@ -232,16 +260,7 @@ class cfd_openturns_study:
         Setting the package according to the requested code by the user
         """
 
-        pkg_name = self.cfg.get('study_parameters', 'code_name')
-
-        if pkg_name == 'code_saturne':
-            from code_saturne.cs_package import package
-        elif pkg_name == 'neptune_cfd':
-            from neptune_cfd.nc_package import package
-        else:
-            raise Exception("Uknown package: "+pkg_name)
-
-        self.pkg = package()
+        self.pkg = get_package(self.cfg)
 
     # ---------------------------------------
 
@@ -332,3 +351,204 @@ class cfd_openturns_study:
 # ------------------------------------------------------------------------------
 
 # ==============================================================================
+
+# ==============================================================================
+# OpenTurns batch study class
+class cfd_openturns_batch_study:
+    """
+    Class used for the evaluation of a whole sample matrix of an OpenTurns
+    study within SALOME_CFD (local runs only).
+    All samples are run in the reference case, each with its own run id,
+    the sample values being applied as notebook variable overrides
+    ("code_saturne run --notebook-args"), so that the case data are shared.
+    The first sample is run alone, so that the compiled solver and the
+    preprocessed mesh are then reused from the user caches by the other
+    samples, which are run concurrently within a given number of cores.
+    Public methods:
+    - init
+    - run
+    """
+# ------------------------------------------------------------------------------
+# PUBLIC FUNCTIONS
+# ------------------------------------------------------------------------------
+
+    # ---------------------------------------
+    def __init__(self, study_path, study_cfg, var_names):
+        '''
+        Classs constructor
+        '''
+
+        self.study_path = study_path
+
+        self.cfg = configparser.ConfigParser()
+        self.cfg.read(os.path.join(study_path, study_cfg))
+
+        self.var_names = list(var_names)
+
+        self.ref_case  = self.cfg.get('study_parameters', 'ref_case')
+        self.paramfile = self.cfg.get('study_parameters', 'xmlfile')
+        self.nprocs    = int(self.cfg.get('batch_parameters', 'nprocs'))
+
+        self.case_dir     = os.path.join(study_path, self.ref_case)
+        self.results_file = "cs_uncertain_output.dat"
+
+        self.pkg = get_package(self.cfg)
+        self.notebook_names = None
+    # ---------------------------------------
+
+    # ---------------------------------------
+    def run(self, samples, n_cores=None, warm_start=False):
+        '''
+        Run all samples (one per row of the sample matrix, with one value
+        per variable), at most n_cores being used at a time (by default,
+        the number of cores of the local machine).
+        If warm_start is True, each sample restarts from the checkpoint
+        of the finished sample with the closest values
+        ("code_saturne run --warm-start").
+        Returns a NumPy array of results, with one row per sample.
+        Samples whose results are already present are not run again,
+        and results of failed samples are set to NaN.
+        '''
+
+        import numpy
+
+        samples = numpy.atleast_2d(numpy.asarray(samples, dtype=float))
+
+        if n_cores == None:
+            import multiprocessing
+            n_cores = multiprocessing.cpu_count()
+        n_parallel = max(1, n_cores // self.nprocs)
+
+        vars_list = []
+        for x in samples:
+            vars_dico = {}
+            for key, val in zip(self.var_names, x):
+                vars_dico[key] = val
+            vars_list.append(vars_dico)
+
+        run_ids = [get_case_id(vars_dico) for vars_dico in vars_list]
+
+        resu_dir = os.path.join(self.case_dir, 'RESU')
+        if not os.path.isdir(resu_dir):
+            os.makedirs(resu_dir)
+
+        pending = [i for i, run_id in enumerate(run_ids)
+                   if self.__readResults__(run_id) == None]
+
+        # Run first sample alone, so as to fill the user caches
+
+        if len(pending) > 1 and n_parallel > 1:
+            i = pending.pop(0)
+            self.__launchSample__(run_ids[i], vars_list[i],
+                                  warm_start).wait()
+
+        running = []
+        while len(pending) > 0 or len(running) > 0:
+            while len(pending) > 0 and len(running) < n_parallel:
+                i = pending.pop(0)
+                running.append(self.__launchSample__(run_ids[i],
+                                                     vars_list[i],
+                                                     warm_start))
+            time.sleep(0.1)
+            running = [p for p in running if p.poll() == None]
+
+        results = [self.__readResults__(run_id) for run_id in run_ids]
+
+        n_values = 1
+        for r in results:
+            if r != None:
+                n_values = len(r)
+                break
+
+        values = numpy.empty((len(results), n_values))
+        for i, r in enumerate(results):
+            if r != None and len(r) == n_values:
+                values[i] = r
+            else:
+                values[i] = numpy.nan
+
+        return values
+    # ---------------------------------------
+
+# ------------------------------------------------------------------------------
+#
+# ------------------------------------------------------------------------------
+# INTERNAL UTILITY FUNCTIONS
+# ------------------------------------------------------------------------------
+
+    # ---------------------------------------
+    def __setNotebookNames__(self):
+        """
+        Set the list of notebook variables of the reference case
+        parameters file (done only once for all samples)
+        """
+
+        from code_saturne.model.XMLengine import Case
+        from code_saturne.model.NotebookModel import NotebookModel
+
+        fp = os.path.join(self.case_dir, 'DATA', self.paramfile)
+
+        case = Case(package=self.pkg, file_name=fp)
+        case.xmlCleanAllBlank(case.xmlRootNode())
+
+        self.notebook_names = NotebookModel(case).getVarNameList()
+    # ---------------------------------------
+
+    # ---------------------------------------
+    def __launchSample__(self, run_id, vars_dico, warm_start=False):
+        """
+        Launch the computation of a sample in a separate process,
+        and return the associated process object
+        """
+
+        if self.notebook_names == None:
+            self.__setNotebookNames__()
+
+        notebook_args = []
+        for key in vars_dico.keys():
+            if key in self.notebook_names:
+                notebook_args.append(key + '=' + str(vars_dico[key]))
+
+        cmd = [os.path.join(self.pkg.get_dir('bindir'), self.pkg.name),
+               'run',
+               '--case', self.case_dir,
+               '-p', self.paramfile,
+               '-n', str(self.nprocs),
+               '--id', run_id,
+               '--force']
+        if notebook_args:
+            cmd += ['--notebook-args', ' '.join(notebook_args)]
+        if warm_start:
+            cmd += ['--warm-start']
+
+        log_name = os.path.join(self.case_dir, 'RESU', run_id + '.log')
+        log = open(log_name, 'w')
+        p = subprocess.Popen(cmd, cwd=self.case_dir,
+                             stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+
+        return p
+    # ---------------------------------------
+
+    # ---------------------------------------
+    def __readResults__(self, run_id):
+        """
+        Return the tuple of values of the results file of a sample,
+        or None if not available
+        """
+
+        rspth = os.path.join(self.case_dir, 'RESU', run_id, self.results_file)
+
+        results = None
+        try:
+            r = open(rspth, 'r').readlines()
+            results = tuple([float(ed) for ed in r[-1].split(',')])
+        except Exception:
+            pass
+
+        return results
+    # ---------------------------------------
+
+# ------------------------------------------------------------------------------
+
+# ==============================================================================
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Benchmark of the startup of the code_saturne command: the import time of
+the main script and of the module of each subcommand is measured with
+"python -X importtime" in a new interpreter (best of several runs), and the
+heaviest imports of each subcommand are listed.
+
+Usage: python cli_import_benchmark.py [n_runs [subcommand ...]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import subprocess, sys
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+subcommands = [('studymanager', 'cs_studymanager'),
+               ('bdiff', 'cs_bdiff'),
+               ('bdump', 'cs_bdump'),
+               ('compile', 'cs_compile'),
+               ('config', 'cs_config'),
+               ('create', 'cs_create'),
+               ('gui', 'cs_gui'),
+               ('studymanagergui', 'cs_studymanager_gui'),
+               ('trackcvg', 'cs_trackcvg'),
+               ('info', 'cs_info'),
+               ('run', 'cs_run'),
+               ('submit', 'cs_submit'),
+               ('update', 'cs_update')]
+
+n_heaviest = 5
+
+def import_times(module):
+    """
+    Return a dictionary of cumulative import times (in microseconds)
+    of a module and of the modules it imports, or None if the import fails.
+    """
+    cmd = [sys.executable, '-X', 'importtime', '-W', 'ignore',
+           '-c', 'import ' + module]
+    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    output = p.communicate()[1].decode('utf-8')
+    if p.returncode != 0:
+        return None
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        l = line[len('import time:'):].split('|')
+        try:
+            times[l[2].strip()] = int(l[1])
+        except ValueError:  # header line
+            pass
+
+    return times
+
+
+def best_import_times(module, n_runs):
+    """
+    Return the minimum import times over several runs.
+    """
+    times = None
+    for i in range(n_runs):
+        t = import_times(module)
+        if t == None:
+            return None
+        if times == None:
+            times = t
+        else:
+            for k in times:
+                times[k] = min(times[k], t.get(k, times[k]))
+    return times
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_runs = 5
+    if len(argv) > 0:
+        n_runs = int(argv[0])
+    names = argv[1:]
+
+    # Modules imported at interpreter startup are not listed
+
+    startup = import_times('sys')
+
+    t = best_import_times('code_saturne.cs_script', n_runs)
+    print("%-16s %8.1f ms" % ('(main script)',
+                              t['code_saturne.cs_script']/1000.))
+
+    for name, module in subcommands:
+        if names and not name in names:
+            continue
+        m = 'code_saturne.' + module
+        t = best_import_times(m, n_runs)
+        if t == None:
+            print("%-16s %11s" % (name, 'n/a'))
+            continue
+        print("%-16s %8.1f ms" % (name, t[m]/1000.))
+        heaviest = sorted([(v, k) for k, v in t.items()
+                           if k != m and not k in startup],
+                          reverse=True)
+        for v, k in heaviest[:n_heaviest]:
+            print("    %-36s %8.1f ms" % (k, v/1000.))
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
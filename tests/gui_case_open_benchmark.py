@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Headless benchmark of the opening of a case in the GUI: a NEPTUNE_CFD
+case with many fields is created, then opened as done by the main window
+(parsing and initialization), and the features used to configure the
+browser tree are determined using model classes (previous behavior), then
+using the XML features summary. The import time of modules which were
+loaded by the main window at startup is also measured.
+
+Usage: python gui_case_open_benchmark.py [n_fields [n_configure]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, subprocess, sys, tempfile, time
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.cs_package import package
+from code_saturne.model import XMLengine
+from code_saturne.model.SolutionDomainModel import getRunType
+from code_saturne.model.CaseFeaturesModel import getCaseFeatures
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+deferred_modules = ['code_saturne.model.XMLinitialize',
+                    'code_saturne.model.XMLinitializeNeptune',
+                    'code_saturne.model.XMLmodel',
+                    'code_saturne.cs_mei_to_c']
+
+def create_case(file_name, n_fields):
+    """
+    Create a NEPTUNE_CFD case with n_fields fields.
+    """
+    from code_saturne.model.XMLinitializeNeptune import XMLinitNeptune
+    from code_saturne.model.MainFieldsModel import MainFieldsModel
+
+    case = XMLengine.Case(package=package(), module='neptune_cfd')
+    XMLinitNeptune(case).initialize()
+
+    mdl = MainFieldsModel(case)
+    mdl.setPredefinedFlow('boiling_flow')
+    for i in range(n_fields - len(mdl.getFieldIdList())):
+        mdl.addField()
+
+    # Turbulence variables node, as expected when reopening the case
+    case.xmlGetNode('closure_modeling').xmlInitNode('turbulence') \
+        .xmlInitNode('variables')
+
+    case['xmlfile'] = file_name
+    case.xmlSaveDocument()
+
+
+def open_case(file_name):
+    """
+    Open a case as done by the main window.
+    """
+    from code_saturne.model.XMLinitializeNeptune import XMLinitNeptune
+
+    case = XMLengine.Case(package=package(), file_name=file_name)
+    case.xmlCleanAllBlank(case.xmlRootNode())
+    case['run_type'] = getRunType(case)
+    XMLinitNeptune(case).initialize()
+
+    return case
+
+
+def reference_features(case):
+    """
+    Determine NEPTUNE_CFD closure features using model classes.
+    """
+    from code_saturne.model.MainFieldsModel import MainFieldsModel
+    from code_saturne.model.InterfacialForcesModel import InterfacialForcesModel
+
+    f = {'particles_interactions': False, 'itf_area': False}
+
+    predefined_flow = MainFieldsModel(case).getPredefinedFlow()
+
+    if (len(MainFieldsModel(case).getSolidFieldIdList()) > 0):
+        f['particles_interactions'] = True
+    if (len(MainFieldsModel(case).getDispersedFieldList()) > 0
+        or InterfacialForcesModel(case).getBubblesForLIMStatus() == 'on'):
+        f['itf_area'] = True
+    f['itf_h_transfer'] = predefined_flow in ('free_surface', 'boiling_flow',
+                                              'droplet_flow', 'particles_flow')
+
+    return f
+
+
+def import_time(module):
+    """
+    Measure the import time of a module in a new interpreter.
+    """
+    cmd = 'import time; t = time.time(); import ' + module \
+        + '; print(time.time() - t)'
+    output = subprocess.check_output([sys.executable, '-W', 'ignore',
+                                      '-c', cmd])
+    return float(output.decode('utf-8').split()[-1])
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_fields = 20
+    n_configure = 20
+    if len(argv) > 0:
+        n_fields = int(argv[0])
+    if len(argv) > 1:
+        n_configure = int(argv[1])
+
+    dir_name = tempfile.mkdtemp()
+    file_name = os.path.join(dir_name, 'setup.xml')
+
+    try:
+        create_case(file_name, n_fields)
+
+        t0 = time.time()
+        case = open_case(file_name)
+        t1 = time.time()
+        for i in range(n_configure):
+            f_ref = reference_features(case)
+        t2 = time.time()
+        for i in range(n_configure):
+            f = getCaseFeatures(case)
+        t3 = time.time()
+
+        print("%d fields, %d tree configurations" % (n_fields, n_configure))
+        print("case open:              %8.3f s" % (t1-t0))
+        print("tree with models:       %8.3f s" % (t2-t1))
+        print("tree with XML summary:  %8.3f s" % (t3-t2))
+
+        for m in deferred_modules:
+            print("import %-42s %8.3f s" % (m + ':', import_time(m)))
+
+        for k in f_ref:
+            if f[k] != f_ref[k]:
+                print("Error: features differ between both methods.")
+                return 1
+    finally:
+        for f in os.listdir(dir_name):
+            os.remove(os.path.join(dir_name, f))
+        os.rmdir(dir_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
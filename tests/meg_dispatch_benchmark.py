@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Benchmark of the dispatch of generated MEG boundary functions: a standalone
+C program with many boundary zones and fields is generated, calling the
+function of each (field, zone) pair through a chain of strcmp tests
+(previous behavior) and through the sorted dispatch table generated by
+cs_mei_to_c.
+
+Usage: python meg_dispatch_benchmark.py [n_zones [n_fields [n_calls]]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, shutil, subprocess, sys, tempfile
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.cs_mei_to_c import c_function_header, generate_dispatch_code
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+_c_header = \
+"""#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+typedef double cs_real_t;
+typedef cs_real_t cs_real_3_t[3];
+typedef struct { const char *name; } cs_zone_t;
+
+static cs_real_t _vals[%d];
+
+"""
+
+_c_main = \
+"""static double
+_wtime(void)
+{
+  return (double)clock() / CLOCKS_PER_SEC;
+}
+
+int
+main(void)
+{
+  const char *zones[] = {%s};
+  const char *fields[] = {%s};
+  cs_zone_t z[%d];
+  for (int i = 0; i < %d; i++)
+    z[i].name = zones[i];
+
+  double s[2] = {0, 0}, t[2] = {0, 0};
+
+  for (int k = 0; k < 2; k++) {
+    double t0 = _wtime();
+    for (int n = 0; n < %d; n++) {
+      for (int i = 0; i < %d; i++) {
+        for (int j = 0; j < %d; j++) {
+          cs_real_t *v = (k == 0) ?
+            _linear_function(z + i, fields[j], "dirichlet_formula") :
+            cs_meg_boundary_function(z + i, fields[j], "dirichlet_formula");
+          s[k] += *v;
+        }
+      }
+    }
+    t[k] = _wtime() - t0;
+  }
+
+  printf("%%.17g %%.17g %%.9f %%.9f\\n", s[0], s[1], t[0], t[1]);
+
+  return 0;
+}
+"""
+
+args = [('const cs_zone_t', '*zone'),
+        ('const char', '*field_name'),
+        ('const char', '*condition')]
+
+def generate_program(n_zones, n_fields, n_calls):
+    """
+    Generate the C benchmark program.
+    """
+    zones = ['BC_%d' % i for i in range(n_zones)]
+    fields = ['field_%d' % i for i in range(n_fields)]
+    n_funcs = n_zones*n_fields
+
+    code = _c_header % n_funcs
+
+    # One function per (field, zone) pair
+
+    entries = []
+    for i, z in enumerate(zones):
+        for j, f in enumerate(fields):
+            f_id = i*n_fields + j
+            f_name = '_meg_function_%d' % f_id
+            entries.append(([f, 'dirichlet_formula', z], f_name))
+            code += c_function_header('cs_real_t *', f_name, args, static=True)
+            code += '{\n'
+            code += '  _vals[%d] = %d;\n' % (f_id, f_id + 1)
+            code += '  return _vals + %d;\n' % f_id
+            code += '}\n\n'
+
+    # Previous behavior: chain of strcmp tests
+
+    code += c_function_header('cs_real_t *', '_linear_function', args,
+                              static=True)
+    code += '{\n'
+    code += '  cs_real_t *new_vals = NULL;\n\n'
+    for keys, f_name in entries:
+        code += '  if (strcmp(field_name, "%s") == 0 &&\n' % keys[0]
+        code += '      strcmp(condition, "%s") == 0 &&\n' % keys[1]
+        code += '      strcmp(zone->name, "%s") == 0)\n' % keys[2]
+        code += '    new_vals = %s(zone, field_name, condition);\n' % f_name
+    code += '\n  return new_vals;\n'
+    code += '}\n\n'
+
+    # Dispatch table
+
+    code += generate_dispatch_code('bnd', entries)
+    code += '}\n\n'
+
+    code += _c_main % (', '.join(['"%s"' % z for z in zones]),
+                       ', '.join(['"%s"' % f for f in fields]),
+                       n_zones, n_zones, n_calls, n_zones, n_fields)
+
+    return code
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_zones = 50
+    n_fields = 10
+    n_calls = 200
+    if len(argv) > 0:
+        n_zones = int(argv[0])
+    if len(argv) > 1:
+        n_fields = int(argv[1])
+    if len(argv) > 2:
+        n_calls = int(argv[2])
+
+    cc = os.getenv('CC', 'cc')
+
+    dir_name = tempfile.mkdtemp()
+
+    try:
+        src_name = os.path.join(dir_name, 'meg_dispatch.c')
+        exe_name = os.path.join(dir_name, 'meg_dispatch')
+
+        f = open(src_name, 'w')
+        f.write(generate_program(n_zones, n_fields, n_calls))
+        f.close()
+
+        retcode = subprocess.call([cc, '-std=c99', '-O2', '-o', exe_name,
+                                   src_name])
+        if retcode != 0:
+            print("Error: compilation with " + cc + " failed.")
+            return 1
+
+        output = subprocess.check_output([exe_name]).decode('utf-8')
+        s_ref, s, t_ref, t = output.split()
+
+        print("%d zones, %d fields, %d calls" % (n_zones, n_fields, n_calls))
+        print("strcmp chain:   %8.3f s" % float(t_ref))
+        print("dispatch table: %8.3f s" % float(t))
+
+        if s != s_ref:
+            print("Error: results differ between both methods.")
+            return 1
+    finally:
+        shutil.rmtree(dir_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Benchmark of the studymanager data files loader: many curves (with error
+bars) are extracted from the same profile file, using line by line parsing
+of the file for each curve (previous behavior), then using the shared
+loader of the drawing module.
+
+Usage: python studymanager_drawing_benchmark.py [n_rows [n_curves]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, sys, tempfile, time
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.studymanager.cs_studymanager_parser import Parser
+from code_saturne.studymanager.cs_studymanager_drawing import Plot
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+n_columns = 12
+
+def create_files(dir_name, n_rows, n_curves):
+    """
+    Create a CSV profile file and a studymanager file defining n_curves
+    curves based on this profile.
+    """
+    data_name = os.path.join(dir_name, 'profile.csv')
+    f = open(data_name, 'w')
+    f.write(', '.join(['c%d' % i for i in range(n_columns)]) + '\n')
+    for i in range(n_rows):
+        f.write(', '.join(['%.8e' % (i*0.001 + j) for j in range(n_columns)])
+                + '\n')
+    f.close()
+
+    xml_name = os.path.join(dir_name, 'smgr.xml')
+    f = open(xml_name, 'w')
+    f.write('<?xml version="1.0"?>\n<studymanager>\n')
+    for i in range(n_curves):
+        ycol = 2 + i%(n_columns-3)
+        f.write('<plot spids="1" xcol="1" ycol="%d" xscale="2" yplus="1" '
+                'yerr="%d %d" xerrp="5" legend="c%d"/>\n'
+                % (ycol, ycol+1, ycol+2, i))
+    f.write('</studymanager>\n')
+    f.close()
+
+    return data_name, xml_name
+
+
+def read_columns(file_name, cols):
+    """
+    Line by line parsing of given columns, as done for each curve
+    and error bar before the shared loader.
+    """
+    values = [[] for c in cols]
+    j = 0
+    f = open(file_name, 'r')
+    for line in f.readlines():
+        line = line.lstrip()
+        if line and line[0] != '#':
+            j += 1
+            line = line.replace(", ", " ")
+            line = line.lstrip()
+            if j == 1:
+                try:
+                    val = float(line.split()[0])
+                except ValueError as not_float:
+                    continue
+            for i, c in enumerate(cols):
+                values[i].append(float(line.split()[c-1]))
+    f.close()
+    return values
+
+
+def reference_curves(parser, data_name):
+    """
+    Extract curves using line by line parsing.
+    """
+    curves = []
+    for node in parser.root.getElementsByTagName('plot'):
+        ycol = int(parser.getAttribute(node, 'ycol'))
+        yerr = [int(s) for s in parser.getAttribute(node, 'yerr').split()]
+        xerrp = float(parser.getAttribute(node, 'xerrp'))
+        x, y = read_columns(data_name, (1, ycol))
+        xspan = [v*2. for v in x]
+        yspan = [v + 1. for v in y]
+        xerr = [xerrp/100.*v for v in read_columns(data_name, (1,))[0]]
+        yerr = read_columns(data_name, yerr)
+        curves.append((xspan, yspan, xerr, yerr))
+    return curves
+
+
+def loader_curves(parser, data_name):
+    """
+    Extract curves using the shared loader.
+    """
+    curves = []
+    for node in parser.root.getElementsByTagName('plot'):
+        p = Plot(node, parser, data_name)
+        curves.append((p.xspan, p.yspan, p.xerr, p.yerr))
+    return curves
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_rows = 20000
+    n_curves = 40
+    if len(argv) > 0:
+        n_rows = int(argv[0])
+    if len(argv) > 1:
+        n_curves = int(argv[1])
+
+    dir_name = tempfile.mkdtemp()
+
+    try:
+        data_name, xml_name = create_files(dir_name, n_rows, n_curves)
+        parser = Parser(xml_name)
+
+        t0 = time.time()
+        c_ref = reference_curves(parser, data_name)
+        t1 = time.time()
+        c = loader_curves(parser, data_name)
+        t2 = time.time()
+
+        print("%d rows, %d curves" % (n_rows, n_curves))
+        print("line by line parsing: %8.3f s" % (t1-t0))
+        print("shared loader:        %8.3f s" % (t2-t1))
+
+        if c != c_ref:
+            print("Error: curves differ between both methods.")
+            return 1
+    finally:
+        for f in os.listdir(dir_name):
+            os.remove(os.path.join(dir_name, f))
+        os.rmdir(dir_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Benchmark of the rendering of studymanager figures: many figures (each
+with several subplots) are rendered one after the other in a single
+process, then using a pool of processes, and rendered again (all figures
+being skipped as they are unchanged).
+
+Usage: python studymanager_plot_benchmark.py [n_figures [n_procs [dpi]]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, shutil, sys, tempfile, time
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.studymanager.cs_studymanager_parser import Parser
+from code_saturne.studymanager.cs_studymanager_drawing import \
+    Plot, Subplot, Figure, Plotter
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+n_rows = 500
+n_subplots = 4
+
+def create_files(dir_name, n_figures, dpi):
+    """
+    Create a CSV profile file and a studymanager file defining n_figures
+    figures based on this profile.
+    """
+    data_name = os.path.join(dir_name, 'profile.csv')
+    f = open(data_name, 'w')
+    f.write('x, y0, y1, y2\n')
+    for i in range(n_rows):
+        x = i*0.01
+        f.write('%.8e, %.8e, %.8e, %.8e\n' % (x, x*x, x + 1., 2.*x))
+    f.close()
+
+    xml_name = os.path.join(dir_name, 'smgr.xml')
+    f = open(xml_name, 'w')
+    f.write('<?xml version="1.0"?>\n<studymanager>\n<study label="STUDY" status="on">\n')
+    n = n_figures*n_subplots
+    for i in range(n):
+        f.write('<plot spids="%d" xcol="1" ycol="%d" fmt="b-" legend="c%d"/>\n'
+                % (i+1, 2 + i%3, i))
+    for i in range(n):
+        f.write('<subplot id="%d" xlabel="x" ylabel="y" legstatus="on"/>\n'
+                % (i+1))
+    for i in range(n_figures):
+        ids = ' '.join([str(i*n_subplots + j + 1) for j in range(n_subplots)])
+        f.write('<figure name="fig_%d" idlist="%s" format="png" dpi="%d"/>\n'
+                % (i, ids, dpi))
+    f.write('</study>\n</studymanager>\n')
+    f.close()
+
+    return data_name, xml_name
+
+
+def build_figures(parser, data_name):
+    """
+    Build figures as done by the plotter.
+    """
+    curves = []
+    for node in parser.root.getElementsByTagName('plot'):
+        curves.append(Plot(node, parser, data_name))
+    subplots = []
+    for node in parser.getSubplots('STUDY'):
+        subplots.append(Subplot(node, parser, curves))
+    figures = []
+    for node in parser.getFigures('STUDY'):
+        figures.append(Figure(node, parser, curves, subplots, 'png'))
+    return figures
+
+
+def render(plotter, figures, dir_name):
+    """
+    Render figures, returning the elapsed time and figure counts.
+    """
+    t0 = time.time()
+    n_rendered, n_skipped = plotter.render_figures(figures, dir_name, True)
+    return time.time() - t0, n_rendered, n_skipped
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_figures = 24
+    n_procs = None
+    dpi = 200
+    if len(argv) > 0:
+        n_figures = int(argv[0])
+    if len(argv) > 1:
+        n_procs = int(argv[1])
+    if len(argv) > 2:
+        dpi = int(argv[2])
+
+    dir_name = tempfile.mkdtemp()
+    serial_dir = os.path.join(dir_name, 'serial')
+    pool_dir = os.path.join(dir_name, 'pool')
+    os.mkdir(serial_dir)
+    os.mkdir(pool_dir)
+
+    try:
+        data_name, xml_name = create_files(dir_name, n_figures, dpi)
+        parser = Parser(xml_name)
+        figures = build_figures(parser, data_name)
+
+        t_s, n_s, k_s = render(Plotter(parser, 1), figures, serial_dir)
+        t_p, n_p, k_p = render(Plotter(parser, n_procs), figures, pool_dir)
+        t_u, n_u, k_u = render(Plotter(parser, n_procs), figures, pool_dir)
+
+        print("%d figures, %d subplots per figure, %d dpi"
+              % (n_figures, n_subplots, dpi))
+        print("serial rendering:    %8.3f s (%d rendered, %d skipped)"
+              % (t_s, n_s, k_s))
+        print("pool rendering:      %8.3f s (%d rendered, %d skipped)"
+              % (t_p, n_p, k_p))
+        print("unchanged figures:   %8.3f s (%d rendered, %d skipped)"
+              % (t_u, n_u, k_u))
+
+        if n_p != n_figures or n_u != 0 or k_u != n_figures:
+            print("Error: unexpected numbers of rendered figures.")
+            return 1
+        for i in range(n_figures):
+            if not os.path.isfile(os.path.join(pool_dir, 'fig_%d.png' % i)):
+                print("Error: missing figure fig_%d.png." % i)
+                return 1
+    finally:
+        shutil.rmtree(dir_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
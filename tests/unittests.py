@@ -184,6 +184,10 @@ def starttest48():
     from code_saturne.model.AtmosphericFlowsModel import runTest
     runTest()
 
+def starttest49():
+    from code_saturne.model.CaseFeaturesModel import runTest
+    runTest()
+
 if __name__ == '__main__':
 
     print('STARTING GUI UNIT TESTS')
@@ -230,6 +234,7 @@ if __name__ == '__main__':
 ##    starttest46()
     starttest47()
     starttest48()
+    starttest49()
 
 
 #-------------------------------------------------------------------------------
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+
+"""
+Benchmark of the XMLengine node index: a synthetic case with many boundary
+zones is opened, initialized and its boundary conditions are queried, with
+and without the index.
+
+Usage: python xml_index_benchmark.py [n_zones]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, sys, tempfile, time
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.model.XMLengine import Case
+from code_saturne.model.XMLinitialize import XMLinit
+from code_saturne.model.LocalizationModel import LocalizationModel, Zone
+from code_saturne.model.Boundary import Boundary
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+natures = ('wall', 'inlet', 'outlet', 'symmetry')
+
+def create_case(file_name, n_zones):
+    """
+    Create and save a case with n_zones boundary zones.
+    """
+    case = Case(module='code_saturne', indexed=True)
+    case['xmlfile'] = file_name
+    XMLinit(case).initialize()
+
+    model = LocalizationModel('BoundaryZone', case)
+    for i in range(n_zones):
+        nature = natures[i%len(natures)]
+        model.addZone(Zone('BoundaryZone', label='zone_%d' % i,
+                           localization='bc_%d' % i, nature=nature))
+
+    case.xmlSaveDocument()
+
+
+def open_case(file_name, n_zones, indexed):
+    """
+    Open and initialize a case, then query the boundary conditions of
+    all zones. Return the elapsed times and the final document.
+    """
+    t0 = time.time()
+
+    case = Case(module='code_saturne', file_name=file_name, indexed=indexed)
+    case['xmlfile'] = file_name
+    case.xmlCleanAllBlank(case.xmlRootNode())
+    XMLinit(case).initialize()
+
+    t1 = time.time()
+
+    for i in range(n_zones):
+        nature = natures[i%len(natures)]
+        Boundary(nature, 'zone_%d' % i, case)
+
+    t2 = time.time()
+
+    return t1-t0, t2-t1, case.toString()
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_zones = 500
+    if len(argv) > 0:
+        n_zones = int(argv[0])
+
+    fd, file_name = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+
+    try:
+        create_case(file_name, n_zones)
+
+        t_init, t_bc, s_ref = open_case(file_name, n_zones, False)
+        print("without index: initialize %8.3f s, boundaries %8.3f s"
+              % (t_init, t_bc))
+
+        t_init, t_bc, s = open_case(file_name, n_zones, True)
+        print("with index:    initialize %8.3f s, boundaries %8.3f s"
+              % (t_init, t_bc))
+
+        if s != s_ref:
+            print("Error: documents differ with and without index.")
+            return 1
+    finally:
+        os.remove(file_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+#-------------------------------------------------------------------------------
+
+# This file is part of Code_Saturne, a general-purpose CFD tool.
+#
+# Copyright (C) 1998-2020 EDF S.A.
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51 Franklin
+# Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+#-------------------------------------------------------------------------------
+"""
+Benchmark of the XMLengine modification check: a synthetic case with many
+boundary zones is saved, then checked for modifications repeatedly, comparing
+a serialization of the whole document with the saved file (previous
+behavior) and using the modification counter of the case.
+
+Usage: python xml_modified_benchmark.py [n_zones [n_calls]]
+"""
+
+#-------------------------------------------------------------------------------
+# Library modules import
+#-------------------------------------------------------------------------------
+
+import os, sys, tempfile, time
+
+#-------------------------------------------------------------------------------
+# Application modules import
+#-------------------------------------------------------------------------------
+
+from code_saturne.model.XMLengine import Case
+from code_saturne.model.XMLinitialize import XMLinit
+from code_saturne.model.LocalizationModel import LocalizationModel, Zone
+
+#-------------------------------------------------------------------------------
+# Benchmark functions
+#-------------------------------------------------------------------------------
+
+natures = ('wall', 'inlet', 'outlet', 'symmetry')
+
+def create_case(file_name, n_zones):
+    """
+    Create and save a case with n_zones boundary zones.
+    """
+    case = Case(module='code_saturne', indexed=True)
+    case['xmlfile'] = file_name
+    XMLinit(case).initialize()
+
+    model = LocalizationModel('BoundaryZone', case)
+    for i in range(n_zones):
+        nature = natures[i%len(natures)]
+        model.addZone(Zone('BoundaryZone', label='zone_%d' % i,
+                           localization='bc_%d' % i, nature=nature))
+
+    case.xmlSaveDocument()
+
+    return case
+
+
+def is_modified_ref(case, saved):
+    """
+    Modification check by serialization of the whole document.
+    """
+    return case.toIOString() != saved
+
+
+def check_calls(case, saved, n_calls):
+    """
+    Check modifications n_calls times with both methods, returning
+    the elapsed times and the results.
+    """
+    t0 = time.time()
+    for i in range(n_calls):
+        r_ref = is_modified_ref(case, saved)
+    t1 = time.time()
+    for i in range(n_calls):
+        r = case.isModified()
+    t2 = time.time()
+
+    return t1-t0, t2-t1, r_ref, r
+
+
+def main(argv):
+    """
+    Run the benchmark.
+    """
+    n_zones = 500
+    n_calls = 20
+    if len(argv) > 0:
+        n_zones = int(argv[0])
+    if len(argv) > 1:
+        n_calls = int(argv[1])
+
+    fd, file_name = tempfile.mkstemp(suffix='.xml')
+    os.close(fd)
+
+    try:
+        case = create_case(file_name, n_zones)
+        f = open(file_name)
+        saved = f.read()
+        f.close()
+
+        print("%d zones, %d calls" % (n_zones, n_calls))
+
+        t_ref, t, r_ref, r = check_calls(case, saved, n_calls)
+        print("unmodified case: serialization %8.3f s, counter %8.3f s"
+              % (t_ref, t))
+        if r != r_ref:
+            print("Error: results differ between both methods.")
+            return 1
+
+        node = case.xmlGetNode('boundary', label='zone_0')
+        node['nature'] = 'inlet'
+
+        t_ref, t, r_ref, r = check_calls(case, saved, n_calls)
+        print("modified case:   serialization %8.3f s, counter %8.3f s"
+              % (t_ref, t))
+        if r != r_ref:
+            print("Error: results differ between both methods.")
+            return 1
+    finally:
+        os.remove(file_name)
+
+    return 0
+
+#-------------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
+# End
+#-------------------------------------------------------------------------------